@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo preview dos exportadores: cada query é limitada no servidor e o
+processamento completo roda sobre a amostra, para conferir filtros e layout em segundos.
+Estratégias: 'particao' (só os últimos dias do filtro de data), 'tablesample'
+(páginas aleatórias da tabela principal) e 'top' (primeiras N linhas).
+A estratégia aplicada a cada query fica registrada nos metadados da saída.
+"""
+
+import re
+import json
+from datetime import datetime
+
+AMOSTRA_CONFIG = {
+    'habilitado': False,
+    'linhas': 5000,      # TOP N das queries sem filtro de data
+    'dias': 7,           # período das queries com filtro de data
+    'percentual': 2,     # TABLESAMPLE SYSTEM (n PERCENT)
+}
+
+# nome da query -> {'estrategia', 'detalhe', 'registros'}
+REGISTRO = {}
+
+_SELECT = re.compile(r'^\s*SELECT\s+(DISTINCT\s+)?', re.IGNORECASE)
+_PALAVRAS_RESERVADAS = {'WITH', 'WHERE', 'LEFT', 'RIGHT', 'INNER', 'JOIN', 'CROSS', 'OUTER', 'ORDER', 'GROUP', 'ON'}
+_FROM = re.compile(r'\bFROM\s+([\w.\[\]]+)(\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+def configurar(habilitado=True, linhas=None, dias=None):
+    AMOSTRA_CONFIG['habilitado'] = habilitado
+    if linhas:
+        AMOSTRA_CONFIG['linhas'] = linhas
+    if dias:
+        AMOSTRA_CONFIG['dias'] = dias
+    REGISTRO.clear()
+
+def com_top(query, linhas=None):
+    """Insere TOP (N) no SELECT externo (mantém ORDER BY e DISTINCT)"""
+    linhas = linhas or AMOSTRA_CONFIG['linhas']
+    if not _SELECT.match(query):
+        raise ValueError('Query sem SELECT no início; não é possível aplicar TOP')
+    return _SELECT.sub(lambda m: f"SELECT {m.group(1) or ''}TOP ({int(linhas)}) ", query, count=1)
+
+def com_tablesample(query, percentual=None):
+    """
+    TABLESAMPLE SYSTEM na primeira tabela do FROM (entre o alias e o WITH (NOLOCK)).
+    Não vale para views; quem chama deve ter uma alternativa (ver candidatas).
+    """
+    percentual = percentual or AMOSTRA_CONFIG['percentual']
+    m = _FROM.search(query)
+    if m is None:
+        raise ValueError('Query sem FROM; não é possível aplicar TABLESAMPLE')
+    fim = m.end(2) if m.group(3) and m.group(3).upper() not in _PALAVRAS_RESERVADAS else m.end(1)
+    return query[:fim] + f" TABLESAMPLE SYSTEM ({percentual} PERCENT)" + query[fim:]
+
+def candidatas(query, filtro_data=None):
+    """
+    Queries de amostra em ordem de preferência: [(estrategia, detalhe, sql)].
+    filtro_data: (filtro original, filtro do período recente) das queries limitadas por data.
+    """
+    if filtro_data is not None:
+        original, recente = filtro_data
+        return [('particao', recente, query.replace(original, recente))]
+    linhas, percentual = AMOSTRA_CONFIG['linhas'], AMOSTRA_CONFIG['percentual']
+    opcoes = []
+    try:
+        opcoes.append(('tablesample', f"{percentual}% das páginas, até {linhas:,} linhas",
+                       com_top(com_tablesample(query, percentual), linhas)))
+    except ValueError:
+        pass
+    opcoes.append(('top', f"primeiras {linhas:,} linhas", com_top(query, linhas)))
+    return opcoes
+
+def registrar(nome, estrategia, detalhe, registros=None):
+    REGISTRO[nome] = {'estrategia': estrategia, 'detalhe': detalhe, 'registros': registros}
+
+def limitar(nome, query, periodo=None):
+    """
+    TOP N na query quando o preview estiver ativo (senão devolve a query intacta).
+    periodo: texto do período já encurtado por quem chama, só para o registro.
+    """
+    if not AMOSTRA_CONFIG['habilitado']:
+        return query
+    detalhe = f"primeiras {AMOSTRA_CONFIG['linhas']:,} linhas"
+    registrar(nome, 'periodo+top' if periodo else 'top', f"{periodo}, {detalhe}" if periodo else detalhe)
+    return com_top(query)
+
+def anotar_registros(nome, registros):
+    if nome in REGISTRO:
+        REGISTRO[nome]['registros'] = registros
+
+def metadados():
+    return {
+        'preview': True,
+        'gerado': datetime.now().isoformat(timespec='seconds'),
+        'config': {k: v for k, v in AMOSTRA_CONFIG.items() if k != 'habilitado'},
+        'queries': REGISTRO,
+    }
+
+def descricao():
+    """Resumo de uma linha por query (propriedades do XLSX)"""
+    return 'PREVIEW (amostra) - ' + '; '.join(
+        f"{nome}: {info['estrategia']} ({info['detalhe']})" for nome, info in REGISTRO.items())
+
+def gravar_metadados(caminho):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(metadados(), f, indent=1, ensure_ascii=False, default=str)
@@ -7,10 +7,29 @@ import {
   processarEcommerce,
   processarEntradas,
 } from '@/lib/utils/processRelatorios';
+import {
+  processarViaServico,
+  type FormatoProcessamento,
+} from '@/lib/services/processamentoLocal';
+
+const FORMATOS: FormatoProcessamento[] = ['json', 'arrow', 'csv'];
 
 export async function POST(request: Request) {
   try {
-    const body = await request.json();
+    const corpo = await request.text();
+
+    // Serviço Python local (PROCESSAMENTO_URL), se estiver no ar
+    const { searchParams } = new URL(request.url);
+    const formato = searchParams.get('formato') as FormatoProcessamento | null;
+    const viaServico = await processarViaServico(
+      corpo,
+      formato && FORMATOS.includes(formato) ? formato : 'json'
+    );
+    if (viaServico) {
+      return viaServico;
+    }
+
+    const body = JSON.parse(corpo);
     const { tipo, dados, dadosAuxiliares } = body;
 
     if (!tipo || !dados) {
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Base local de vendas tratadas (líquidas de trocas) para consulta por outros scripts
+Gravada por exportar_todos_relatorios3 em Parquet particionado por mês (MES=AAAA-MM);
+exportar_clientes lê só as colunas e linhas pedidas (data, filial, cliente)
+"""
+
+import os
+import json
+import shutil
+from datetime import datetime, date
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+    ARROW_DISPONIVEL = True
+except ImportError:
+    ARROW_DISPONIVEL = False
+
+BASE_VENDAS_CONFIG = {
+    'habilitado': True,
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'vendas_local'),
+}
+
+# Colunas guardadas (tipos fixos para todas as partes terem o mesmo schema)
+COLUNAS_TEXTO = ['CLIENTE_VAREJO', 'FILIAL', 'CODIGO_FILIAL', 'TICKET', 'VENDEDOR', 'VENDEDOR_APELIDO',
+                 'PRODUTO', 'DESC_PRODUTO', 'GRUPO_PRODUTO', 'SUBGRUPO_PRODUTO']
+COLUNAS_NUMERO = ['QTDE', 'VALOR_LIQUIDO', 'TOTAL_VENDA']
+
+ARQUIVO_MANIFESTO = '_manifesto.json'  # prefixo '_' fica fora do dataset
+
+def _esquema():
+    campos = [pa.field('DATA_VENDA', pa.timestamp('ns'))]
+    campos += [pa.field(c, pa.string()) for c in COLUNAS_TEXTO]
+    campos += [pa.field(c, pa.float64()) for c in COLUNAS_NUMERO]
+    return pa.schema(campos)
+
+def ler_manifesto():
+    """Manifesto da base atual (None se não houver)"""
+    try:
+        with open(os.path.join(BASE_VENDAS_CONFIG['diretorio'], ARQUIVO_MANIFESTO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def iniciar_base(inicio):
+    """
+    Abre uma nova versão da base em diretório temporário (a atual continua
+    legível até finalizar_base). inicio: primeira data coberta pela extração.
+    Retorna None se a base estiver desabilitada ou sem pyarrow.
+    """
+    if not (BASE_VENDAS_CONFIG['habilitado'] and ARROW_DISPONIVEL):
+        return None
+    tmp = BASE_VENDAS_CONFIG['diretorio'] + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    return {'dir': tmp, 'inicio': str(inicio), 'partes': 0, 'registros': 0}
+
+def acrescentar_base(base, df):
+    """Grava um bloco de vendas tratadas (uma parte por mês presente no bloco)"""
+    if base is None or df.empty:
+        return
+    dados = {'DATA_VENDA': pd.to_datetime(df['DATA_VENDA'])}
+    for col in COLUNAS_TEXTO:
+        if col in df.columns:
+            valores = df[col]
+            dados[col] = valores.where(valores.isna(), valores.astype(str))
+        else:
+            dados[col] = None
+    for col in COLUNAS_NUMERO:
+        dados[col] = pd.to_numeric(df[col], errors='coerce') if col in df.columns else float('nan')
+    projecao = pd.DataFrame(dados, index=df.index)
+    meses = projecao['DATA_VENDA'].dt.strftime('%Y-%m')
+
+    for mes, parte in projecao.groupby(meses, sort=True):
+        diretorio = os.path.join(base['dir'], f"MES={mes}")
+        os.makedirs(diretorio, exist_ok=True)
+        tabela = pa.Table.from_pandas(parte.sort_values('DATA_VENDA', kind='stable'),
+                                      schema=_esquema(), preserve_index=False)
+        pq.write_table(tabela, os.path.join(diretorio, f"parte_{base['partes']:05d}.parquet"))
+        base['partes'] += 1
+    base['registros'] += len(projecao)
+
+def finalizar_base(base):
+    """Publica a nova versão (troca de diretório) com o manifesto de cobertura"""
+    if base is None:
+        return None
+    manifesto = {
+        'inicio': base['inicio'],
+        # Vendas do próprio dia podem estar incompletas: cobre até a véspera
+        'fim': str(date.today()),
+        'gerado': datetime.now().isoformat(timespec='seconds'),
+        'registros': base['registros'],
+        'colunas': ['DATA_VENDA'] + COLUNAS_TEXTO + COLUNAS_NUMERO,
+    }
+    with open(os.path.join(base['dir'], ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=1)
+
+    destino = BASE_VENDAS_CONFIG['diretorio']
+    antigo = destino + '.old'
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.exists(destino):
+        os.replace(destino, antigo)
+    os.replace(base['dir'], destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    print(f"✓ base local de vendas: {base['registros']:,} registros")
+    return manifesto
+
+def gravar_base(df, inicio):
+    """Grava a base inteira a partir de um único DataFrame"""
+    base = iniciar_base(inicio)
+    acrescentar_base(base, df)
+    return finalizar_base(base)
+
+def base_cobre(inicio, fim):
+    """True se a base local cobre [inicio, fim] (datas inclusivas, fim antes do dia da geração)"""
+    if not ARROW_DISPONIVEL:
+        return False
+    manifesto = ler_manifesto()
+    if manifesto is None:
+        return False
+    return str(inicio) >= manifesto['inicio'] and str(fim) < manifesto['fim']
+
+def ler_base(inicio, fim, filiais=None, clientes=None, vendedor=None, colunas=None):
+    """
+    Fatia da base local: DATA_VENDA em [inicio, fim], filtros opcionais por
+    lista de filiais, lista de clientes e vendedor (código ou apelido).
+    Lê só as colunas pedidas e só os meses do período. None se a base não cobrir.
+    """
+    if not base_cobre(inicio, fim):
+        return None
+    fim_exclusivo = pd.Timestamp(fim) + pd.Timedelta(days=1)
+    filtro = ((ds.field('MES') >= pd.Timestamp(inicio).strftime('%Y-%m'))
+              & (ds.field('MES') <= pd.Timestamp(fim).strftime('%Y-%m'))
+              & (ds.field('DATA_VENDA') >= pa.scalar(pd.Timestamp(inicio).to_pydatetime(), pa.timestamp('ns')))
+              & (ds.field('DATA_VENDA') < pa.scalar(fim_exclusivo.to_pydatetime(), pa.timestamp('ns'))))
+    if filiais is not None:
+        filtro &= ds.field('FILIAL').isin([str(f) for f in filiais])
+    if clientes is not None:
+        filtro &= ds.field('CLIENTE_VAREJO').isin([str(c) for c in clientes])
+    if vendedor:
+        filtro &= (ds.field('VENDEDOR') == vendedor) | (ds.field('VENDEDOR_APELIDO') == vendedor)
+
+    dataset = ds.dataset(BASE_VENDAS_CONFIG['diretorio'], format='parquet', partitioning='hive')
+    tabela = dataset.to_table(columns=colunas, filter=filtro)
+    return tabela.to_pandas()
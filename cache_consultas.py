@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache em disco para resultados de consultas SQL (pd.read_sql)
+Chave: SQL normalizado + parâmetros | Formato: Parquet (fallback pickle)
+TTL por consulta e limite de tamanho com descarte LRU
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+import leitura_colunar
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+# Configuração do cache (ajustada pelos scripts via configurar())
+CACHE_CONFIG = {
+    'habilitado': True,
+    'atualizar': False,  # --refresh: ignora entradas existentes e regrava
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache'),
+    'max_bytes': 2 * 1024 ** 3,
+    'ttl_padrao': 6 * 3600,
+}
+
+ARQUIVO_INDICE = 'indice.json'
+
+# Leituras em paralelo (partições de vendas) usam o mesmo índice: cada ciclo
+# carregar/alterar/salvar do indice.json acontece com este lock
+_LOCK_INDICE = threading.Lock()
+
+def configurar(**opcoes):
+    """Atualiza a configuração do cache (habilitado, atualizar, diretorio, max_bytes, ttl_padrao)"""
+    for chave, valor in opcoes.items():
+        if chave not in CACHE_CONFIG:
+            raise KeyError(f"Opção de cache desconhecida: {chave}")
+        if valor is not None:
+            CACHE_CONFIG[chave] = valor
+
+def normalizar_sql(query: str) -> str:
+    """Colapsa espaços fora de literais e remove espaços nas pontas"""
+    partes = query.strip().split("'")
+    # Partes pares estão fora de aspas
+    for i in range(0, len(partes), 2):
+        partes[i] = re.sub(r'\s+', ' ', partes[i])
+    return "'".join(partes)
+
+def chave_consulta(query: str, params=None) -> str:
+    """Hash do SQL normalizado + parâmetros"""
+    conteudo = normalizar_sql(query) + '\x00' + repr(params)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+def _caminho_indice():
+    return os.path.join(CACHE_CONFIG['diretorio'], ARQUIVO_INDICE)
+
+def _carregar_indice() -> dict:
+    try:
+        with open(_caminho_indice(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _salvar_indice(indice: dict):
+    os.makedirs(CACHE_CONFIG['diretorio'], exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=ARQUIVO_INDICE + '.', suffix='.tmp', dir=CACHE_CONFIG['diretorio'])
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, indent=1)
+        os.replace(tmp, _caminho_indice())
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _remover_entrada(indice: dict, chave: str):
+    entrada = indice.pop(chave, None)
+    if entrada:
+        try:
+            os.remove(os.path.join(CACHE_CONFIG['diretorio'], entrada['arquivo']))
+        except OSError:
+            pass
+
+def _gravar_df(df: pd.DataFrame, chave: str) -> str:
+    """Grava o DataFrame em Parquet; se os tipos não forem suportados, usa pickle"""
+    diretorio = CACHE_CONFIG['diretorio']
+    os.makedirs(diretorio, exist_ok=True)
+    if PARQUET_DISPONIVEL:
+        arquivo = f"{chave}.parquet"
+        try:
+            df.to_parquet(os.path.join(diretorio, arquivo), index=False)
+            return arquivo
+        except Exception:
+            pass
+    arquivo = f"{chave}.pkl"
+    df.to_pickle(os.path.join(diretorio, arquivo))
+    return arquivo
+
+def _ler_df(arquivo: str) -> pd.DataFrame:
+    caminho = os.path.join(CACHE_CONFIG['diretorio'], arquivo)
+    if arquivo.endswith('.parquet'):
+        return pd.read_parquet(caminho)
+    return pd.read_pickle(caminho)
+
+def aplicar_limite(indice: dict):
+    """Descarta entradas expiradas e as menos usadas até caber em max_bytes"""
+    agora = time.time()
+    for chave in [c for c, e in indice.items() if agora - e['criado'] > e['ttl']]:
+        _remover_entrada(indice, chave)
+
+    total = sum(e['tamanho'] for e in indice.values())
+    for chave, _ in sorted(indice.items(), key=lambda x: x[1]['ultimo_acesso']):
+        if total <= CACHE_CONFIG['max_bytes']:
+            break
+        total -= indice[chave]['tamanho']
+        _remover_entrada(indice, chave)
+
+def ler_sql(query: str, conn, params=None, ttl=None, nome=None) -> pd.DataFrame:
+    """
+    Equivalente a pd.read_sql(query, conn, params=params) com cache em disco
+    (a leitura em si usa o backend configurado em leitura_colunar).
+    ttl em segundos (padrão CACHE_CONFIG['ttl_padrao']); nome é só para o índice/log.
+    """
+    if not CACHE_CONFIG['habilitado']:
+        return leitura_colunar.ler_sql(query, conn, params=params)
+
+    ttl = CACHE_CONFIG['ttl_padrao'] if ttl is None else ttl
+    chave = chave_consulta(query, params)
+    with _LOCK_INDICE:
+        indice = _carregar_indice()
+        entrada = indice.get(chave)
+        if entrada and not CACHE_CONFIG['atualizar'] and time.time() - entrada['criado'] <= entrada['ttl']:
+            try:
+                df = _ler_df(entrada['arquivo'])
+                entrada['ultimo_acesso'] = time.time()
+                _salvar_indice(indice)
+                print(f"  (cache) {nome or chave[:12]}: {len(df):,} registros")
+                return df
+            except (OSError, ValueError):
+                _remover_entrada(indice, chave)
+                _salvar_indice(indice)
+
+    # A consulta roda fora do lock (as partições leem do servidor ao mesmo tempo)
+    df = leitura_colunar.ler_sql(query, conn, params=params)
+
+    with _LOCK_INDICE:
+        indice = _carregar_indice()
+        _remover_entrada(indice, chave)
+        arquivo = _gravar_df(df, chave)
+        agora = time.time()
+        indice[chave] = {
+            'arquivo': arquivo,
+            'nome': nome,
+            'criado': agora,
+            'ultimo_acesso': agora,
+            'ttl': ttl,
+            'tamanho': os.path.getsize(os.path.join(CACHE_CONFIG['diretorio'], arquivo)),
+            'registros': len(df),
+        }
+        aplicar_limite(indice)
+        _salvar_indice(indice)
+    return df
+
+def limpar_cache():
+    """Remove todas as entradas do cache"""
+    with _LOCK_INDICE:
+        indice = _carregar_indice()
+        for chave in list(indice):
+            _remover_entrada(indice, chave)
+        _salvar_indice(indice)
+
+def resumo_cache() -> dict:
+    """Estatísticas do cache (entradas, bytes, expiradas)"""
+    indice = _carregar_indice()
+    agora = time.time()
+    return {
+        'entradas': len(indice),
+        'bytes': sum(e['tamanho'] for e in indice.values()),
+        'expiradas': sum(1 for e in indice.values() if agora - e['criado'] > e['ttl']),
+        'max_bytes': CACHE_CONFIG['max_bytes'],
+    }
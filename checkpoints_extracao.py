@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoints de extração para retomar exportações longas (--checkpoint / --resume)
+Cada peça concluída (query inteira ou partição) é gravada em disco e
+registrada no manifesto da execução; a execução é apagada ao terminar.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+CHECKPOINT_CONFIG = {
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'checkpoints'),
+}
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+_trava = threading.Lock()
+_execucao = {'dir': None, 'manifesto': None}
+
+def chave_peca(nome, query):
+    """Chave da peça: nome legível + hash da query (query diferente = peça diferente)"""
+    return f"{nome}_{hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]}"
+
+def _caminho_manifesto():
+    return os.path.join(_execucao['dir'], ARQUIVO_MANIFESTO)
+
+def _salvar_manifesto():
+    tmp = _caminho_manifesto() + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_execucao['manifesto'], f, indent=1)
+    os.replace(tmp, _caminho_manifesto())
+
+def iniciar_execucao(job, retomar=False, parametros=None):
+    """
+    Abre a execução do job. Com retomar=True reaproveita as peças de uma
+    execução anterior interrompida com os mesmos parâmetros; caso contrário
+    descarta o que houver e começa do zero. Retorna o número de peças reaproveitadas.
+    """
+    diretorio = os.path.join(CHECKPOINT_CONFIG['diretorio'], job)
+    manifesto = None
+    if retomar:
+        try:
+            with open(os.path.join(diretorio, ARQUIVO_MANIFESTO), 'r', encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            manifesto = None
+        if manifesto is not None and manifesto.get('parametros') != parametros:
+            print("⚠ Checkpoint encontrado é de outra configuração; começando do zero")
+            manifesto = None
+
+    if manifesto is None:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        manifesto = {
+            'job': job,
+            'parametros': parametros,
+            'criado': datetime.now().isoformat(timespec='seconds'),
+            'pecas': {},
+        }
+
+    os.makedirs(diretorio, exist_ok=True)
+    with _trava:
+        _execucao['dir'] = diretorio
+        _execucao['manifesto'] = manifesto
+        _salvar_manifesto()
+    return len(manifesto['pecas'])
+
+def ativo():
+    return _execucao['dir'] is not None
+
+def obter_peca(chave):
+    """DataFrame da peça se ela já foi concluída nesta execução, senão None"""
+    if not ativo():
+        return None
+    with _trava:
+        peca = _execucao['manifesto']['pecas'].get(chave)
+    if peca is None:
+        return None
+    caminho = os.path.join(_execucao['dir'], peca['arquivo'])
+    try:
+        if peca['arquivo'].endswith('.parquet'):
+            return pd.read_parquet(caminho)
+        return pd.read_pickle(caminho)
+    except (OSError, ValueError):
+        return None
+
+def gravar_peca(chave, df):
+    """Grava a peça concluída e a registra no manifesto"""
+    if not ativo():
+        return
+    arquivo = None
+    if PARQUET_DISPONIVEL:
+        arquivo = f"{chave}.parquet"
+        try:
+            df.to_parquet(os.path.join(_execucao['dir'], arquivo), index=False)
+        except Exception:
+            arquivo = None
+    if arquivo is None:
+        arquivo = f"{chave}.pkl"
+        df.to_pickle(os.path.join(_execucao['dir'], arquivo))
+
+    with _trava:
+        _execucao['manifesto']['pecas'][chave] = {
+            'arquivo': arquivo,
+            'registros': len(df),
+            'concluida_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        _salvar_manifesto()
+
+def com_checkpoint(chave, extrair):
+    """Retorna a peça do checkpoint ou executa extrair() e grava o resultado"""
+    df = obter_peca(chave)
+    if df is not None:
+        print(f"  (checkpoint) {chave.rsplit('_', 1)[0]}: {len(df):,} registros")
+        return df
+    df = extrair()
+    gravar_peca(chave, df)
+    return df
+
+def concluir_execucao():
+    """Remove os checkpoints da execução (chamado quando tudo terminou bem)"""
+    with _trava:
+        if _execucao['dir']:
+            shutil.rmtree(_execucao['dir'], ignore_errors=True)
+        _execucao['dir'] = None
+        _execucao['manifesto'] = None
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detecção de clientes duplicados em CLIENTES_VAREJO
+A partir da saída de fetch_clientes (exportar_clientes.py): normaliza CPF,
+telefone (DDD + TELEFONE), e-mail e nome sem acentos, gera pares candidatos
+por blocos (clientes com a mesma chave) em vez de comparar todos com todos,
+pontua cada par e agrupa os pares aceitos em grupos de duplicatas.
+"""
+
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+DUPLICATAS_CONFIG = {
+    'limiar': 50,         # pontuação mínima (0-100) para o par ser duplicata
+    'maximo_bloco': 50,   # blocos maiores são valores genéricos (e-mail/telefone da loja): ignorados
+}
+
+# Pontos de cada evidência; o nome soma PESOS['nome'] x similaridade (0-1)
+PESOS = {
+    'cpf': 60,
+    'email': 25,
+    'telefone': 25,
+    'nome': 30,
+    'cpf_diferente': -60,
+}
+
+# Chaves de bloco: pares candidatos são clientes com o mesmo valor em alguma delas
+CHAVES_BLOCO = ['cpf', 'telefone', 'email', 'nome', 'nome_extremos']
+
+def _digitos(serie: pd.Series) -> pd.Series:
+    return serie.fillna('').astype(str).str.replace(r'\D', '', regex=True)
+
+def _sem_acentos(serie: pd.Series) -> pd.Series:
+    return (serie.fillna('').astype(str)
+            .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii'))
+
+def _repetido(serie: pd.Series) -> pd.Series:
+    """Valores de um só dígito repetido (00000000000, 99999999)"""
+    return serie.map(lambda valor: len(set(valor)) == 1).astype(bool)
+
+def _sem_genericos(serie: pd.Series, maximo_bloco: int) -> pd.Series:
+    """Esvazia valores repetidos em mais de maximo_bloco clientes (naotem@..., telefone da loja)"""
+    frequencia = serie.map(serie.value_counts())
+    return serie.where((serie == '') | (frequencia <= maximo_bloco), '')
+
+def normalizar(clientes_df: pd.DataFrame, maximo_bloco: Optional[int] = None) -> pd.DataFrame:
+    """
+    Chaves normalizadas por cliente (vazias quando o campo não serve para comparar):
+    cpf (11 ou 14 dígitos), telefone (DDD + últimos 8 dígitos, cobre o 9 do celular),
+    email (minúsculas), nome (sem acentos, só letras) e nome_extremos (primeiro + último nome).
+    CPF, telefone e e-mail genéricos não contam nem para blocos nem para a pontuação.
+    """
+    maximo_bloco = maximo_bloco or DUPLICATAS_CONFIG['maximo_bloco']
+    cpf = _digitos(clientes_df['cpf'])
+    cpf = cpf.where(cpf.str.len().isin([11, 14]) & ~_repetido(cpf), '')
+
+    telefone = _digitos(clientes_df['telefone']).str.lstrip('0')
+    ddd = telefone.str[:2].where(telefone.str.len() >= 10, '')
+    telefone = (ddd + telefone.str[-8:]).where(telefone.str.len() >= 8, '')
+    telefone = telefone.where(~_repetido(telefone.str[-8:]), '')
+
+    email = clientes_df['email'].fillna('').astype(str).str.strip().str.lower()
+    email = email.where(email.str.match(r'^[^@\s]+@[^@\s]+\.[^@\s]+$'), '')
+
+    nome = (_sem_acentos(clientes_df['nomeCliente']).str.upper()
+            .str.replace(r'[^A-Z ]', ' ', regex=True).str.split().str.join(' '))
+    nome = nome.where(nome != 'SEM NOME', '')
+    tokens = nome.str.split()
+    extremos = (tokens.str[0] + ' ' + tokens.str[-1]).where(tokens.str.len() >= 2, '')
+
+    return pd.DataFrame({
+        'cpf': _sem_genericos(cpf, maximo_bloco).to_numpy(),
+        'telefone': _sem_genericos(telefone, maximo_bloco).to_numpy(),
+        'email': _sem_genericos(email, maximo_bloco).to_numpy(),
+        'nome': nome.fillna('').to_numpy(),
+        'nome_extremos': extremos.fillna('').to_numpy(),
+    })
+
+def pares_candidatos(chaves: pd.DataFrame, maximo_bloco: Optional[int] = None) -> pd.DataFrame:
+    """
+    Pares (a, b), a < b, de clientes que dividem alguma chave de bloco.
+    Blocos acima de maximo_bloco são ignorados: o custo fica proporcional ao
+    número de clientes e não ao quadrado dele.
+    """
+    maximo_bloco = maximo_bloco or DUPLICATAS_CONFIG['maximo_bloco']
+    pares = []
+    for chave in CHAVES_BLOCO:
+        valores = chaves[chave]
+        ids = pd.DataFrame({'id': np.arange(len(chaves)), 'chave': valores.to_numpy()})
+        ids = ids[ids['chave'] != '']
+        tamanho = ids.groupby('chave')['id'].transform('size')
+        ids = ids[(tamanho >= 2) & (tamanho <= maximo_bloco)]
+        if ids.empty:
+            continue
+        cruzados = ids.merge(ids, on='chave', suffixes=('_a', '_b'))
+        cruzados = cruzados[cruzados['id_a'] < cruzados['id_b']]
+        pares.append(cruzados[['id_a', 'id_b']])
+    if not pares:
+        return pd.DataFrame({'id_a': np.array([], dtype=np.int64), 'id_b': np.array([], dtype=np.int64)})
+    return pd.concat(pares, ignore_index=True).drop_duplicates().reset_index(drop=True)
+
+def similaridade_nomes(nomes_a, nomes_b) -> np.ndarray:
+    """Jaccard dos conjuntos de palavras de cada par de nomes normalizados"""
+    resultado = np.zeros(len(nomes_a))
+    cache: Dict[str, frozenset] = {}
+    for i, (a, b) in enumerate(zip(nomes_a, nomes_b)):
+        if not a or not b:
+            continue
+        if a == b:
+            resultado[i] = 1.0
+            continue
+        ta = cache.get(a) or cache.setdefault(a, frozenset(a.split()))
+        tb = cache.get(b) or cache.setdefault(b, frozenset(b.split()))
+        resultado[i] = len(ta & tb) / len(ta | tb)
+    return resultado
+
+def pontuar(chaves: pd.DataFrame, pares: pd.DataFrame) -> pd.DataFrame:
+    """Pontuação (0-100) e motivos de cada par candidato"""
+    a, b = pares['id_a'].to_numpy(), pares['id_b'].to_numpy()
+    pontos = np.zeros(len(pares))
+    iguais = {}
+    for campo in ['cpf', 'email', 'telefone']:
+        va, vb = chaves[campo].to_numpy()[a], chaves[campo].to_numpy()[b]
+        preenchidos = (va != '') & (vb != '')
+        iguais[campo] = preenchidos & (va == vb)
+        pontos += np.where(iguais[campo], PESOS[campo], 0)
+        if campo == 'cpf':
+            pontos += np.where(preenchidos & (va != vb), PESOS['cpf_diferente'], 0)
+    nomes = chaves['nome'].to_numpy()
+    similaridade = similaridade_nomes(nomes[a], nomes[b])
+    pontos += PESOS['nome'] * similaridade
+
+    motivos = np.full(len(pares), '', dtype=object)
+    for campo in ['cpf', 'email', 'telefone']:
+        motivos = np.where(iguais[campo], motivos + campo + ', ', motivos)
+    motivos = np.where(similaridade >= 1, motivos + 'nome igual, ',
+                       np.where(similaridade > 0, motivos + 'nome parecido, ', motivos))
+
+    resultado = pares.copy()
+    resultado['pontuacao'] = np.clip(pontos, 0, 100).round(1)
+    resultado['motivos'] = pd.Series(motivos, index=pares.index).str.rstrip(', ')
+    return resultado
+
+def agrupar(total: int, pares: pd.DataFrame) -> np.ndarray:
+    """Grupo (union-find) de cada cliente a partir dos pares aceitos; -1 = sem duplicata"""
+    pai = list(range(total))
+
+    def raiz(x):
+        while pai[x] != x:
+            pai[x] = pai[pai[x]]
+            x = pai[x]
+        return x
+
+    for x, y in zip(pares['id_a'].to_numpy(), pares['id_b'].to_numpy()):
+        rx, ry = raiz(int(x)), raiz(int(y))
+        if rx != ry:
+            pai[max(rx, ry)] = min(rx, ry)
+
+    grupos = np.full(total, -1)
+    envolvidos = np.unique(np.concatenate([pares['id_a'].to_numpy(), pares['id_b'].to_numpy()]))
+    for x in envolvidos:
+        grupos[x] = raiz(int(x))
+    return grupos
+
+def detectar(clientes_df: pd.DataFrame, limiar: Optional[float] = None) -> pd.DataFrame:
+    """
+    Grupos de clientes duplicados: uma linha por cliente de cada grupo, com
+    grupo, tamanho, maior pontuação do cliente nos pares e motivos do grupo.
+    Os clientes são deduplicados por nomeCliente (chave de CLIENTES_VAREJO).
+    """
+    limiar = DUPLICATAS_CONFIG['limiar'] if limiar is None else limiar
+    clientes = clientes_df.drop_duplicates(subset=['nomeCliente'], keep='last').reset_index(drop=True)
+    chaves = normalizar(clientes)
+    candidatos = pares_candidatos(chaves)
+    pontuados = pontuar(chaves, candidatos)
+    aceitos = pontuados[pontuados['pontuacao'] >= limiar]
+    print(f"✓ Duplicatas: {len(clientes):,} clientes, {len(candidatos):,} pares candidatos, "
+          f"{len(aceitos):,} pares acima de {limiar}")
+
+    grupos = agrupar(len(clientes), aceitos)
+    if not (grupos >= 0).any():
+        return pd.DataFrame(columns=['grupo', 'tamanhoGrupo', 'pontuacao', 'motivos'] + list(clientes.columns))
+
+    # Maior pontuação de cada cliente e motivos de cada grupo
+    lados = pd.concat([
+        aceitos[['id_a', 'pontuacao', 'motivos']].rename(columns={'id_a': 'id'}),
+        aceitos[['id_b', 'pontuacao', 'motivos']].rename(columns={'id_b': 'id'}),
+    ])
+    pontuacao = lados.groupby('id')['pontuacao'].max()
+    lados['grupo'] = grupos[lados['id'].to_numpy()]
+    motivos = lados.groupby('grupo')['motivos'].agg(
+        lambda m: ', '.join(sorted({motivo for texto in m for motivo in texto.split(', ') if motivo})))
+
+    ids = np.flatnonzero(grupos >= 0)
+    resultado = clientes.iloc[ids].copy()
+    resultado.insert(0, 'grupo', grupos[ids])
+    resultado.insert(1, 'tamanhoGrupo', resultado.groupby('grupo')['grupo'].transform('size').to_numpy())
+    resultado.insert(2, 'pontuacao', pontuacao.reindex(ids).to_numpy())
+    resultado.insert(3, 'motivos', motivos.reindex(grupos[ids]).to_numpy())
+
+    # Grupos numerados de 1 em diante, maiores pontuações primeiro
+    ordem = resultado.groupby('grupo')['pontuacao'].transform('max')
+    resultado = (resultado.assign(_ordem=ordem)
+                 .sort_values(['_ordem', 'grupo', 'pontuacao'], ascending=[False, True, False], kind='stable')
+                 .drop(columns='_ordem'))
+    resultado['grupo'] = pd.factorize(resultado['grupo'])[0] + 1
+    print(f"✓ {resultado['grupo'].nunique():,} grupos de duplicatas ({len(resultado):,} clientes)")
+    return resultado.reset_index(drop=True)
+
+def resumo(duplicatas_df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Métricas para a aba de estatísticas (mesmo formato de ANALISE_DUPLICATAS.xlsx)"""
+    grupos = duplicatas_df.drop_duplicates('grupo')
+    return [
+        {'METRICA': 'Grupos de duplicatas', 'VALOR': len(grupos)},
+        {'METRICA': 'Clientes em grupos de duplicatas', 'VALOR': len(duplicatas_df)},
+        {'METRICA': 'Cadastros excedentes (clientes - grupos)', 'VALOR': len(duplicatas_df) - len(grupos)},
+        {'METRICA': 'Maior grupo', 'VALOR': int(grupos['tamanhoGrupo'].max()) if len(grupos) else 0},
+    ]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Empresas e filiais (mesma lógica do TypeScript)
+Compartilhado pelo exportador de clientes e pela saída particionada dos relatórios
+"""
+
+COMPANIES = {
+    'nerd': {
+        'name': 'NERD',
+        'filiais': [
+            'NERD CENTER NORTE',
+            'NERD HIGIENOPOLIS',
+            'NERD LEBLON',
+            'NERD MORUMBI RDRRRJ',
+            'NERD VILLA LOBOS',
+        ],
+        'filial_display_names': {
+            'NERD CENTER NORTE': 'CENTER NORTE',
+            'NERD HIGIENOPOLIS': 'HIGIENOPOLIS',
+            'NERD LEBLON': 'LEBLON',
+            'NERD MORUMBI RDRRRJ': 'MORUMBI',
+            'NERD VILLA LOBOS': 'VILLA LOBOS',
+        }
+    },
+    'scarfme': {
+        'name': 'SCARF ME',
+        'filiais': [
+            'GUARULHOS - RSR',
+            'IGUATEMI SP - JJJ',
+            'MORUMBI - JJJ',
+            'OSCAR FREIRE - FSZ',
+            'SCARF ME - HIGIENOPOLIS 2',
+            'SCARFME - IBIRAPUERA LLL',
+            'SCARFME ME - PAULISTA FFF',
+            'SCARF ME - MATRIZ',
+            'SCARFME MATRIZ CMS',
+            'VILLA LOBOS - LLL',
+        ],
+        'filial_display_names': {
+            'GUARULHOS - RSR': 'GUARULHOS',
+            'IGUATEMI SP - JJJ': 'IGUATEMI',
+            'MORUMBI - JJJ': 'MORUMBI',
+            'OSCAR FREIRE - FSZ': 'OSCAR FREIRE',
+            'SCARF ME - HIGIENOPOLIS 2': 'HIGIENÓPOLIS',
+            'SCARFME - IBIRAPUERA LLL': 'IBIRAPUERA',
+            'SCARFME ME - PAULISTA FFF': 'PAULISTA',
+            'SCARF ME - MATRIZ': 'MATRIZ',
+            'SCARFME MATRIZ CMS': 'E-COMMERCE',
+            'VILLA LOBOS - LLL': 'VILLA LOBOS',
+        },
+        'ecommerce_filiais': ['SCARFME MATRIZ CMS']
+    }
+}
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gravação rápida de CSV no formato dos relatórios (sep=';', decimal=',', utf-8-sig)
+Blocos de linhas são codificados em paralelo e gravados em ordem; opcionalmente
+gera variantes .csv.gz / .csv.zst (um membro/frame por bloco, também em paralelo)
+"""
+
+import os
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+try:
+    import zstandard
+    ZSTD_DISPONIVEL = True
+except ImportError:
+    ZSTD_DISPONIVEL = False
+
+ESCRITA_CONFIG = {
+    'modo': 'rapido',  # 'pandas' = df.to_csv direto (caminho original)
+    'threads': min(8, os.cpu_count() or 4),
+    'linhas_bloco': 100000,
+    'compressao': [],  # 'gz' e/ou 'zst'
+}
+
+COMPRESSOES = ('gz', 'zst')
+
+BOM = b'\xef\xbb\xbf'
+
+def compressoes_ativas():
+    """Compressões configuradas que podem ser geradas neste ambiente"""
+    ativas = []
+    for ext in ESCRITA_CONFIG['compressao']:
+        if ext == 'zst' and not ZSTD_DISPONIVEL:
+            continue
+        if ext in COMPRESSOES and ext not in ativas:
+            ativas.append(ext)
+    return ativas
+
+def _formatar_float(valores):
+    """
+    float64 -> texto igual ao do to_csv(decimal=','): repr do número com
+    vírgula e vazio para NaN, só que vetorizado
+    """
+    if valores.size == 0:
+        return valores.astype(object)
+    texto = np.char.replace(valores.astype(str), '.', ',').astype(object)
+    texto[np.isnan(valores)] = ''
+    return texto
+
+def _preparar(df):
+    """
+    Datas são formatadas com a coluna inteira (o to_csv escolhe o formato
+    olhando todos os valores, e um bloco isolado poderia sair diferente)
+    """
+    datas = [c for c in df.columns if pd.api.types.is_datetime64_dtype(df[c])]
+    if not datas:
+        return df
+    return df.assign(**{c: df[c].astype(str) for c in datas})
+
+def _comprimir(dados, ext):
+    if ext == 'gz':
+        return gzip.compress(dados, compresslevel=6, mtime=0)
+    return zstandard.ZstdCompressor(level=3).compress(dados)
+
+def _codificar_bloco(bloco, primeiro, compressoes):
+    """Bloco -> bytes do CSV (com BOM e cabeçalho se for o primeiro) e variantes comprimidas"""
+    floats = {c: _formatar_float(bloco[c].to_numpy())
+              for c in bloco.columns if bloco[c].dtype == np.float64}
+    if floats:
+        bloco = bloco.assign(**floats)
+    dados = bloco.to_csv(None, index=False, header=primeiro, sep=';', decimal=',').encode('utf-8')
+    if primeiro:
+        dados = BOM + dados
+    return dados, {ext: _comprimir(dados, ext) for ext in compressoes}
+
+def _gravar_resultado(arquivos, resultado):
+    dados, comprimidos = resultado
+    arquivos[None].write(dados)
+    for ext, conteudo in comprimidos.items():
+        arquivos[ext].write(conteudo)
+
+def codificar_blocos(df, cabecalho=True, compressoes=()):
+    """
+    Gera, em ordem, (bytes do CSV, {ext: bytes comprimidos}) de cada bloco de linhas,
+    codificados em paralelo. cabecalho=False omite BOM e cabeçalho (continuação).
+    """
+    df = _preparar(df)
+    tamanho = max(1, ESCRITA_CONFIG['linhas_bloco'])
+    with ThreadPoolExecutor(max_workers=ESCRITA_CONFIG['threads'], thread_name_prefix='csv') as executor:
+        # Janela limitada de blocos em voo para não manter o CSV inteiro em memória
+        janela = ESCRITA_CONFIG['threads'] * 2
+        pendentes = []
+        for inicio in range(0, max(len(df), 1), tamanho):
+            bloco = df.iloc[inicio:inicio + tamanho]
+            primeiro = inicio == 0 and cabecalho
+            pendentes.append(executor.submit(_codificar_bloco, bloco, primeiro, compressoes))
+            if len(pendentes) >= janela:
+                yield pendentes.pop(0).result()
+        for futuro in pendentes:
+            yield futuro.result()
+
+def salvar_csv(df, caminho, anexar=False):
+    """
+    Equivalente a df.to_csv(caminho, index=False, encoding='utf-8-sig', sep=';', decimal=',').
+    anexar=True acrescenta as linhas sem cabeçalho/BOM (gravação em blocos).
+    Variantes .gz/.zst são arquivos multi-membro/multi-frame, lidos normalmente
+    por gzip/zstd e pelo pandas. Retorna a lista de arquivos gravados.
+    """
+    compressoes = compressoes_ativas()
+    caminhos = {None: caminho}
+    caminhos.update({ext: f"{caminho}.{ext}" for ext in compressoes})
+    modo = 'ab' if anexar else 'wb'
+
+    if ESCRITA_CONFIG['modo'] == 'pandas':
+        dados = df.to_csv(None, index=False, header=not anexar, sep=';', decimal=',').encode('utf-8')
+        if not anexar:
+            dados = BOM + dados
+        for ext, c in caminhos.items():
+            with open(c, modo) as arquivo:
+                arquivo.write(dados if ext is None else _comprimir(dados, ext))
+        return list(caminhos.values())
+
+    arquivos = {ext: open(c, modo) for ext, c in caminhos.items()}
+    try:
+        for resultado in codificar_blocos(df, cabecalho=not anexar, compressoes=compressoes):
+            _gravar_resultado(arquivos, resultado)
+    finally:
+        for arquivo in arquivos.values():
+            arquivo.close()
+    return list(caminhos.values())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CLI unificada dos exportadores Scarfme
+  python exportador.py relatorios [produtos estoque vendas ecommerce entradas | todos]
+  python exportador.py clientes --company nerd ...
+  python exportador.py bench [queries...]
+  python exportador.py cache {resumo,limpar}
+  python exportador.py servico [--porta 8765]
+Só a biblioteca padrão é importada na inicialização; pandas/pyodbc/openpyxl
+e os motores são carregados quando o subcomando realmente roda.
+"""
+
+import sys
+import time
+import argparse
+import importlib
+
+_INICIO = time.perf_counter()
+
+# Tempo máximo (segundos) até o subcomando começar a rodar
+ORCAMENTO_INICIALIZACAO = 0.3
+
+# Módulos pesados que não podem ser carregados antes do subcomando
+MODULOS_PESADOS = ['pandas', 'numpy', 'pyodbc', 'openpyxl', 'pyarrow', 'xlsxwriter']
+
+RELATORIOS = ['produtos', 'estoque', 'vendas', 'ecommerce', 'entradas']
+
+# Mesmos nomes de leitura_colunar.BACKENDS / escrita_csv.COMPRESSOES
+BACKENDS_LEITURA = ['pandas', 'colunar', 'arrow']
+COMPRESSOES_CSV = ['gz', 'zst']
+
+TEMPOS_IMPORTACAO = {}
+
+def importar(nome):
+    """Importa o módulo sob demanda registrando o tempo gasto"""
+    if nome in sys.modules:
+        return sys.modules[nome]
+    t = time.perf_counter()
+    modulo = importlib.import_module(nome)
+    TEMPOS_IMPORTACAO[nome] = time.perf_counter() - t
+    return modulo
+
+def diagnostico_inicializacao(detalhado=False):
+    """
+    Mostra o tempo de inicialização e avisa se passou do orçamento
+    ou se algum módulo pesado foi importado cedo demais.
+    """
+    decorrido = time.perf_counter() - _INICIO
+    carregados = [m for m in MODULOS_PESADOS if m in sys.modules]
+    if detalhado:
+        print(f"Inicialização: {decorrido * 1000:.0f} ms (orçamento {ORCAMENTO_INICIALIZACAO * 1000:.0f} ms)")
+        print(f"Módulos pesados já carregados: {', '.join(carregados) or 'nenhum'}")
+    if decorrido > ORCAMENTO_INICIALIZACAO:
+        print(f"⚠ Inicialização levou {decorrido * 1000:.0f} ms (orçamento {ORCAMENTO_INICIALIZACAO * 1000:.0f} ms)")
+    if carregados:
+        print(f"⚠ Importados antes do subcomando: {', '.join(carregados)}")
+
+def diagnostico_importacoes():
+    """Tempo das importações sob demanda feitas pelo subcomando"""
+    if not TEMPOS_IMPORTACAO:
+        return
+    print("\nImportações sob demanda:")
+    for nome, segundos in sorted(TEMPOS_IMPORTACAO.items(), key=lambda x: -x[1]):
+        print(f"  {nome:<28} {segundos * 1000:8.0f} ms")
+
+def argumentos_consulta(parser):
+    """Opções de cache/leitura comuns a relatorios e clientes"""
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Não usar o cache local de consultas')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignorar o cache existente e regravar com dados novos do servidor')
+    parser.add_argument('--backend', choices=BACKENDS_LEITURA, default=None,
+                        help='Backend de leitura do SQL (padrão: colunar; arrow usa o driver arrow-odbc, '
+                             'se instalado)')
+
+def argumentos_preview(parser):
+    """Modo preview comum a relatorios e clientes (amostragem.py)"""
+    parser.add_argument('--preview', action='store_true',
+                        help='Rodar sobre uma amostra limitada no servidor (TOP N, TABLESAMPLE ou '
+                             'só os últimos dias) para conferir filtros/layout em segundos')
+    parser.add_argument('--preview-linhas', type=int, default=None,
+                        help='Linhas da amostra no preview (padrão: 5000)')
+    parser.add_argument('--preview-dias', type=int, default=None,
+                        help='Dias mais recentes das queries com filtro de data no preview (padrão: 7)')
+
+def relatorio_valido(nome):
+    # choices + nargs='*' rejeita a lista vazia em algumas versões do argparse
+    if nome not in RELATORIOS + ['todos']:
+        raise argparse.ArgumentTypeError(
+            f"relatório inválido: '{nome}' (opções: {', '.join(RELATORIOS)}, todos)")
+    return nome
+
+def argumentos_relatorios(parser):
+    """Argumentos de exportar_todos_relatorios3 (padrões None = configuração do módulo)"""
+    parser.add_argument('relatorios', nargs='*', metavar='RELATORIO', type=relatorio_valido,
+                        help=f"Relatórios a exportar: {', '.join(RELATORIOS)} ou todos "
+                             "(sem argumentos: menu interativo, ou todos se não houver terminal)")
+    argumentos_consulta(parser)
+    parser.add_argument('--paralelismo', type=int, default=None,
+                        help='Conexões simultâneas para vendas/e-commerce particionados (1 = sem particionar)')
+    parser.add_argument('--dias-particao', type=int, default=None,
+                        help='Tamanho da partição em dias (0 = mensal)')
+    parser.add_argument('--vendas-em-blocos', action='store_true',
+                        help='Processar vendas partição a partição (memória limitada, mesmo resultado)')
+    parser.add_argument('--vendas-normalizado', action='store_true',
+                        help='Vendas em duas tabelas: vendas_tickets (cabeçalho por ticket) e vendas_itens '
+                             '(linhas sem os campos do cabeçalho), em vez de vendas_tratadas')
+    parser.add_argument('--sem-cubos', action='store_true',
+                        help='Não gerar os cubos pré-agregados de vendas (data/cubos) usados pelo dashboard')
+    parser.add_argument('--particionado', action='store_true',
+                        help='Gravar também vendas/e-commerce/entradas em data/particionado, uma pasta por '
+                             'empresa/filial/mês com manifesto (só as partições alteradas são regravadas)')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='Gravar cada parte extraída em data/checkpoints para poder retomar com --resume')
+    parser.add_argument('--resume', action='store_true',
+                        help='Retomar a extração interrompida (feita com --checkpoint), buscando só as partes que faltam')
+    parser.add_argument('--memoria-mb', type=int, default=None,
+                        help='Orçamento de memória em MB para o --preflight (padrão: 60%% da memória disponível)')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Estimar o tamanho das queries antes (COUNT/TOP 0 no servidor) e processar '
+                             'vendas em blocos se não couber no orçamento de memória')
+    parser.add_argument('--sem-historico-estoque', action='store_true',
+                        help='Não gerar o delta/histórico do estoque')
+    parser.add_argument('--sem-copia-produtos', action='store_true',
+                        help='Ler PRODUTOS inteiro em vez da cópia local atualizada pelo rowversion')
+    parser.add_argument('--csv', choices=['rapido', 'pandas'], default=None,
+                        help='Gravação do CSV: rapido (blocos em paralelo) ou pandas (df.to_csv)')
+    parser.add_argument('--compressao', nargs='+', choices=COMPRESSOES_CSV, default=[],
+                        help='Gerar também .csv.gz/.csv.zst (copiados junto para os destinos)')
+    argumentos_preview(parser)
+
+EXEMPLOS_CLIENTES = """
+Exemplos:
+  # Exportar clientes do mês atual (NERD)
+  python exportar_clientes.py --company nerd
+
+  # Exportar com filtros específicos
+  python exportar_clientes.py --company scarfme --filial "SCARF ME - MATRIZ" --start 2024-01-01 --end 2024-01-31
+
+  # Exportar com busca por termo
+  python exportar_clientes.py --company nerd --search "João"
+
+  # Construir índice local e buscar sem LIKE no servidor
+  python exportar_clientes.py --build-index --start 2015-01-01 --end 2025-12-31
+  python exportar_clientes.py --company nerd --search "joao" --local-search --fuzzy
+
+  # Conferir filtros/layout numa amostra (arquivo *_preview.xlsx)
+  python exportar_clientes.py --company nerd --preview
+
+  # Vendas da base local (gerada por exportar_todos_relatorios3), sem consultar o servidor
+  python exportar_clientes.py --company nerd --start 2025-01-01 --end 2025-06-30 --vendas-local
+
+  # Grupos de clientes duplicados em toda a base (planilha duplicatas_clientes_*.xlsx)
+  python exportar_clientes.py --duplicatas
+
+  (os mesmos argumentos valem para: python exportador.py clientes ...)
+"""
+
+def argumentos_clientes(parser):
+    """Argumentos de exportar_clientes"""
+    parser.add_argument('--company', choices=['nerd', 'scarfme'],
+                        help='Empresa (nerd ou scarfme)')
+    parser.add_argument('--filial', type=str,
+                        help='Filial específica (ou "__VAREJO__" para apenas varejo)')
+    parser.add_argument('--vendedor', type=str,
+                        help='Código ou nome do vendedor')
+    parser.add_argument('--start', type=str,
+                        help='Data inicial (YYYY-MM-DD). Padrão: primeiro dia do mês atual')
+    parser.add_argument('--end', type=str,
+                        help='Data final (YYYY-MM-DD). Padrão: último dia do mês atual')
+    parser.add_argument('--search', type=str,
+                        help='Termo de busca (nome do cliente ou vendedor)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Nome do arquivo de saída. Padrão: clientes_YYYYMMDD_HHMMSS.xlsx')
+    parser.add_argument('--no-vendas', action='store_true',
+                        help='Não buscar dados de vendas (apenas clientes)')
+    parser.add_argument('--local-search', action='store_true',
+                        help='Resolver --search no índice local (nome, CPF, telefone, e-mail, vendedor)')
+    parser.add_argument('--fuzzy', action='store_true',
+                        help='Com --local-search, aceitar correspondências aproximadas')
+    parser.add_argument('--build-index', action='store_true',
+                        help='Reconstruir o índice local de busca com os filtros/período informados e sair')
+    parser.add_argument('--vendas-local', action='store_true',
+                        help='Ler as vendas da base local gravada pelo exportador de relatórios '
+                             '(SQL só se a base não cobrir o período)')
+    parser.add_argument('--excel-paralelo', action='store_true',
+                        help='Gerar cada aba do Excel em um processo separado e juntar no final '
+                             '(mesmo arquivo, mais rápido com muitas vendas)')
+    parser.add_argument('--duplicatas', action='store_true',
+                        help='Detectar clientes duplicados (CPF, telefone, e-mail e nome) e gerar uma planilha '
+                             'com os grupos, sem vendas. Sem --start/--end: todos os clientes')
+    parser.add_argument('--limiar-duplicatas', type=float, default=None,
+                        help='Com --duplicatas, pontuação mínima (0-100) de um par duplicado (padrão: 50)')
+    argumentos_consulta(parser)
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='Gravar cada etapa concluída em data/checkpoints para poder retomar com --resume')
+    parser.add_argument('--resume', action='store_true',
+                        help='Retomar exportação interrompida (feita com --checkpoint) com os mesmos filtros '
+                             '(reaproveita etapas concluídas)')
+    argumentos_preview(parser)
+
+def argumentos_servico(parser):
+    """Argumentos de servico_processamento"""
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Endereço de escuta (padrão: só a máquina local)')
+    parser.add_argument('--porta', type=int, default=8765,
+                        help='Porta HTTP (padrão: 8765)')
+    parser.add_argument('--sem-aquecer', action='store_true',
+                        help='Carregar produtos/códigos de barra/cores só na primeira requisição')
+    argumentos_consulta(parser)
+
+# Subcomandos dos motores: help na lista de comandos + opções do ArgumentParser
+SUBCOMANDOS = {
+    'relatorios': {
+        'help': 'Produtos, estoque, vendas, e-commerce e entradas (exportar_todos_relatorios3)',
+        'argumentos': argumentos_relatorios,
+        'opcoes': {'description': 'Exportador de relatórios Scarfme'},
+    },
+    'clientes': {
+        'help': 'Clientes e vendas para Excel (exportar_clientes)',
+        'argumentos': argumentos_clientes,
+        'opcoes': {'description': 'Exporta dados de clientes e vendas para Excel',
+                   'formatter_class': argparse.RawDescriptionHelpFormatter,
+                   'epilog': EXEMPLOS_CLIENTES},
+    },
+    'servico': {
+        'help': 'Serviço HTTP local de processamento para o dashboard (servico_processamento)',
+        'argumentos': argumentos_servico,
+        'opcoes': {'description': 'Serviço local de processamento dos relatórios'},
+    },
+}
+
+def parser_comando(comando):
+    """Parser isolado de um subcomando (usado pelos scripts chamados diretamente)"""
+    spec = SUBCOMANDOS[comando]
+    parser = argparse.ArgumentParser(**spec['opcoes'])
+    spec['argumentos'](parser)
+    return parser
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description='Exportadores Scarfme (relatórios, clientes, benchmark, cache)')
+    parser.add_argument('--diagnostico', action='store_true',
+                        help='Mostrar tempos de inicialização e das importações sob demanda')
+    subparsers = parser.add_subparsers(dest='comando', metavar='COMANDO')
+    subparsers.required = True
+
+    for comando, spec in SUBCOMANDOS.items():
+        spec['argumentos'](subparsers.add_parser(comando, help=spec['help'], **spec['opcoes']))
+
+    bench = subparsers.add_parser('bench', help='Benchmark dos backends de leitura (linhas/s)')
+    bench.add_argument('queries', nargs='*', default=['produtos_barra'],
+                       help='Queries de exportar_todos_relatorios3 (padrão: produtos_barra)')
+    bench.add_argument('--backends', nargs='+', choices=BACKENDS_LEITURA, default=None)
+    bench.add_argument('--repeticoes', type=int, default=1)
+
+    cache = subparsers.add_parser('cache', help='Cache local de consultas')
+    cache.add_argument('acao', choices=['resumo', 'limpar'], nargs='?', default='resumo')
+    return parser
+
+def parse_args(argv=None):
+    return criar_parser().parse_args(argv)
+
+def executar_bench(args):
+    relatorios = importar('exportar_todos_relatorios3')
+    leitura_colunar = importar('leitura_colunar')
+    for nome in args.queries:
+        if nome not in relatorios.QUERIES:
+            print(f"✗ Query desconhecida: {nome} (disponíveis: {', '.join(relatorios.QUERIES)})")
+            sys.exit(1)
+    leitura_colunar.LEITURA_CONFIG['conexao_odbc'] = relatorios.string_conexao()
+    for nome in args.queries:
+        print(f"\n[{nome}]")
+        leitura_colunar.benchmark(relatorios.QUERIES[nome], relatorios.conectar_banco,
+                                  backends=args.backends, repeticoes=args.repeticoes)
+
+def executar_cache(args):
+    cache_consultas = importar('cache_consultas')
+    if args.acao == 'limpar':
+        cache_consultas.limpar_cache()
+        print("✓ Cache de consultas limpo")
+        return
+    resumo = cache_consultas.resumo_cache()
+    print(f"Entradas: {resumo['entradas']:,} ({resumo['expiradas']:,} expiradas)")
+    print(f"Tamanho:  {resumo['bytes'] / 1024 ** 2:,.1f} MB de {resumo['max_bytes'] / 1024 ** 2:,.0f} MB")
+
+COMANDOS = {
+    'relatorios': lambda args: importar('exportar_todos_relatorios3').main(args),
+    'clientes': lambda args: importar('exportar_clientes').main(args),
+    'servico': lambda args: importar('servico_processamento').main(args),
+    'bench': executar_bench,
+    'cache': executar_cache,
+}
+
+def main(argv=None):
+    args = parse_args(argv)
+    diagnostico_inicializacao(detalhado=args.diagnostico)
+    try:
+        COMANDOS[args.comando](args)
+    finally:
+        if args.diagnostico:
+            diagnostico_importacoes()
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,9 @@ Baseado na lógica da sessão de clientes do dashboard
 
 import os
 import sys
-import argparse
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 import pyodbc
@@ -16,6 +18,15 @@ from openpyxl import load_workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.table import Table, TableStyleInfo
+import indice_busca
+import cache_consultas
+import leitura_colunar
+import checkpoints_extracao
+import base_vendas_local
+import amostragem
+import duplicatas_clientes
+import montagem_xlsx
+from empresas import COMPANIES
 
 # ============================================
 # CONFIGURAÇÕES DO BANCO DE DADOS
@@ -26,58 +37,19 @@ DB_USERNAME = 'andre.nerd'
 DB_PASSWORD = 'nerd123@'
 DB_PORT = '1433'
 
-# Configuração de empresas (mesma lógica do TypeScript)
-COMPANIES = {
-    'nerd': {
-        'name': 'NERD',
-        'filiais': [
-            'NERD CENTER NORTE',
-            'NERD HIGIENOPOLIS',
-            'NERD LEBLON',
-            'NERD MORUMBI RDRRRJ',
-            'NERD VILLA LOBOS',
-        ],
-        'filial_display_names': {
-            'NERD CENTER NORTE': 'CENTER NORTE',
-            'NERD HIGIENOPOLIS': 'HIGIENOPOLIS',
-            'NERD LEBLON': 'LEBLON',
-            'NERD MORUMBI RDRRRJ': 'MORUMBI',
-            'NERD VILLA LOBOS': 'VILLA LOBOS',
-        }
-    },
-    'scarfme': {
-        'name': 'SCARF ME',
-        'filiais': [
-            'GUARULHOS - RSR',
-            'IGUATEMI SP - JJJ',
-            'MORUMBI - JJJ',
-            'OSCAR FREIRE - FSZ',
-            'SCARF ME - HIGIENOPOLIS 2',
-            'SCARFME - IBIRAPUERA LLL',
-            'SCARFME ME - PAULISTA FFF',
-            'SCARF ME - MATRIZ',
-            'SCARFME MATRIZ CMS',
-            'VILLA LOBOS - LLL',
-        ],
-        'filial_display_names': {
-            'GUARULHOS - RSR': 'GUARULHOS',
-            'IGUATEMI SP - JJJ': 'IGUATEMI',
-            'MORUMBI - JJJ': 'MORUMBI',
-            'OSCAR FREIRE - FSZ': 'OSCAR FREIRE',
-            'SCARF ME - HIGIENOPOLIS 2': 'HIGIENÓPOLIS',
-            'SCARFME - IBIRAPUERA LLL': 'IBIRAPUERA',
-            'SCARFME ME - PAULISTA FFF': 'PAULISTA',
-            'SCARF ME - MATRIZ': 'MATRIZ',
-            'SCARFME MATRIZ CMS': 'E-COMMERCE',
-            'VILLA LOBOS - LLL': 'VILLA LOBOS',
-        },
-        'ecommerce_filiais': ['SCARFME MATRIZ CMS']
-    }
+# TTL do cache de consultas (segundos)
+CACHE_TTL = {
+    'clientes': 3600,
+    'vendas': 3600,
 }
 
-def get_db_connection():
-    """Cria conexão com o banco de dados SQL Server"""
-    connection_string = (
+# Máximo de chaves da busca local no IN (...) da query; acima disso a busca
+# vai para o LIKE no servidor (listas grandes estouram o plano do SQL Server)
+MAX_CHAVES_BUSCA_LOCAL = 1000
+
+def get_connection_string() -> str:
+    """String ODBC do SQL Server (pyodbc e driver Arrow de leitura_colunar)"""
+    return (
         f"DRIVER={{ODBC Driver 17 for SQL Server}};"
         f"SERVER={DB_SERVER},{DB_PORT};"
         f"DATABASE={DB_DATABASE};"
@@ -85,9 +57,11 @@ def get_db_connection():
         f"PWD={DB_PASSWORD};"
         f"TrustServerCertificate=yes;"
     )
-    
+
+def get_db_connection():
+    """Cria conexão com o banco de dados SQL Server"""
     try:
-        conn = pyodbc.connect(connection_string, timeout=60)
+        conn = pyodbc.connect(get_connection_string(), timeout=60)
         return conn
     except Exception as e:
         print(f"Erro ao conectar ao banco de dados: {e}")
@@ -127,15 +101,69 @@ def build_filial_filter(company: str, filial: Optional[str], cursor) -> str:
     placeholders = ', '.join([f"'{f}'" for f in filiais])
     return f"AND cv.FILIAL IN ({placeholders})"
 
+def filiais_do_filtro(company: Optional[str], filial: Optional[str]) -> Optional[List[str]]:
+    """Lista de filiais equivalente a build_filial_filter (None = sem filtro)"""
+    if not company or company not in COMPANIES:
+        return None
+    company_config = COMPANIES[company]
+    if filial and filial != '__VAREJO__':
+        return [filial.strip()]
+    if company == 'scarfme' and filial == '__VAREJO__':
+        return [f for f in company_config['filiais'] if f not in company_config.get('ecommerce_filiais', [])] or None
+    return company_config['filiais'] or None
+
+def build_clientes_keys_filter(clientes_nomes: List[str], coluna: str = 'cv.CLIENTE_VAREJO') -> str:
+    """Constrói filtro SQL por lista de chaves de clientes (resolvidas localmente)"""
+    nomes = "', '".join([str(n).replace("'", "''") for n in clientes_nomes])
+    return f"AND {coluna} IN ('{nomes}')"
+
+def resolve_search_locally(
+    search_term: str,
+    company: Optional[str],
+    filial: Optional[str],
+    start_date: date,
+    end_date: date,
+    fuzzy: bool = False
+) -> Optional[List[str]]:
+    """
+    Resolve o termo de busca no índice local de n-gramas.
+    Retorna a lista de clientes encontrados ou None se o índice não existir,
+    não cobrir o período/filtros pedidos ou encontrar mais de MAX_CHAVES_BUSCA_LOCAL
+    clientes (nesses casos a busca vai para o SQL).
+    """
+    indice = indice_busca.carregar_indice()
+    if indice is None:
+        print("⚠ Índice local não encontrado (use --build-index). Buscando no servidor...")
+        return None
+    if not indice_busca.indice_cobre(indice, start_date, end_date, company, filial):
+        inicio, fim = indice.get('periodo') or (None, None)
+        print(f"⚠ Índice local cobre {inicio} até {fim} ({indice.get('escopo') or 'todas as empresas'}) "
+              f"e não atende a busca. Buscando no servidor...")
+        return None
+    
+    resultados = indice_busca.buscar(indice, search_term, fuzzy=fuzzy)
+    nomes = [r['nomeCliente'] for r in resultados]
+    if len(nomes) > MAX_CHAVES_BUSCA_LOCAL:
+        print(f"⚠ Busca local: {len(nomes):,} clientes para '{search_term}' (acima de "
+              f"{MAX_CHAVES_BUSCA_LOCAL:,}). Buscando no servidor...")
+        return None
+    print(f"✓ Busca local: {len(nomes)} clientes para '{search_term}'")
+    return nomes
+
 def fetch_clientes(
     company: Optional[str] = None,
     filial: Optional[str] = None,
     vendedor: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    search_term: Optional[str] = None
+    search_term: Optional[str] = None,
+    clientes_nomes: Optional[List[str]] = None
 ) -> pd.DataFrame:
-    """Busca clientes cadastrados no período (mesma lógica do TypeScript)"""
+    """
+    Busca clientes cadastrados no período (mesma lógica do TypeScript).
+    Se clientes_nomes for informado (busca resolvida no índice local),
+    filtra por essas chaves em vez de usar LIKE no servidor.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -155,7 +183,9 @@ def fetch_clientes(
         vendedor_filter = f"AND (LTRIM(RTRIM(CAST(cv.VENDEDOR AS VARCHAR))) = '{vendedor.strip()}' OR LTRIM(RTRIM(ISNULL(lv.VENDEDOR_APELIDO, ISNULL(lv.NOME_VENDEDOR, '')))) = '{vendedor.strip()}')"
     
     search_filter = ''
-    if search_term and len(search_term.strip()) >= 2:
+    if clientes_nomes is not None:
+        search_filter = build_clientes_keys_filter(clientes_nomes)
+    elif search_term and len(search_term.strip()) >= 2:
         search_pattern = f"%{search_term.strip()}%"
         search_filter = f"AND (cv.CLIENTE_VAREJO LIKE '{search_pattern}' OR ISNULL(lv.VENDEDOR_APELIDO, ISNULL(lv.NOME_VENDEDOR, cv.VENDEDOR)) LIKE '{search_pattern}')"
     
@@ -188,8 +218,98 @@ def fetch_clientes(
         ORDER BY cv.CADASTRAMENTO ASC, cv.CLIENTE_VAREJO
     """
     
+    query = amostragem.limitar('clientes', query, periodo=f"{start_date} a {end_date}")
+    
+    try:
+        df = cache_consultas.ler_sql(query, conn, ttl=CACHE_TTL['clientes'], nome='clientes')
+        amostragem.anotar_registros('clientes', len(df))
+        print(f"✓ {len(df)} clientes encontrados")
+        return df
+    except Exception as e:
+        print(f"Erro ao buscar clientes: {e}")
+        raise
+    finally:
+        conn.close()
+
+def fetch_clientes_duplicatas(
+    company: Optional[str] = None,
+    filial: Optional[str] = None,
+    vendedor: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    search_term: Optional[str] = None,
+    clientes_nomes: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Clientes para a detecção de duplicatas: CLIENTES_VAREJO sem o join de
+    vendedores nem ORDER BY (vendedor e busca filtram como em fetch_clientes)
+    e, sem período informado, a tabela inteira, inclusive clientes sem data de
+    CADASTRAMENTO.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    periodo_filter = ''
+    if start_date and end_date:
+        periodo_filter = (f"AND cv.CADASTRAMENTO >= '{start_date}' "
+                          f"AND cv.CADASTRAMENTO < '{end_date + timedelta(days=1)}'")
+    
+    filial_filter = build_filial_filter(company, filial, cursor) if company else ''
+    
+    # Vendedor e busca com a mesma semântica de fetch_clientes: apelido/nome vêm de
+    # LOJA_VENDEDORES por subquery (só a lista de códigos, sem join por cliente)
+    codigo_vendedor = "LTRIM(RTRIM(CAST(cv.VENDEDOR AS VARCHAR)))"
+    codigos_lv = "SELECT LTRIM(RTRIM(CAST(lv.VENDEDOR AS VARCHAR))) FROM LOJA_VENDEDORES lv WITH (NOLOCK)"
+    
+    vendedor_filter = ''
+    if vendedor and vendedor.strip():
+        vendedor_filter = (f"AND ({codigo_vendedor} = '{vendedor.strip()}' OR {codigo_vendedor} IN ("
+                           f"{codigos_lv} WHERE LTRIM(RTRIM(ISNULL(lv.VENDEDOR_APELIDO, ISNULL(lv.NOME_VENDEDOR, '')))) = '{vendedor.strip()}'))")
+    
+    search_filter = ''
+    if clientes_nomes is not None:
+        search_filter = build_clientes_keys_filter(clientes_nomes)
+    elif search_term and len(search_term.strip()) >= 2:
+        search_pattern = f"%{search_term.strip()}%"
+        nome_lv = "ISNULL(lv.VENDEDOR_APELIDO, lv.NOME_VENDEDOR)"
+        # Sem apelido/nome no cadastro de vendedores, fetch_clientes compara o próprio código
+        search_filter = (f"AND (cv.CLIENTE_VAREJO LIKE '{search_pattern}'"
+                         f" OR {codigo_vendedor} IN ({codigos_lv} WHERE {nome_lv} LIKE '{search_pattern}')"
+                         f" OR (cv.VENDEDOR LIKE '{search_pattern}' AND {codigo_vendedor} NOT IN ("
+                         f"{codigos_lv} WHERE {nome_lv} IS NOT NULL)))")
+    
+    # Mesmas colunas de fetch_clientes (vendedor é o código do cadastro)
+    query = f"""
+        SELECT 
+            CAST(cv.CADASTRAMENTO AS DATE) AS data,
+            ISNULL(cv.CLIENTE_VAREJO, 'SEM NOME') AS nomeCliente,
+            CASE 
+                WHEN cv.DDD IS NOT NULL AND cv.TELEFONE IS NOT NULL 
+                THEN cv.DDD + ' ' + cv.TELEFONE 
+                ELSE ISNULL(cv.TELEFONE, '') 
+            END AS telefone,
+            ISNULL(cv.CPF_CGC, '') AS cpf,
+            ISNULL(cv.ENDERECO, '') AS endereco,
+            ISNULL(cv.COMPLEMENTO, '') AS complemento,
+            ISNULL(cv.BAIRRO, '') AS bairro,
+            ISNULL(cv.CIDADE, '') AS cidade,
+            ISNULL(cv.EMAIL, '') AS email,
+            cv.VENDEDOR AS vendedor,
+            cv.FILIAL AS filial
+        FROM CLIENTES_VAREJO cv WITH (NOLOCK)
+        WHERE 1 = 1
+            {periodo_filter}
+            {filial_filter}
+            {vendedor_filter}
+            {search_filter}
+    """
+    
+    periodo = f"{start_date} a {end_date}" if start_date and end_date else None
+    query = amostragem.limitar('clientes', query, periodo=periodo)
+    
     try:
-        df = pd.read_sql(query, conn)
+        df = cache_consultas.ler_sql(query, conn, ttl=CACHE_TTL['clientes'], nome='clientes_duplicatas')
+        amostragem.anotar_registros('clientes', len(df))
         print(f"✓ {len(df)} clientes encontrados")
         return df
     except Exception as e:
@@ -269,8 +389,11 @@ def fetch_vendas_clientes(
         ORDER BY v.CLIENTE_VAREJO, vp.DATA_VENDA DESC, v.TICKET
     """
     
+    query = amostragem.limitar('vendas', query, periodo=f"{start_date} a {end_date}")
+    
     try:
-        df = pd.read_sql(query, conn)
+        df = cache_consultas.ler_sql(query, conn, ttl=CACHE_TTL['vendas'], nome='vendas')
+        amostragem.anotar_registros('vendas', len(df))
         print(f"✓ {len(df)} vendas encontradas")
         return df
     except Exception as e:
@@ -279,6 +402,67 @@ def fetch_vendas_clientes(
     finally:
         conn.close()
 
+def fetch_vendas_clientes_local(
+    company: Optional[str] = None,
+    filial: Optional[str] = None,
+    vendedor: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    clientes_df: Optional[pd.DataFrame] = None
+) -> Optional[pd.DataFrame]:
+    """
+    Mesmo resultado de fetch_vendas_clientes, lido da base local gravada por
+    exportar_todos_relatorios3 (vendas já líquidas de trocas).
+    Retorna None se a base não cobrir o período (aí a busca vai para o SQL).
+    """
+    if not start_date or not end_date:
+        start_date = date(2025, 1, 1)
+        end_date = date(2026, 1, 1)
+    
+    clientes_nomes = None
+    if clientes_df is not None and len(clientes_df) > 0:
+        # Mesmo limite de 1000 clientes da consulta SQL
+        clientes_nomes = list(clientes_df['nomeCliente'].unique()[:1000])
+    
+    df = base_vendas_local.ler_base(
+        start_date, end_date,
+        filiais=filiais_do_filtro(company, filial),
+        clientes=clientes_nomes,
+        vendedor=vendedor.strip() if vendedor and vendedor.strip() else None,
+        colunas=['DATA_VENDA', 'CLIENTE_VAREJO', 'FILIAL', 'CODIGO_FILIAL', 'VENDEDOR', 'VENDEDOR_APELIDO',
+                 'TICKET', 'PRODUTO', 'DESC_PRODUTO', 'GRUPO_PRODUTO', 'SUBGRUPO_PRODUTO',
+                 'QTDE', 'VALOR_LIQUIDO']
+    )
+    if df is None:
+        manifesto = base_vendas_local.ler_manifesto()
+        if manifesto:
+            print(f"⚠ Base local de vendas cobre {manifesto['inicio']} até a véspera de {manifesto['fim']} "
+                  f"e não atende o período. Buscando no servidor...")
+        else:
+            print("⚠ Base local de vendas não encontrada (gerada por exportar_todos_relatorios3). Buscando no servidor...")
+        return None
+    
+    # Valor do ticket = soma líquida das linhas do ticket
+    valor_ticket = df.groupby(['CODIGO_FILIAL', 'TICKET'], dropna=False)['VALOR_LIQUIDO'].transform('sum')
+    resultado = pd.DataFrame({
+        'dataVenda': df['DATA_VENDA'].dt.date,
+        'nomeCliente': df['CLIENTE_VAREJO'].fillna('SEM CLIENTE'),
+        'filial': df['FILIAL'],
+        'vendedor': df['VENDEDOR_APELIDO'].fillna(df['VENDEDOR']).fillna('SEM VENDEDOR'),
+        'ticket': df['TICKET'],
+        'produto': df['PRODUTO'],
+        'descricaoProduto': df['DESC_PRODUTO'].fillna(''),
+        'grupo': df['GRUPO_PRODUTO'].fillna(''),
+        'subgrupo': df['SUBGRUPO_PRODUTO'].fillna(''),
+        'quantidade': df['QTDE'],
+        'valorLiquido': df['VALOR_LIQUIDO'],
+        'valorTicket': valor_ticket,
+    })
+    resultado = resultado.sort_values(['nomeCliente', 'dataVenda', 'ticket'],
+                                      ascending=[True, False, True], kind='stable').reset_index(drop=True)
+    print(f"✓ {len(resultado)} vendas encontradas (base local)")
+    return resultado
+
 def format_excel(workbook, worksheet, df: pd.DataFrame, table_name: str):
     """Formata a planilha Excel com cores, bordas e tabela dinâmica"""
     # Estilos
@@ -346,16 +530,8 @@ def format_currency(value):
         return 0.0
     return float(value)
 
-def create_excel_file(
-    clientes_df: pd.DataFrame,
-    vendas_df: pd.DataFrame,
-    output_file: str,
-    company: Optional[str] = None
-):
-    """Cria arquivo Excel com dados de clientes e vendas"""
-    print(f"\nGerando arquivo Excel: {output_file}")
-    
-    # Preparar dados de clientes
+def preparar_clientes(clientes_df: pd.DataFrame, company: Optional[str] = None) -> pd.DataFrame:
+    """Aba Clientes: filial de exibição, ordem e nomes das colunas em português"""
     df_clientes = clientes_df.copy()
     
     # Formatar filiais se tiver company config
@@ -393,114 +569,215 @@ def create_excel_file(
     for col in col_order:
         col_names_pt.append(col_mapping.get(col, col))
     df_clientes.columns = col_names_pt
-    
-    # Preparar dados de vendas
-    df_vendas = vendas_df.copy()
-    
-    # Agrupar vendas por cliente para criar resumo
-    if len(df_vendas) > 0:
-        vendas_resumo = df_vendas.groupby('nomeCliente').agg({
-            'dataVenda': ['min', 'max', 'count'],
-            'ticket': 'nunique',
-            'valorLiquido': 'sum',
-            'quantidade': 'sum'
-        }).reset_index()
-        
-        vendas_resumo.columns = ['Nome Cliente', 'Primeira Venda', 'Última Venda', 
-                                 'Total Itens', 'Total Tickets', 'Faturamento Total', 'Quantidade Total']
-        
-        # Formatar valores monetários
-        vendas_resumo['Faturamento Total'] = vendas_resumo['Faturamento Total'].apply(format_currency)
-        
-        # Detalhes de vendas
-        df_vendas_detalhes = df_vendas.copy()
-        df_vendas_detalhes = df_vendas_detalhes[[
-            'dataVenda', 'nomeCliente', 'filial', 'vendedor', 'ticket',
-            'produto', 'descricaoProduto', 'grupo', 'subgrupo', 
-            'quantidade', 'valorLiquido'
-        ]]
-        df_vendas_detalhes.columns = [
-            'Data Venda', 'Nome Cliente', 'Filial', 'Vendedor', 'Ticket',
-            'Produto', 'Descrição', 'Grupo', 'Subgrupo', 
-            'Quantidade', 'Valor Líquido'
-        ]
-        df_vendas_detalhes['Valor Líquido'] = df_vendas_detalhes['Valor Líquido'].apply(format_currency)
-    else:
-        vendas_resumo = pd.DataFrame(columns=[
+    return df_clientes
+
+def preparar_resumo_vendas(vendas_df: pd.DataFrame) -> pd.DataFrame:
+    """Aba Resumo Vendas: vendas agrupadas por cliente"""
+    if len(vendas_df) == 0:
+        return pd.DataFrame(columns=[
             'Nome Cliente', 'Primeira Venda', 'Última Venda', 
             'Total Itens', 'Total Tickets', 'Faturamento Total', 'Quantidade Total'
         ])
-        df_vendas_detalhes = pd.DataFrame()
+    
+    vendas_resumo = vendas_df.groupby('nomeCliente').agg({
+        'dataVenda': ['min', 'max', 'count'],
+        'ticket': 'nunique',
+        'valorLiquido': 'sum',
+        'quantidade': 'sum'
+    }).reset_index()
+    
+    vendas_resumo.columns = ['Nome Cliente', 'Primeira Venda', 'Última Venda', 
+                             'Total Itens', 'Total Tickets', 'Faturamento Total', 'Quantidade Total']
+    
+    # Formatar valores monetários
+    vendas_resumo['Faturamento Total'] = vendas_resumo['Faturamento Total'].apply(format_currency)
+    return vendas_resumo
+
+def preparar_detalhes_vendas(vendas_df: pd.DataFrame) -> pd.DataFrame:
+    """Aba Detalhes Vendas: uma linha por item vendido"""
+    if len(vendas_df) == 0:
+        return pd.DataFrame()
+    
+    df_vendas_detalhes = vendas_df[[
+        'dataVenda', 'nomeCliente', 'filial', 'vendedor', 'ticket',
+        'produto', 'descricaoProduto', 'grupo', 'subgrupo', 
+        'quantidade', 'valorLiquido'
+    ]].copy()
+    df_vendas_detalhes.columns = [
+        'Data Venda', 'Nome Cliente', 'Filial', 'Vendedor', 'Ticket',
+        'Produto', 'Descrição', 'Grupo', 'Subgrupo', 
+        'Quantidade', 'Valor Líquido'
+    ]
+    df_vendas_detalhes['Valor Líquido'] = df_vendas_detalhes['Valor Líquido'].apply(format_currency)
+    return df_vendas_detalhes
+
+# Abas do arquivo de clientes: (aba, tabela, coluna em R$ ou None, DataFrame de origem, preparação)
+ABAS_EXCEL = [
+    ('Clientes', 'TabelaClientes', None, 'clientes', lambda df, company: preparar_clientes(df, company)),
+    ('Resumo Vendas', 'TabelaResumoVendas', 6, 'vendas', lambda df, company: preparar_resumo_vendas(df)),
+    ('Detalhes Vendas', 'TabelaDetalhesVendas', 11, 'vendas', lambda df, company: preparar_detalhes_vendas(df)),
+]
+
+def escrever_aba(writer, df: pd.DataFrame, sheet_name: str, table_name: str, coluna_moeda: Optional[int] = None):
+    """Grava uma aba formatada (tabela, bordas, cabeçalho) e a coluna monetária em R$"""
+    df.to_excel(writer, sheet_name=sheet_name, index=False)
+    worksheet = writer.sheets[sheet_name]
+    format_excel(writer.book, worksheet, df, table_name)
+    
+    # Formatar coluna de valores como moeda
+    if coluna_moeda:
+        for row in range(2, len(df) + 2):
+            cell = worksheet.cell(row=row, column=coluna_moeda)
+            cell.number_format = 'R$ #,##0.00'
+
+def _propriedades_preview(book, propriedades: Optional[Dict[str, str]]):
+    if propriedades:
+        book.properties.title = propriedades['title']
+        book.properties.description = propriedades['description']
+
+def gerar_aba_xlsx(indice: int, origem_df: pd.DataFrame,
+                   company: Optional[str], caminho: str,
+                   propriedades: Optional[Dict[str, str]] = None) -> Optional[int]:
+    """
+    Processo auxiliar do modo paralelo: prepara uma aba de ABAS_EXCEL a partir do
+    DataFrame de origem dela e grava em caminho um XLSX só com essa aba.
+    Retorna o número de linhas (None se a aba ficar de fora).
+    """
+    sheet_name, table_name, coluna_moeda, _, preparar = ABAS_EXCEL[indice]
+    df = preparar(origem_df, company)
+    if indice > 0 and len(df) == 0:
+        return None
+    with pd.ExcelWriter(caminho, engine='openpyxl') as writer:
+        _propriedades_preview(writer.book, propriedades)
+        escrever_aba(writer, df, sheet_name, table_name, coluna_moeda)
+    return len(df)
+
+def create_excel_file_paralelo(
+    clientes_df: pd.DataFrame,
+    vendas_df: pd.DataFrame,
+    output_file: str,
+    company: Optional[str] = None
+):
+    """
+    Mesmo arquivo de create_excel_file, com cada aba preparada e gravada em um
+    processo separado; as planilhas de uma aba são juntadas em um só XLSX
+    (montagem_xlsx). O tempo total fica perto do da maior aba.
+    """
+    print(f"\nGerando arquivo Excel (abas em paralelo): {output_file}")
+    propriedades = None
+    if amostragem.AMOSTRA_CONFIG['habilitado']:
+        propriedades = {'title': 'Clientes (preview)', 'description': amostragem.descricao()}
+    
+    # Cada processo recebe só o DataFrame que a sua aba usa (menos cópia e memória)
+    origens = {'clientes': clientes_df, 'vendas': vendas_df}
+    pasta = tempfile.mkdtemp(prefix='clientes_abas_')
+    try:
+        caminhos = [os.path.join(pasta, f'aba{i}.xlsx') for i in range(len(ABAS_EXCEL))]
+        with ProcessPoolExecutor(max_workers=len(ABAS_EXCEL)) as executor:
+            futuros = [executor.submit(gerar_aba_xlsx, i, origens[aba[3]], company, caminhos[i], propriedades)
+                       for i, aba in enumerate(ABAS_EXCEL)]
+            linhas = [futuro.result() for futuro in futuros]
+        montagem_xlsx.juntar([c for c, n in zip(caminhos, linhas) if n is not None], output_file)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    
+    print(f"✓ Arquivo Excel criado com sucesso: {output_file}")
+    print(f"  - {linhas[0]} clientes")
+    print(f"  - {linhas[1] or 0} clientes com vendas")
+    print(f"  - {linhas[2] or 0} itens de venda")
+
+def create_excel_file(
+    clientes_df: pd.DataFrame,
+    vendas_df: pd.DataFrame,
+    output_file: str,
+    company: Optional[str] = None,
+    paralelo: bool = False
+):
+    """Cria arquivo Excel com dados de clientes e vendas"""
+    if paralelo:
+        try:
+            return create_excel_file_paralelo(clientes_df, vendas_df, output_file, company)
+        except Exception as e:
+            print(f"⚠ Geração em paralelo falhou ({e}); gerando as abas em sequência")
+    
+    print(f"\nGerando arquivo Excel: {output_file}")
+    
+    df_clientes = preparar_clientes(clientes_df, company)
+    vendas_resumo = preparar_resumo_vendas(vendas_df)
+    df_vendas_detalhes = preparar_detalhes_vendas(vendas_df)
     
     # Criar arquivo Excel
     with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        # Preview: estratégia de amostragem nas propriedades do arquivo
+        if amostragem.AMOSTRA_CONFIG['habilitado']:
+            _propriedades_preview(writer.book, {'title': 'Clientes (preview)', 'description': amostragem.descricao()})
+
         # Aba 1: Clientes
-        df_clientes.to_excel(writer, sheet_name='Clientes', index=False)
-        ws_clientes = writer.sheets['Clientes']
-        format_excel(writer.book, ws_clientes, df_clientes, 'TabelaClientes')
+        escrever_aba(writer, df_clientes, 'Clientes', 'TabelaClientes')
         
-        # Aba 2: Resumo de Vendas por Cliente
+        # Aba 2: Resumo de Vendas por Cliente (coluna F em R$)
         if len(vendas_resumo) > 0:
-            vendas_resumo.to_excel(writer, sheet_name='Resumo Vendas', index=False)
-            ws_resumo = writer.sheets['Resumo Vendas']
-            format_excel(writer.book, ws_resumo, vendas_resumo, 'TabelaResumoVendas')
-            
-            # Formatar coluna de faturamento como moeda
-            for row in range(2, len(vendas_resumo) + 2):
-                cell = ws_resumo.cell(row=row, column=6)  # Coluna F (Faturamento Total)
-                cell.number_format = 'R$ #,##0.00'
+            escrever_aba(writer, vendas_resumo, 'Resumo Vendas', 'TabelaResumoVendas', 6)
         
-        # Aba 3: Detalhes de Vendas
+        # Aba 3: Detalhes de Vendas (coluna K em R$)
         if len(df_vendas_detalhes) > 0:
-            df_vendas_detalhes.to_excel(writer, sheet_name='Detalhes Vendas', index=False)
-            ws_detalhes = writer.sheets['Detalhes Vendas']
-            format_excel(writer.book, ws_detalhes, df_vendas_detalhes, 'TabelaDetalhesVendas')
-            
-            # Formatar coluna de valor como moeda
-            for row in range(2, len(df_vendas_detalhes) + 2):
-                cell = ws_detalhes.cell(row=row, column=11)  # Coluna K (Valor Líquido)
-                cell.number_format = 'R$ #,##0.00'
+            escrever_aba(writer, df_vendas_detalhes, 'Detalhes Vendas', 'TabelaDetalhesVendas', 11)
     
     print(f"✓ Arquivo Excel criado com sucesso: {output_file}")
     print(f"  - {len(df_clientes)} clientes")
     print(f"  - {len(vendas_resumo)} clientes com vendas")
     print(f"  - {len(df_vendas_detalhes)} itens de venda")
 
-def main():
-    parser = argparse.ArgumentParser(
-        description='Exporta dados de clientes e vendas para Excel',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Exemplos:
-  # Exportar clientes do mês atual (NERD)
-  python exportar_clientes.py --company nerd
-
-  # Exportar com filtros específicos
-  python exportar_clientes.py --company scarfme --filial "SCARF ME - MATRIZ" --start 2024-01-01 --end 2024-01-31
-
-  # Exportar com busca por termo
-  python exportar_clientes.py --company nerd --search "João"
-        """
-    )
+def create_duplicatas_file(duplicatas_df: pd.DataFrame, output_file: str):
+    """Cria arquivo Excel com os grupos de clientes duplicados"""
+    print(f"\nGerando arquivo Excel: {output_file}")
     
-    parser.add_argument('--company', choices=['nerd', 'scarfme'], 
-                       help='Empresa (nerd ou scarfme)')
-    parser.add_argument('--filial', type=str, 
-                       help='Filial específica (ou "__VAREJO__" para apenas varejo)')
-    parser.add_argument('--vendedor', type=str, 
-                       help='Código ou nome do vendedor')
-    parser.add_argument('--start', type=str, 
-                       help='Data inicial (YYYY-MM-DD). Padrão: primeiro dia do mês atual')
-    parser.add_argument('--end', type=str, 
-                       help='Data final (YYYY-MM-DD). Padrão: último dia do mês atual')
-    parser.add_argument('--search', type=str, 
-                       help='Termo de busca (nome do cliente ou vendedor)')
-    parser.add_argument('--output', type=str, default=None,
-                       help='Nome do arquivo de saída. Padrão: clientes_YYYYMMDD_HHMMSS.xlsx')
-    parser.add_argument('--no-vendas', action='store_true',
-                       help='Não buscar dados de vendas (apenas clientes)')
-    
-    args = parser.parse_args()
+    col_mapping = {
+        'grupo': 'Grupo',
+        'tamanhoGrupo': 'Clientes no Grupo',
+        'pontuacao': 'Pontuação',
+        'motivos': 'Motivos',
+        'data': 'Data Cadastro',
+        'nomeCliente': 'Nome Cliente',
+        'telefone': 'Telefone',
+        'email': 'E-mail',
+        'cpf': 'CPF/CNPJ',
+        'cidade': 'Cidade',
+        'vendedor': 'Vendedor',
+        'filial': 'Filial'
+    }
+    df_duplicatas = duplicatas_df[[c for c in col_mapping if c in duplicatas_df.columns]]
+    df_duplicatas.columns = [col_mapping[c] for c in df_duplicatas.columns]
+    df_resumo = pd.DataFrame(duplicatas_clientes.resumo(duplicatas_df))
+    
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        if amostragem.AMOSTRA_CONFIG['habilitado']:
+            writer.book.properties.title = 'Duplicatas de clientes (preview)'
+            writer.book.properties.description = amostragem.descricao()
+        
+        # Aba 1: Estatísticas
+        df_resumo.to_excel(writer, sheet_name='Estatisticas', index=False)
+        format_excel(writer.book, writer.sheets['Estatisticas'], df_resumo, 'TabelaEstatisticas')
+        
+        # Aba 2: Clientes agrupados (uma linha por cliente, grupos em sequência)
+        df_duplicatas.to_excel(writer, sheet_name='Duplicatas', index=False)
+        format_excel(writer.book, writer.sheets['Duplicatas'], df_duplicatas, 'TabelaDuplicatas')
+    
+    print(f"✓ Arquivo Excel criado com sucesso: {output_file}")
+    print(f"  - {duplicatas_df['grupo'].nunique() if len(duplicatas_df) else 0} grupos")
+    print(f"  - {len(duplicatas_df)} clientes duplicados")
+
+def parse_args(argv=None):
+    """Argumentos de linha de comando (os mesmos de: exportador.py clientes)"""
+    import exportador
+    return exportador.parser_comando('clientes').parse_args(argv)
+
+def main(args=None):
+    args = args or parse_args()
+    cache_consultas.configurar(habilitado=not args.no_cache, atualizar=args.refresh)
+    if args.backend:
+        leitura_colunar.LEITURA_CONFIG['backend'] = args.backend
+    leitura_colunar.LEITURA_CONFIG['conexao_odbc'] = get_connection_string()
     
     # Validar datas
     start_date = None
@@ -514,11 +791,21 @@ Exemplos:
         print("Erro: Data inicial não pode ser maior que data final")
         sys.exit(1)
     
+    # Preview: só os últimos dias do período e TOP N em cada query (não vale para o índice)
+    preview = args.preview and not args.build_index
+    if preview:
+        amostragem.configurar(linhas=args.preview_linhas, dias=args.preview_dias)
+        end_date = end_date or date(2025, 12, 31)
+        start_date = max(start_date or date(2025, 1, 1),
+                         end_date - timedelta(days=amostragem.AMOSTRA_CONFIG['dias'] - 1))
+    
     # Nome do arquivo de saída
     if not args.output:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         company_suffix = f"_{args.company}" if args.company else ""
-        args.output = f"clientes{company_suffix}_{timestamp}.xlsx"
+        preview_suffix = "_preview" if preview else ""
+        prefixo = "duplicatas_clientes" if args.duplicatas else "clientes"
+        args.output = f"{prefixo}{company_suffix}_{timestamp}{preview_suffix}.xlsx"
     
     try:
         print("=" * 60)
@@ -529,39 +816,128 @@ Exemplos:
         print(f"Vendedor: {args.vendedor or 'Todos'}")
         if start_date and end_date:
             print(f"Período: {start_date} até {end_date}")
+        elif args.duplicatas:
+            print("Período: todos os clientes (inclusive sem data de cadastro)")
         else:
             print(f"Período: 2025 inteiro (2025-01-01 até 2025-12-31)")
         print(f"Busca: {args.search or 'Nenhuma'}")
+        if args.duplicatas:
+            print(f"Modo: detecção de duplicatas (pontuação mínima {args.limiar_duplicatas or duplicatas_clientes.DUPLICATAS_CONFIG['limiar']})")
+        if preview:
+            print(f"⚠ PREVIEW: até {amostragem.AMOSTRA_CONFIG['linhas']:,} linhas por consulta")
         print("-" * 60)
         
+        # Período efetivo (mesmo padrão de fetch_clientes)
+        periodo = (start_date, end_date) if start_date and end_date else (date(2025, 1, 1), date(2026, 1, 1))
+        
+        if args.build_index:
+            print("\nConstruindo índice local de busca...")
+            df_indice = fetch_clientes(
+                company=args.company,
+                filial=args.filial,
+                start_date=start_date,
+                end_date=end_date
+            )
+            indice = indice_busca.construir_indice(
+                df_indice, periodo=periodo,
+                escopo={'company': args.company, 'filial': args.filial}
+            )
+            caminho = indice_busca.salvar_indice(indice)
+            print(f"✓ Índice salvo em {caminho}: {len(indice['docs'])} clientes")
+            sys.exit(0)
+        
+        # Resolver busca no índice local (envia apenas as chaves ao servidor)
+        clientes_nomes = None
+        if args.search and args.local_search and args.duplicatas and not (start_date and end_date):
+            # Sem período as duplicatas usam a tabela inteira, que nenhum índice (feito por período) cobre
+            print("⚠ Duplicatas sem período: o índice local não cobre todos os clientes. Buscando no servidor...")
+        elif args.search and args.local_search:
+            clientes_nomes = resolve_search_locally(
+                args.search,
+                args.company,
+                args.filial,
+                periodo[0],
+                periodo[1],
+                fuzzy=args.fuzzy
+            )
+            if clientes_nomes is not None and len(clientes_nomes) == 0:
+                print("Nenhum cliente encontrado. Abortando.")
+                sys.exit(0)
+        
+        # Checkpoints por etapa (clientes, vendas), só com --checkpoint/--resume
+        filtros = {
+            'company': args.company, 'filial': args.filial, 'vendedor': args.vendedor,
+            'start': str(start_date), 'end': str(end_date), 'search': args.search,
+            'clientes_nomes': clientes_nomes, 'no_vendas': args.no_vendas,
+            'vendas_local': args.vendas_local, 'duplicatas': args.duplicatas,
+            'preview': amostragem.metadados()['config'] if preview else None,
+        }
+        if (args.checkpoint or args.resume) and not preview:
+            reaproveitadas = checkpoints_extracao.iniciar_execucao('clientes', retomar=args.resume, parametros=filtros)
+            if args.resume:
+                print(f"✓ Retomando exportação: {reaproveitadas} etapas já concluídas")
+        
         # Buscar clientes
         print("\n[1/2] Buscando clientes...")
-        df_clientes = fetch_clientes(
-            company=args.company,
-            filial=args.filial,
-            vendedor=args.vendedor,
-            start_date=start_date,
-            end_date=end_date,
-            search_term=args.search
+        df_clientes = checkpoints_extracao.com_checkpoint(
+            checkpoints_extracao.chave_peca('clientes', repr(filtros)),
+            lambda: (fetch_clientes_duplicatas if args.duplicatas else fetch_clientes)(
+                company=args.company,
+                filial=args.filial,
+                vendedor=args.vendedor,
+                start_date=start_date,
+                end_date=end_date,
+                search_term=args.search,
+                clientes_nomes=clientes_nomes
+            )
         )
         
         if len(df_clientes) == 0:
             print("Nenhum cliente encontrado. Abortando.")
             sys.exit(0)
         
+        # Duplicatas: agrupa os clientes e gera a planilha (sem vendas)
+        if args.duplicatas:
+            print("\n[2/2] Detectando duplicatas...")
+            df_duplicatas = duplicatas_clientes.detectar(df_clientes, limiar=args.limiar_duplicatas)
+            create_duplicatas_file(df_duplicatas, args.output)
+            checkpoints_extracao.concluir_execucao()
+            print("\n" + "=" * 60)
+            print("✓ EXPORTAÇÃO CONCLUÍDA COM SUCESSO!")
+            print("=" * 60)
+            return
+        
         # Buscar vendas
         df_vendas = pd.DataFrame()
         if not args.no_vendas:
             print("\n[2/2] Buscando vendas...")
             try:
-                df_vendas = fetch_vendas_clientes(
-                    company=args.company,
-                    filial=args.filial,
-                    vendedor=args.vendedor,
-                    start_date=start_date,
-                    end_date=end_date,
-                    clientes_df=df_clientes
-                )
+                if args.vendas_local:
+                    df_vendas = fetch_vendas_clientes_local(
+                        company=args.company,
+                        filial=args.filial,
+                        vendedor=args.vendedor,
+                        start_date=start_date,
+                        end_date=end_date,
+                        clientes_df=df_clientes
+                    )
+                    if df_vendas is not None and preview:
+                        amostragem.registrar('vendas', 'base local',
+                                             f"vendas dos {len(df_clientes)} clientes da amostra", len(df_vendas))
+                else:
+                    df_vendas = None
+                if df_vendas is None:
+                    df_vendas = checkpoints_extracao.com_checkpoint(
+                        checkpoints_extracao.chave_peca('vendas', repr(filtros)),
+                        lambda: fetch_vendas_clientes(
+                            company=args.company,
+                            filial=args.filial,
+                            vendedor=args.vendedor,
+                            start_date=start_date,
+                            end_date=end_date,
+                            clientes_df=df_clientes
+                        )
+                    )
             except Exception as e:
                 print(f"⚠ Aviso: Erro ao buscar vendas: {e}")
                 print("  Continuando apenas com dados de clientes...")
@@ -569,7 +945,8 @@ Exemplos:
         
         # Gerar Excel
         print("\n[3/3] Gerando arquivo Excel...")
-        create_excel_file(df_clientes, df_vendas, args.output, args.company)
+        create_excel_file(df_clientes, df_vendas, args.output, args.company, paralelo=args.excel_paralelo)
+        checkpoints_extracao.concluir_execucao()
         
         print("\n" + "=" * 60)
         print("✓ EXPORTAÇÃO CONCLUÍDA COM SUCESSO!")
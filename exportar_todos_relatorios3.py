@@ -11,8 +11,22 @@ import time
 import pandas as pd
 import numpy as np
 import pyodbc
+import json
 import shutil
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+import cache_consultas
+import leitura_colunar
+import snapshots_dimensoes
+import checkpoints_extracao
+import escrita_csv
+import historico_estoque
+import base_vendas_local
+import governador_memoria
+import amostragem
+import saida_particionada
+import replica_produtos
 
 # Config conexão
 DB_CONFIG = {
@@ -22,6 +36,32 @@ DB_CONFIG = {
     'password': 'nerd123@'
 }
 
+# TTL do cache de consultas por query (segundos)
+CACHE_TTL = {
+    'produtos': 12 * 3600,
+    'produtos_barra': 12 * 3600,
+    'cores': 24 * 3600,
+    'estoque': 3600,
+    'vendas': 3600,
+    'vendas_tickets': 3600,
+    'ecommerce': 3600,
+    'entradas': 3600,
+}
+
+# Cubos pré-agregados de vendas: nome -> dimensões (medidas em MEDIDAS_CUBOS)
+CUBOS_VENDAS = {
+    'vendas_dia_filial': ['DATA', 'FILIAL'],
+    'vendas_dia_filial_grupo': ['DATA', 'FILIAL', 'GRUPO_PRODUTO', 'SUBGRUPO_PRODUTO'],
+    'vendas_produto_filial_mes': ['MES', 'FILIAL', 'PRODUTO', 'DESC_PRODUTO', 'GRUPO_PRODUTO', 'SUBGRUPO_PRODUTO'],
+}
+MEDIDAS_CUBOS = ['VALOR_LIQUIDO', 'QTDE', 'TOTAL_VENDA', 'VALOR_TROCA']
+
+# Os cubos só têm dias fechados: 'ate' é o primeiro dia que fica de fora (None = hoje).
+# O dashboard (lib/repositories/cubos.ts) só usa um cubo se o período pedido couber nele.
+CUBOS_CONFIG = {
+    'ate': None,
+}
+
 # Colunas a remover por relatório
 COLS_REMOVER = {
     'produtos': ['CODIGO_PRECO', 'MATERIAL', 'TABELA_OPERACOES', 'FATOR_OPERACOES', 'TABELA_MEDIDAS', 'CARTELA', 'UNIDADE', 'REVENDA', 'MODELAGEM', 'SORTIMENTO_COR', 'SORTIMENTO_TAMANHO', 'VARIA_PRECO_COR', 'VARIA_PRECO_TAM', 'PONTEIRO_PRECO_TAM', 'VARIA_CUSTO_COR', 'PERTENCE_A_CONJUNTO', 'TRIBUT_ICMS', 'TRIBUT_ORIGEM', 'VARIA_CUSTO_TAM', 'CUSTO_REPOSICAO2', 'CUSTO_REPOSICAO3', 'CUSTO_REPOSICAO4', 'ESTILISTA', 'MODELISTA', 'TAMANHO_BASE', 'GIRO_ENTREGA', 'TIMESTAMP', 'INATIVO', 'ENVIA_LOJA_VAREJO', 'ENVIA_LOJA_ATACADO', 'ENVIA_REPRESENTANTE', 'ENVIA_VAREJO_INTERNET', 'ENVIA_ATACADO_INTERNET', 'MODELO', 'REDE_LOJAS', 'FABRICANTE_ICMS_ABATER', 'FABRICANTE_PRAZO_PGTO', 'TAXA_JUROS_DEFLACIONAR', 'TAXAS_IMPOSTOS_APLICAR', 'PRECO_REPOSICAO_2', 'PRECO_REPOSICAO_3', 'PRECO_REPOSICAO_4', 'PRECO_A_VISTA_REPOSICAO_2', 'PRECO_A_VISTA_REPOSICAO_3', 'PRECO_A_VISTA_REPOSICAO_4', 'FABRICANTE_FRETE', 'DROP_DE_TAMANHOS', 'STATUS_PRODUTO', 'TIPO_STATUS_PRODUTO', 'OBS', 'COMPOSICAO', 'RESTRICAO_LAVAGEM', 'ORCAMENTO', 'CLIENTE_DO_PRODUTO', 'CONTA_CONTABIL', 'ESPESSURA', 'ALTURA', 'LARGURA', 'COMPRIMENTO', 'EMPILHAMENTO_MAXIMO', 'PARTE_TIPO', 'VERSAO_FICHA', 'COD_FLUXO_PRODUTO', 'DATA_INICIO_DESENVOLVIMENTO', 'INDICADOR_CFOP', 'MONTAGEM_KIT', 'MRP_AGRUPAR_NECESSIDADE_DIAS', 'MRP_AGRUPAR_NECESSIDADE_TIPO', 'MRP_DIAS_SEGURANCA', 'MRP_EMISSAO_LIBERACAO_DIAS', 'MRP_ENTREGA_GIRO_DIAS', 'MRP_PARTICIPANTE', 'MRP_MAIOR_GIRO_MP_DIAS', 'MRP_FP', 'MRP_RR', 'OP_POR_COR', 'OP_QTDE_MAXIMA', 'OP_QTDE_MINIMA', 'QUALIDADE', 'SEMI_ACABADO', 'CONTA_CONTABIL_COMPRA', 'CONTA_CONTABIL_VENDA', 'CONTA_CONTABIL_DEV_COMPRA', 'CONTA_CONTABIL_DEV_VENDA', 'ID_EXCECAO_GRUPO', 'ID_EXCECAO_IMPOSTO', 'DIAS_COMPRA', 'FATOR_P', 'FATOR_Q', 'FATOR_F', 'CONTINUIDADE', 'COD_PRODUTO_SOLUCAO', 'COD_PRODUTO_SEGMENTO', 'ID_PRECO', 'TIPO_ITEM_SPED', 'PERC_COMISSAO', 'ACEITA_ENCOMENDA', 'DIAS_GARANTIA_LOJA', 'DIAS_GARANTIA_FABRICANTE', 'POSSUI_MONTAGEM', 'PERMITE_ENTREGA_FUTURA', 'NATUREZA_RECEITA', 'COD_ALIQUOTA_PIS_COFINS_DIF', 'DATA_LIMITE_PEDIDO', 'LX_STATUS_REGISTRO', 'ARREDONDA', 'ID_ARTIGO', 'LX_HASH', 'SPED_DATA_FIM', 'SPED_DATA_INI', 'TIPO_PP', 'FATOR_A', 'FATOR_B', 'FATOR_BUFFER', 'FATOR_LT', 'TIPO_CANAL', 'NAO_ENVIA_ETL', 'TITULO_B2C', 'DESCRICAO_B2C', 'PRE_VENDA', 'TAGS', 'VIDEO_EMBED', 'CARACTERISTICAS_TECNICAS_B2C', 'FRETE_GRATIS', 'ESTOQUE_MINIMO', 'DATA_PUBLICACAO_B2C', 'GRUPO_PRODUTO_B2C', 'SUBGRUPO_PRODUTO_B2C', 'TIPO_PRODUTO_B2C', 'GRIFFE_B2C', 'LINHA_B2C', 'FABRICANTE_B2C', 'CATEGORIA_B2C', 'SUBCATEGORIA_B2C', 'REPOSICAO_B2C', 'IMG_ESTILO', 'DESCRICAO_B2C_2', 'DESCRICAO_B2C_3', 'SUJEITO_SUBSTITUTICAO_TRIBUTARIA', 'OPTION_TITULO', 'OPTION_DESC', 'OPTION_CARACTERISTICA','EMPRESA','SEXO_TIPO','PESO','DIAS_ACERTO_CONSIGNACAO','POSSUI_GTIN'],
@@ -29,11 +69,228 @@ COLS_REMOVER = {
     'vendas': ['TAMANHO', 'PEDIDO', 'DESCONTO_ITEM', 'CODIGO_DESCONTO', 'CODIGO_TAB_PRECO', 'OPERACAO_VENDA', 'FATOR_VENDA_LIQ', 'VALOR_TIKET', 'DESCONTO', 'DATA_HORA_CANCELAMENTO', 'QTDE_CANCELADA']
 }
 
-def enriquecer_com_codigo_barra(df_base, df_codigos_barra, prioridade_tamanho=True):
+# Colunas extraídas só para a base local de vendas (não vão para o relatório)
+COLS_BASE_LOCAL = {
+    'vendas': ['CLIENTE_VAREJO'],
+}
+
+# Queries otimizadas
+QUERIES = {
+    'produtos': "SELECT * FROM PRODUTOS",
+    'estoque': "SELECT * FROM ESTOQUE_PRODUTOS",
+    'produtos_barra': "SELECT PRODUTO, COR_PRODUTO, TAMANHO, CODIGO_BARRA FROM PRODUTOS_BARRA",
+    'vendas': """
+        SELECT vp.FILIAL, vp.DATA_VENDA, vp.PRODUTO, vp.DESC_PRODUTO,
+               vp.COR_PRODUTO, vp.DESC_COR_PRODUTO, vp.TAMANHO, p.GRADE, 
+               vp.PEDIDO, vp.TICKET, vp.CODIGO_FILIAL, vp.QTDE, vp.QTDE_CANCELADA, 
+               vp.PRECO_LIQUIDO, vp.DESCONTO_ITEM, vp.DESCONTO_VENDA, 
+               vp.FATOR_VENDA_LIQ, vp.CUSTO, vp.GRUPO_PRODUTO, 
+               vp.SUBGRUPO_PRODUTO, vp.LINHA, vp.COLECAO, vp.GRIFFE, 
+               vp.VENDEDOR, v.VALOR_TIKET, v.DESCONTO, v.VALOR_VENDA_BRUTA, 
+               v.CODIGO_TAB_PRECO, v.CODIGO_DESCONTO, v.OPERACAO_VENDA, 
+               v.DATA_HORA_CANCELAMENTO, v.VENDEDOR_APELIDO, v.CLIENTE_VAREJO,
+               ISNULL(troca_item.QTDE_TROCA, 0) AS QTDE_TROCA_ITEM,
+               ISNULL(troca_item.VALOR_TROCA, 0) AS VALOR_TROCA_ITEM,
+               ISNULL(troca_ticket.QTDE_TROCA_TICKET, 0) AS QTDE_TROCA_TICKET,
+               ISNULL(troca_ticket.VALOR_TROCA_TICKET, 0) AS VALOR_TROCA_TICKET
+FROM W_CTB_LOJA_VENDA_PEDIDO_PRODUTO vp WITH (NOLOCK)
+LEFT JOIN W_CTB_LOJA_VENDA_PEDIDO v WITH (NOLOCK)
+    ON v.FILIAL = vp.FILIAL AND v.PEDIDO = vp.PEDIDO AND v.TICKET = vp.TICKET
+LEFT JOIN PRODUTOS p WITH (NOLOCK) ON p.PRODUTO = vp.PRODUTO
+LEFT JOIN (
+    SELECT 
+        TICKET,
+        CODIGO_FILIAL,
+        PRODUTO,
+        COR_PRODUTO,
+        TAMANHO,
+        SUM(QTDE) AS QTDE_TROCA,
+        SUM((PRECO_LIQUIDO * QTDE) - ISNULL(DESCONTO_ITEM, 0)) AS VALOR_TROCA
+    FROM LOJA_VENDA_TROCA WITH (NOLOCK)
+    WHERE QTDE_CANCELADA = 0
+    GROUP BY TICKET, CODIGO_FILIAL, PRODUTO, COR_PRODUTO, TAMANHO
+) troca_item ON troca_item.TICKET = vp.TICKET 
+    AND troca_item.CODIGO_FILIAL = vp.CODIGO_FILIAL
+    AND troca_item.PRODUTO = vp.PRODUTO
+    AND ISNULL(troca_item.COR_PRODUTO, '') = ISNULL(vp.COR_PRODUTO, '')
+    AND ISNULL(troca_item.TAMANHO, 0) = ISNULL(vp.TAMANHO, 0)
+LEFT JOIN (
+    SELECT 
+        TICKET,
+        CODIGO_FILIAL,
+        SUM(QTDE) AS QTDE_TROCA_TICKET,
+        SUM((PRECO_LIQUIDO * QTDE) - ISNULL(DESCONTO_ITEM, 0)) AS VALOR_TROCA_TICKET
+    FROM LOJA_VENDA_TROCA WITH (NOLOCK)
+    WHERE QTDE_CANCELADA = 0
+    GROUP BY TICKET, CODIGO_FILIAL
+) troca_ticket ON troca_ticket.TICKET = vp.TICKET 
+    AND troca_ticket.CODIGO_FILIAL = vp.CODIGO_FILIAL
+WHERE vp.DATA_VENDA >= '2024-01-01'
+    """,
+    'ecommerce': """
+        SELECT f.NF_SAIDA, f.SERIE_NF, f.FILIAL, f.NOME_CLIFOR, fp.PRODUTO,
+               fp.COR_PRODUTO, f.MOEDA, f.CAMBIO_NA_DATA, fp.ITEM, fp.ENTREGA,
+               fp.PEDIDO_COR, fp.PEDIDO, fp.CAIXA, fp.ROMANEIO, fp.PACKS,
+               fp.CUSTO_NA_DATA, fp.QTDE, fp.PRECO, fp.MPADRAO_PRECO,
+               fp.DESCONTO_ITEM, fp.MPADRAO_DESCONTO_ITEM, fp.VALOR,
+               fp.MPADRAO_VALOR, fp.VALOR_PRODUCAO, fp.MPADRAO_VALOR_PRODUCAO,
+               fp.DIF_PRODUCAO, fp.MPADRAO_DIF_PRODUCAO, fp.VALOR_LIQUIDO,
+               fp.MPADRAO_VALOR_LIQUIDO, fp.DIF_PRODUCAO_LIQUIDO,
+    fp.MPADRAO_DIF_PRODUCAO_LIQUIDO,
+    fp.F1, fp.F2, fp.F3, fp.F4, fp.F5, fp.F6, fp.F7, fp.F8, fp.F9, fp.F10,
+    fp.F11, fp.F12, fp.F13, fp.F14, fp.F15, fp.F16, fp.F17, fp.F18, fp.F19, fp.F20,
+    fp.F21, fp.F22, fp.F23, fp.F24, fp.F25, fp.F26, fp.F27, fp.F28, fp.F29, fp.F30,
+    fp.F31, fp.F32, fp.F33, fp.F34, fp.F35, fp.F36, fp.F37, fp.F38, fp.F39, fp.F40,
+    fp.F41, fp.F42, fp.F43, fp.F44, fp.F45, fp.F46, fp.F47, fp.F48,
+               f.EMISSAO, f.CONDICAO_PGTO, f.NATUREZA_SAIDA, f.GERENTE,
+               f.REPRESENTANTE, f.DATA_SAIDA, f.TRANSPORTADORA,
+               f.TRANSP_REDESPACHO, f.EMPRESA, f.TIPO_FATURAMENTO,
+               p.DESC_PRODUTO, p.COLECAO, p.TABELA_OPERACOES, p.TABELA_MEDIDAS,
+               p.TIPO_PRODUTO, p.GRUPO_PRODUTO, p.SUBGRUPO_PRODUTO, p.LINHA,
+               p.GRADE, p.GRIFFE, p.CARTELA, p.REVENDA, p.MODELAGEM, p.FABRICANTE,
+               p.ESTILISTA, p.MODELISTA, fp.DESC_COLECAO, fl.REGIAO, cv.UF
+FROM FATURAMENTO f WITH(NOLOCK)
+JOIN W_FATURAMENTO_PROD_02 fp WITH(NOLOCK) 
+    ON f.FILIAL = fp.FILIAL AND f.NF_SAIDA = fp.NF_SAIDA AND f.SERIE_NF = fp.SERIE_NF
+        LEFT JOIN PRODUTOS p WITH(NOLOCK) ON fp.PRODUTO = p.PRODUTO
+        LEFT JOIN FILIAIS fl WITH(NOLOCK) ON f.FILIAL = fl.FILIAL
+        LEFT JOIN CLIENTES_VAREJO cv WITH(NOLOCK) ON f.NOME_CLIFOR = cv.CLIENTE_VAREJO
+        WHERE f.EMISSAO >= '2024-01-01' AND f.NOTA_CANCELADA = 0
+  AND f.NATUREZA_SAIDA IN ('100.02', '100.022')
+    """,
+    'entradas': """
+        SELECT E.ROMANEIO_PRODUTO, E.EMISSAO, E.FILIAL, P.PRODUTO,
+               P.COR_PRODUTO, P.QTDE AS QTDE_TOTAL
+        FROM ESTOQUE_PROD_ENT AS E
+        LEFT JOIN ESTOQUE_PROD1_ENT AS P ON E.ROMANEIO_PRODUTO = P.ROMANEIO_PRODUTO
+    """,
+    'cores': "SELECT COR, DESC_COR FROM CORES_BASICAS"
+}
+
+# Vendas normalizadas: cabeçalho do ticket extraído uma vez por ticket
+# (CODIGO_FILIAL + TICKET) e linhas de produto sem os campos do cabeçalho
+NORMALIZACAO = {
+    'vendas': False,
+}
+CHAVE_TICKET = ['CODIGO_FILIAL', 'TICKET']
+
+# Colunas do cabeçalho que calcular_vendas usa nas linhas (rateio da troca do ticket)
+COLS_TICKET_CALCULO = ['QTDE_TROCA_TICKET', 'VALOR_TROCA_TICKET']
+
+QUERIES_NORMALIZADAS = {
+    'vendas': """
+        SELECT vp.FILIAL, vp.DATA_VENDA, vp.PRODUTO, vp.DESC_PRODUTO,
+               vp.COR_PRODUTO, vp.DESC_COR_PRODUTO, vp.TAMANHO, p.GRADE, 
+               vp.PEDIDO, vp.TICKET, vp.CODIGO_FILIAL, vp.QTDE, vp.QTDE_CANCELADA, 
+               vp.PRECO_LIQUIDO, vp.DESCONTO_ITEM, vp.DESCONTO_VENDA, 
+               vp.FATOR_VENDA_LIQ, vp.CUSTO, vp.GRUPO_PRODUTO, 
+               vp.SUBGRUPO_PRODUTO, vp.LINHA, vp.COLECAO, vp.GRIFFE, 
+               vp.VENDEDOR,
+               ISNULL(troca_item.QTDE_TROCA, 0) AS QTDE_TROCA_ITEM,
+               ISNULL(troca_item.VALOR_TROCA, 0) AS VALOR_TROCA_ITEM
+FROM W_CTB_LOJA_VENDA_PEDIDO_PRODUTO vp WITH (NOLOCK)
+LEFT JOIN PRODUTOS p WITH (NOLOCK) ON p.PRODUTO = vp.PRODUTO
+LEFT JOIN (
+    SELECT 
+        TICKET,
+        CODIGO_FILIAL,
+        PRODUTO,
+        COR_PRODUTO,
+        TAMANHO,
+        SUM(QTDE) AS QTDE_TROCA,
+        SUM((PRECO_LIQUIDO * QTDE) - ISNULL(DESCONTO_ITEM, 0)) AS VALOR_TROCA
+    FROM LOJA_VENDA_TROCA WITH (NOLOCK)
+    WHERE QTDE_CANCELADA = 0
+    GROUP BY TICKET, CODIGO_FILIAL, PRODUTO, COR_PRODUTO, TAMANHO
+) troca_item ON troca_item.TICKET = vp.TICKET 
+    AND troca_item.CODIGO_FILIAL = vp.CODIGO_FILIAL
+    AND troca_item.PRODUTO = vp.PRODUTO
+    AND ISNULL(troca_item.COR_PRODUTO, '') = ISNULL(vp.COR_PRODUTO, '')
+    AND ISNULL(troca_item.TAMANHO, 0) = ISNULL(vp.TAMANHO, 0)
+WHERE vp.DATA_VENDA >= '2024-01-01'
+    """,
+    'vendas_tickets': """
+        SELECT DISTINCT vp.CODIGO_FILIAL, vp.TICKET, vp.FILIAL, vp.DATA_VENDA,
+               v.VALOR_TIKET, v.DESCONTO, v.VALOR_VENDA_BRUTA, 
+               v.CODIGO_TAB_PRECO, v.CODIGO_DESCONTO, v.OPERACAO_VENDA, 
+               v.DATA_HORA_CANCELAMENTO, v.VENDEDOR_APELIDO, v.CLIENTE_VAREJO,
+               ISNULL(troca_ticket.QTDE_TROCA_TICKET, 0) AS QTDE_TROCA_TICKET,
+               ISNULL(troca_ticket.VALOR_TROCA_TICKET, 0) AS VALOR_TROCA_TICKET
+FROM W_CTB_LOJA_VENDA_PEDIDO_PRODUTO vp WITH (NOLOCK)
+LEFT JOIN W_CTB_LOJA_VENDA_PEDIDO v WITH (NOLOCK)
+    ON v.FILIAL = vp.FILIAL AND v.PEDIDO = vp.PEDIDO AND v.TICKET = vp.TICKET
+LEFT JOIN (
+    SELECT 
+        TICKET,
+        CODIGO_FILIAL,
+        SUM(QTDE) AS QTDE_TROCA_TICKET,
+        SUM((PRECO_LIQUIDO * QTDE) - ISNULL(DESCONTO_ITEM, 0)) AS VALOR_TROCA_TICKET
+    FROM LOJA_VENDA_TROCA WITH (NOLOCK)
+    WHERE QTDE_CANCELADA = 0
+    GROUP BY TICKET, CODIGO_FILIAL
+) troca_ticket ON troca_ticket.TICKET = vp.TICKET 
+    AND troca_ticket.CODIGO_FILIAL = vp.CODIGO_FILIAL
+WHERE vp.DATA_VENDA >= '2024-01-01'
+    """,
+}
+
+
+# Queries limitadas por data que podem ser extraídas em partições paralelas
+PARTICIONAMENTO = {
+    'vendas': {'coluna': 'vp.DATA_VENDA', 'inicio': '2024-01-01'},
+    'vendas_tickets': {'coluna': 'vp.DATA_VENDA', 'inicio': '2024-01-01'},
+    'ecommerce': {'coluna': 'f.EMISSAO', 'inicio': '2024-01-01'},
+}
+
+# Extração particionada: conexões simultâneas, tamanho da partição (0 = mensal), tentativas
+PARALELISMO = {
+    'conexoes': 4,
+    'dias_particao': 0,
+    'tentativas': 3,
+}
+
+# Relatórios processados em blocos a partir das partições gravadas em disco
+# (memória limitada, ver processar_vendas_streaming)
+STREAMING = {
+    'vendas': False,
+}
+
+# Contagem de linhas da pré-verificação de memória: estatísticas da tabela principal
+# ou COUNT_BIG só da tabela filtrada por data (sem os joins da query)
+ESTIMATIVA_LINHAS = {
+    'produtos': {'tabela': 'PRODUTOS'},
+    'estoque': {'tabela': 'ESTOQUE_PRODUTOS'},
+    'produtos_barra': {'tabela': 'PRODUTOS_BARRA'},
+    'cores': {'tabela': 'CORES_BASICAS'},
+    'entradas': {'tabela': 'ESTOQUE_PROD1_ENT'},
+    'vendas': {'contagem': "SELECT COUNT_BIG(*) FROM W_CTB_LOJA_VENDA_PEDIDO_PRODUTO vp WITH (NOLOCK) "
+                           f"WHERE vp.DATA_VENDA >= '{PARTICIONAMENTO['vendas']['inicio']}'"},
+    'vendas_tickets': {'contagem': "SELECT COUNT_BIG(*) FROM (SELECT DISTINCT vp.CODIGO_FILIAL, vp.TICKET "
+                                   "FROM W_CTB_LOJA_VENDA_PEDIDO_PRODUTO vp WITH (NOLOCK) "
+                                   f"WHERE vp.DATA_VENDA >= '{PARTICIONAMENTO['vendas_tickets']['inicio']}') AS t"},
+    'ecommerce': {'contagem': "SELECT COUNT_BIG(*) FROM FATURAMENTO f WITH (NOLOCK) "
+                              "JOIN W_FATURAMENTO_PROD_02 fp WITH (NOLOCK) "
+                              "ON f.FILIAL = fp.FILIAL AND f.NF_SAIDA = fp.NF_SAIDA AND f.SERIE_NF = fp.SERIE_NF "
+                              f"WHERE f.EMISSAO >= '{PARTICIONAMENTO['ecommerce']['inicio']}' AND f.NOTA_CANCELADA = 0"},
+}
+
+def opcoes_chaves_codigo_barra(colunas, prioridade_tamanho=True):
+    """Sequência de chaves tentadas no match de código de barras"""
+    chaves_opcoes = []
+    if prioridade_tamanho and all(col in colunas for col in ['PRODUTO', 'COR_PRODUTO', 'TAMANHO']):
+        chaves_opcoes.append(['PRODUTO', 'COR_PRODUTO', 'TAMANHO'])
+    if all(col in colunas for col in ['PRODUTO', 'COR_PRODUTO']):
+        chaves_opcoes.append(['PRODUTO', 'COR_PRODUTO'])
+    chaves_opcoes.append(['PRODUTO'])
+    return chaves_opcoes
+
+def enriquecer_com_codigo_barra(df_base, df_codigos_barra, prioridade_tamanho=True, chaves_fixas=None):
     """
     Adiciona a coluna CODIGO_BARRA ao DataFrame base usando as colunas disponíveis.
     A tentativa de match respeita a sequência: PRODUTO+COR+TAMANHO (se existir),
     PRODUTO+COR e por fim apenas PRODUTO.
+    chaves_fixas força uma opção já escolhida (processamento em blocos);
+    lista vazia significa que nenhuma opção casou (sem coluna CODIGO_BARRA).
     """
     if 'PRODUTO' not in df_base.columns:
         return df_base
@@ -42,12 +299,13 @@ def enriquecer_com_codigo_barra(df_base, df_codigos_barra, prioridade_tamanho=Tr
     codigos = df_codigos_barra[['PRODUTO', 'COR_PRODUTO', 'TAMANHO', 'CODIGO_BARRA']].copy()
     codigos.drop_duplicates(subset=['PRODUTO', 'COR_PRODUTO', 'TAMANHO'], inplace=True)
     
-    chaves_opcoes = []
-    if prioridade_tamanho and all(col in df_resultado.columns for col in ['PRODUTO', 'COR_PRODUTO', 'TAMANHO']):
-        chaves_opcoes.append(['PRODUTO', 'COR_PRODUTO', 'TAMANHO'])
-    if all(col in df_resultado.columns for col in ['PRODUTO', 'COR_PRODUTO']):
-        chaves_opcoes.append(['PRODUTO', 'COR_PRODUTO'])
-    chaves_opcoes.append(['PRODUTO'])
+    if chaves_fixas is not None:
+        if not chaves_fixas:
+            return df_resultado
+        codigos_merge = codigos[chaves_fixas + ['CODIGO_BARRA']].drop_duplicates(subset=chaves_fixas)
+        return df_resultado.merge(codigos_merge, how='left', on=chaves_fixas, suffixes=('', '_MERGE'))
+    
+    chaves_opcoes = opcoes_chaves_codigo_barra(df_resultado.columns, prioridade_tamanho)
     
     for chaves in chaves_opcoes:
         codigos_merge = codigos[chaves + ['CODIGO_BARRA']].drop_duplicates(subset=chaves)
@@ -59,16 +317,19 @@ def enriquecer_com_codigo_barra(df_base, df_codigos_barra, prioridade_tamanho=Tr
     
     return df_resultado
 
+def string_conexao():
+    """String ODBC do SQL Server (pyodbc e driver Arrow de leitura_colunar)"""
+    return (f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"DATABASE={DB_CONFIG['database']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};")
+
 def conectar_banco():
     """Conecta ao SQL Server"""
     try:
         print("Conectando ao banco...")
-        conn_str = (f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                   f"SERVER={DB_CONFIG['server']};"
-                   f"DATABASE={DB_CONFIG['database']};"
-                   f"UID={DB_CONFIG['username']};"
-                   f"PWD={DB_CONFIG['password']};")
-        return pyodbc.connect(conn_str)
+        return pyodbc.connect(string_conexao())
     except Exception as e:
         print(f"✗ Erro conexão: {e}")
         sys.exit(1)
@@ -80,10 +341,21 @@ def converter_datas(df, colunas):
             df[col] = pd.to_datetime(df[col], errors='coerce')
     return df
 
+def diretorio_dados():
+    """Pasta das saídas: data/ (ou data/preview/ no modo preview, sem tocar nos relatórios reais)"""
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    if amostragem.AMOSTRA_CONFIG['habilitado']:
+        data_dir = os.path.join(data_dir, "preview")
+    return data_dir
+
+def marcar_preview(workbook, nome):
+    """No modo preview, identifica a amostra nas propriedades do XLSX"""
+    if amostragem.AMOSTRA_CONFIG['habilitado']:
+        workbook.set_properties({'title': f"{nome} (preview)", 'comments': amostragem.descricao()})
+
 def salvar_relatorio(df, nome, sheet_name):
     """Salva em XLSX e CSV com tratamento de arquivos em uso"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(script_dir, "data")
+    data_dir = diretorio_dados()
     os.makedirs(data_dir, exist_ok=True)
     
     # XLSX com timestamp se arquivo estiver em uso
@@ -93,6 +365,7 @@ def salvar_relatorio(df, nome, sheet_name):
                            datetime_format='dd/mm/yyyy', date_format='dd/mm/yyyy') as writer:
             df.to_excel(writer, sheet_name=sheet_name, index=False)
             writer.sheets[sheet_name].autofit()
+            marcar_preview(writer.book, nome)
         print(f"✓ {nome}.xlsx: {len(df):,} registros")
     except PermissionError:
         # Arquivo em uso, salva com timestamp
@@ -102,12 +375,95 @@ def salvar_relatorio(df, nome, sheet_name):
                            datetime_format='dd/mm/yyyy', date_format='dd/mm/yyyy') as writer:
             df.to_excel(writer, sheet_name=sheet_name, index=False)
             writer.sheets[sheet_name].autofit()
+            marcar_preview(writer.book, nome)
         print(f"⚠ {nome}.xlsx em uso - salvo como {nome}_{timestamp}.xlsx: {len(df):,} registros")
     
-    # CSV (sempre funciona)
+    # CSV (sempre funciona) + variantes comprimidas configuradas
     csv_path = os.path.join(data_dir, f"{nome}.csv")
-    df.to_csv(csv_path, index=False, encoding='utf-8-sig', sep=';', decimal=',')
+    escrita_csv.salvar_csv(df, csv_path)
     print(f"✓ {nome}.csv: {len(df):,} registros")
+    
+    # Uma pasta por empresa/filial/mês (só regrava as partições alteradas)
+    if saida_particionada.habilitado(nome):
+        saida_particionada.gravar(df, nome)
+
+LIMITE_LINHAS_XLSX = 1048575
+
+def iniciar_saida_incremental(nome, sheet_name, colunas):
+    """
+    Abre CSV e XLSX para gravação em blocos (mesmo formato de salvar_relatorio).
+    O XLSX usa o modo constant_memory do xlsxwriter, que grava linha a linha.
+    """
+    import xlsxwriter
+    
+    data_dir = diretorio_dados()
+    os.makedirs(data_dir, exist_ok=True)
+    
+    xlsx_path = os.path.join(data_dir, f"{nome}.xlsx")
+    try:
+        # Abre já para detectar arquivo em uso, como em salvar_relatorio
+        with open(xlsx_path, 'ab'):
+            pass
+    except PermissionError:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        print(f"⚠ {nome}.xlsx em uso - salvando como {nome}_{timestamp}.xlsx")
+        xlsx_path = os.path.join(data_dir, f"{nome}_{timestamp}.xlsx")
+    
+    workbook = xlsxwriter.Workbook(xlsx_path, {'constant_memory': True, 'nan_inf_to_errors': True})
+    marcar_preview(workbook, nome)
+    worksheet = workbook.add_worksheet(sheet_name)
+    formato_data = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+    formato_cabecalho = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    worksheet.write_row(0, 0, colunas, formato_cabecalho)
+    
+    csv_path = os.path.join(data_dir, f"{nome}.csv")
+    return {
+        'nome': nome,
+        'colunas': colunas,
+        'workbook': workbook,
+        'worksheet': worksheet,
+        'formato_data': formato_data,
+        'linha_xlsx': 1,
+        'csv_path': csv_path,
+        'csv_iniciado': False,
+        'total': 0,
+    }
+
+def escrever_bloco(saida, df):
+    """Acrescenta um bloco ao CSV e ao XLSX abertos por iniciar_saida_incremental"""
+    df = df[saida['colunas']]
+    
+    # CSV: cabeçalho e BOM apenas no primeiro bloco
+    escrita_csv.salvar_csv(df, saida['csv_path'], anexar=saida['csv_iniciado'])
+    saida['csv_iniciado'] = True
+    
+    # XLSX: linha a linha (constant_memory)
+    worksheet = saida['worksheet']
+    datas = [pd.api.types.is_datetime64_any_dtype(df[c]) for c in df.columns]
+    for valores in df.itertuples(index=False, name=None):
+        if saida['linha_xlsx'] > LIMITE_LINHAS_XLSX:
+            break
+        for col, valor in enumerate(valores):
+            if valor is None or valor is pd.NaT or (isinstance(valor, float) and np.isnan(valor)):
+                continue
+            if datas[col]:
+                worksheet.write_datetime(saida['linha_xlsx'], col, valor.to_pydatetime(), saida['formato_data'])
+            else:
+                worksheet.write(saida['linha_xlsx'], col, valor)
+        saida['linha_xlsx'] += 1
+    saida['total'] += len(df)
+
+def finalizar_saida_incremental(saida):
+    """Fecha os arquivos da gravação em blocos"""
+    saida['workbook'].close()
+    nome = saida['nome']
+    if saida['total'] > LIMITE_LINHAS_XLSX:
+        print(f"⚠ {nome}.xlsx: limite do Excel atingido, gravados {LIMITE_LINHAS_XLSX:,} de {saida['total']:,} registros")
+    else:
+        print(f"✓ {nome}.xlsx: {saida['total']:,} registros")
+    print(f"✓ {nome}.csv: {saida['total']:,} registros")
+    if saida_particionada.habilitado(nome):
+        print(f"⚠ {nome}: saída particionada não é gerada no processamento em blocos")
 
 def processar_produtos(df, df_codigos_barra, salvar=True):
     """Processa relatório de produtos"""
@@ -123,11 +479,8 @@ def processar_produtos(df, df_codigos_barra, salvar=True):
     print(f"Tempo: {time.time()-t:.2f}s")
     return df
 
-def processar_estoque(df_estoque, df_produtos, df_codigos_barra):
-    """Processa relatório de estoque"""
-    t = time.time()
-    print("\n[ESTOQUE]")
-    
+def tratar_estoque(df_estoque, df_produtos, df_codigos_barra):
+    """Regras do relatório de estoque (sem gravar): merge com produtos, valor total e código de barras"""
     # Merge com produtos
     cols_prod = ['PRODUTO', 'DESC_PRODUTO', 'CUSTO_REPOSICAO1', 'PRECO_REPOSICAO_1', 
                  'LINHA', 'GRUPO_PRODUTO', 'SUBGRUPO_PRODUTO', 'GRADE', 'GRIFFE']
@@ -136,16 +489,35 @@ def processar_estoque(df_estoque, df_produtos, df_codigos_barra):
     df = converter_datas(df, ['ULTIMA_SAIDA', 'ULTIMA_ENTRADA', 'DATA_PARA_TRANSFERENCIA', 'DATA_AJUSTE'])
     df['VALOR_TOTAL_ESTOQUE'] = df['ESTOQUE'].fillna(0) * df['CUSTO_REPOSICAO1'].fillna(0)
     df.drop(columns=COLS_REMOVER['estoque'], inplace=True, errors='ignore')
-    df = enriquecer_com_codigo_barra(df, df_codigos_barra)
+    return enriquecer_com_codigo_barra(df, df_codigos_barra)
+
+def processar_estoque(df_estoque, df_produtos, df_codigos_barra):
+    """Processa relatório de estoque"""
+    t = time.time()
+    print("\n[ESTOQUE]")
+    
+    df = tratar_estoque(df_estoque, df_produtos, df_codigos_barra)
     
     salvar_relatorio(df, 'estoque_tratados', 'EstoqueTratado')
+    
+    # Delta em relação à execução anterior + histórico de posições
+    if historico_estoque.HISTORICO_CONFIG['habilitado']:
+        delta, resumo = historico_estoque.atualizar_historico(df)
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        escrita_csv.salvar_csv(delta, os.path.join(data_dir, 'estoque_tratados_delta.csv'))
+        with open(os.path.join(data_dir, 'estoque_tratados_delta.json'), 'w', encoding='utf-8') as f:
+            json.dump(resumo, f, indent=1)
+        print(f"✓ estoque_tratados_delta.csv: {resumo['inseridas']:,} inseridos, "
+              f"{resumo['alteradas']:,} alterados, {resumo['removidas']:,} removidos "
+              f"({resumo['posicoes_historico']:,} posições no histórico)")
     print(f"Tempo: {time.time()-t:.2f}s")
 
-def processar_vendas(df, df_codigos_barra):
-    """Processa relatório de vendas"""
-    t = time.time()
-    print("\n[VENDAS]")
-    
+def calcular_vendas(df, df_codigos_barra, chaves_codigo_barra=None):
+    """
+    Regras de negócio das vendas (linhas com QTDE > 0, trocas rateadas por ticket,
+    VALOR_LIQUIDO e QTDE líquidos, colunas do Linx no final).
+    Todas as linhas de um ticket (TICKET + CODIGO_FILIAL) precisam estar em df.
+    """
     # 1) Manter apenas linhas com quantidade positiva (mesma lógica do site)
     df = df[df['QTDE'] > 0].copy()
     
@@ -155,7 +527,8 @@ def processar_vendas(df, df_codigos_barra):
     # 3) Enriquecimento com códigos de barra usando a mesma lógica do site:
     #    prioridade PRODUTO+COR+TAMANHO, depois PRODUTO+COR, depois PRODUTO
     #    (equivalente ao enrichWithBarcode com prioritizeSize=True)
-    df = enriquecer_com_codigo_barra(df, df_codigos_barra, prioridade_tamanho=True)
+    df = enriquecer_com_codigo_barra(df, df_codigos_barra, prioridade_tamanho=True,
+                                     chaves_fixas=chaves_codigo_barra)
     
     # 4) Calcular valor total da venda (antes de considerar trocas)
     #    Este será o valor que vai para TOTAL_VENDA
@@ -250,16 +623,259 @@ def processar_vendas(df, df_codigos_barra):
         if col in df.columns:
             cols.append(col)
     
-    df = df[cols]
+    return df[cols]
+
+def tratar_tickets_vendas(df_tickets):
+    """Cabeçalhos de ticket do modo normalizado: datas convertidas e uma linha por CODIGO_FILIAL + TICKET"""
+    df = converter_datas(df_tickets.copy(), ['DATA_VENDA', 'DATA_HORA_CANCELAMENTO'])
+    duplicados = df.duplicated(subset=CHAVE_TICKET, keep='first')
+    if duplicados.any():
+        # Ticket com mais de um pedido e cabeçalhos diferentes
+        print(f"⚠ {int(duplicados.sum()):,} cabeçalhos repetidos de ticket; mantido o primeiro")
+        df = df[~duplicados]
+    return df.reset_index(drop=True)
+
+def juntar_cabecalho_vendas(df, df_tickets, colunas):
+    """Traz colunas do cabeçalho do ticket para as linhas de vendas (chave CODIGO_FILIAL + TICKET)"""
+    colunas = [c for c in colunas if c in df_tickets.columns and c not in df.columns]
+    if not colunas:
+        return df
+    return df.merge(df_tickets[CHAVE_TICKET + colunas], on=CHAVE_TICKET, how='left')
+
+def salvar_tickets_vendas(df_tickets):
+    """Grava a tabela de cabeçalhos (vendas_tickets) sem as colunas técnicas"""
+    colunas = COLS_REMOVER['vendas'] + COLS_BASE_LOCAL['vendas']
+    salvar_relatorio(df_tickets.drop(columns=colunas, errors='ignore'), 'vendas_tickets', 'VendasTickets')
+
+def processar_vendas(df, df_codigos_barra, gerar_cubos=True, df_tickets=None):
+    """
+    Processa relatório de vendas e os cubos pré-agregados lidos pelo dashboard (data/cubos).
+    df pode ser um DataFrame ou uma função que devolve os blocos (ver processar_vendas_streaming).
+    Com df_tickets (modo normalizado) grava vendas_itens + vendas_tickets em vez de vendas_tratadas.
+    """
+    t = time.time()
+    print("\n[VENDAS]")
+    
+    if df_tickets is not None:
+        df_tickets = tratar_tickets_vendas(df_tickets)
+    
+    if callable(df):
+        processar_vendas_streaming(df, df_codigos_barra, gerar_cubos=gerar_cubos, df_tickets=df_tickets)
+        print(f"Tempo: {time.time()-t:.2f}s")
+        return
     
-    salvar_relatorio(df, 'vendas_tratadas', 'VendasTratadas')
+    if df_tickets is None:
+        df = calcular_vendas(df, df_codigos_barra)
+        base_vendas_local.gravar_base(df, PARTICIONAMENTO['vendas']['inicio'])
+    else:
+        df = calcular_vendas(juntar_cabecalho_vendas(df, df_tickets, COLS_TICKET_CALCULO), df_codigos_barra)
+        base_vendas_local.gravar_base(juntar_cabecalho_vendas(df, df_tickets, base_vendas_local.COLUNAS_TEXTO),
+                                      PARTICIONAMENTO['vendas']['inicio'])
+        df.drop(columns=COLS_TICKET_CALCULO, inplace=True)
+    df.drop(columns=COLS_BASE_LOCAL['vendas'], inplace=True, errors='ignore')
+    
+    if df_tickets is None:
+        salvar_relatorio(df, 'vendas_tratadas', 'VendasTratadas')
+    else:
+        salvar_relatorio(df, 'vendas_itens', 'VendasItens')
+        salvar_tickets_vendas(df_tickets)
+    if gerar_cubos:
+        salvar_cubos(gerar_cubos_vendas(df))
     print(f"Tempo: {time.time()-t:.2f}s")
 
-def processar_ecommerce(df):
-    """Processa relatório de e-commerce"""
-    t = time.time()
-    print("\n[E-COMMERCE]")
+def blocos_por_ticket(blocos):
+    """
+    Reagrupa os blocos para que nenhum ticket (CODIGO_FILIAL + TICKET) fique dividido:
+    as linhas finais com o mesmo ticket da última linha passam para o bloco seguinte.
+    Supõe entrada ordenada ou particionada por ticket (as partições por data servem,
+    já que um ticket tem uma única DATA_VENDA).
+    """
+    resto = None
+    for bloco in blocos:
+        if resto is not None and len(resto):
+            bloco = pd.concat([resto, bloco], ignore_index=True)
+        if bloco.empty:
+            continue
+        chave = bloco['CODIGO_FILIAL'].astype(str) + '|' + bloco['TICKET'].astype(str)
+        # Sufixo contíguo de linhas com a chave da última linha
+        no_fim = (chave == chave.iloc[-1])[::-1].cummin()[::-1]
+        resto = bloco[no_fim]
+        if (~no_fim).any():
+            yield bloco[~no_fim]
+    if resto is not None and len(resto):
+        yield resto
+
+def analisar_blocos(fonte, df_codigos_barra):
+    """
+    Primeira passada do modo em blocos. Retorna:
+    - a opção de chaves de código de barras que enriquecer_com_codigo_barra
+      escolheria com o DataFrame inteiro;
+    - as colunas inteiras que viram float (NULL) em algum bloco, para que todos
+      os blocos sejam gravados com o mesmo tipo que o DataFrame concatenado teria.
+    """
+    opcoes = None
+    casou = []
+    colunas_float = set()
+    codigos = df_codigos_barra[['PRODUTO', 'COR_PRODUTO', 'TAMANHO', 'CODIGO_BARRA']].drop_duplicates(
+        subset=['PRODUTO', 'COR_PRODUTO', 'TAMANHO'])
+    for bloco in fonte():
+        colunas_float.update(c for c in bloco.columns if pd.api.types.is_float_dtype(bloco[c]))
+        if 'PRODUTO' not in bloco.columns:
+            continue
+        bloco = bloco[bloco['QTDE'] > 0]
+        if opcoes is None:
+            opcoes = opcoes_chaves_codigo_barra(bloco.columns, prioridade_tamanho=True)
+            casou = [False] * len(opcoes)
+        if casou[0]:
+            continue
+        for i, chaves in enumerate(opcoes):
+            if casou[i]:
+                continue
+            codigos_merge = codigos[chaves + ['CODIGO_BARRA']].drop_duplicates(subset=chaves)
+            casou[i] = bloco[chaves].merge(codigos_merge, how='left', on=chaves)['CODIGO_BARRA'].notna().any()
+    
+    chaves = None if opcoes is None else []
+    for i, opcao in enumerate(opcoes or []):
+        if casou[i]:
+            chaves = opcao
+            break
+    return chaves, colunas_float
+
+def processar_vendas_streaming(fonte, df_codigos_barra, gerar_cubos=True, df_tickets=None):
+    """
+    Motor de vendas em blocos com memória limitada: fonte() devolve um iterador de
+    DataFrames (ex.: partições de data lidas do checkpoint). Cada bloco completo de
+    tickets passa por calcular_vendas e é gravado incrementalmente; o resultado é
+    idêntico ao processamento em memória do DataFrame concatenado.
+    df_tickets (já tratado, modo normalizado) fica inteiro em memória: uma linha por ticket.
+    """
+    chaves, colunas_float = analisar_blocos(fonte, df_codigos_barra)
+    nome, sheet_name = ('vendas_tratadas', 'VendasTratadas') if df_tickets is None else ('vendas_itens', 'VendasItens')
+    
+    saida = None
+    base = base_vendas_local.iniciar_base(PARTICIONAMENTO['vendas']['inicio'])
+    cubos_parciais = []
+    total = 0
+    for bloco in blocos_por_ticket(fonte()):
+        inteiras = [c for c in bloco.columns if c in colunas_float and not pd.api.types.is_float_dtype(bloco[c])]
+        if inteiras:
+            bloco = bloco.astype({c: 'float64' for c in inteiras})
+        if df_tickets is None:
+            df = calcular_vendas(bloco, df_codigos_barra, chaves_codigo_barra=chaves)
+            base_vendas_local.acrescentar_base(base, df)
+        else:
+            df = calcular_vendas(juntar_cabecalho_vendas(bloco, df_tickets, COLS_TICKET_CALCULO),
+                                 df_codigos_barra, chaves_codigo_barra=chaves)
+            base_vendas_local.acrescentar_base(base, juntar_cabecalho_vendas(df, df_tickets, base_vendas_local.COLUNAS_TEXTO))
+            df = df.drop(columns=COLS_TICKET_CALCULO)
+        df = df.drop(columns=COLS_BASE_LOCAL['vendas'], errors='ignore')
+        if saida is None:
+            saida = iniciar_saida_incremental(nome, sheet_name, list(df.columns))
+        escrever_bloco(saida, df)
+        if gerar_cubos and len(df):
+            cubos_parciais.append(gerar_cubos_vendas(df, arredondar=False))
+        total += len(df)
     
+    if saida is not None:
+        finalizar_saida_incremental(saida)
+    if df_tickets is not None:
+        salvar_tickets_vendas(df_tickets)
+    base_vendas_local.finalizar_base(base)
+    if gerar_cubos and cubos_parciais:
+        salvar_cubos(combinar_cubos(cubos_parciais))
+    print(f"  vendas em blocos: {total:,} registros")
+
+def combinar_cubos(cubos_parciais):
+    """
+    Soma cubos calculados por bloco. TICKETS também é somável porque um ticket
+    nunca aparece em dois blocos (blocos_por_ticket).
+    """
+    cubos = {}
+    for nome in cubos_parciais[0]:
+        partes = pd.concat([c[nome] for c in cubos_parciais], ignore_index=True)
+        dimensoes = [d for d in CUBOS_VENDAS[nome] if d in partes.columns]
+        cubo = partes.groupby(dimensoes, sort=True, dropna=False)[MEDIDAS_CUBOS + ['TICKETS']].sum().reset_index()
+        cubo[MEDIDAS_CUBOS] = cubo[MEDIDAS_CUBOS].round(2)
+        cubos[nome] = cubo
+    return cubos
+
+def limite_cubos():
+    """Primeiro dia fora dos cubos (CUBOS_CONFIG['ate'], padrão hoje)"""
+    return CUBOS_CONFIG['ate'] or date.today()
+
+def gerar_cubos_vendas(df, arredondar=True):
+    """
+    Agrega as vendas tratadas (já líquidas de trocas) nos cubos de CUBOS_VENDAS,
+    só com os dias anteriores a limite_cubos() (o dia corrente ainda está aberto).
+    TICKETS conta tickets distintos (TICKET + CODIGO_FILIAL) em cada célula.
+    arredondar=False para cubos parciais que ainda serão somados (combinar_cubos).
+    """
+    df = df[df['DATA_VENDA'] < pd.Timestamp(limite_cubos())]
+    base = pd.DataFrame({
+        'DATA': df['DATA_VENDA'].dt.strftime('%Y-%m-%d'),
+        'MES': df['DATA_VENDA'].dt.strftime('%Y-%m'),
+        '_TICKET': df['CODIGO_FILIAL'].astype(str) + '|' + df['TICKET'].astype(str),
+    })
+    for col in set(sum(CUBOS_VENDAS.values(), [])) - {'DATA', 'MES'}:
+        if col in df.columns:
+            base[col] = df[col].fillna('').astype(str).str.strip()
+    for col in MEDIDAS_CUBOS:
+        base[col] = df[col].fillna(0).astype(float) if col in df.columns else 0.0
+    
+    cubos = {}
+    for nome, dimensoes in CUBOS_VENDAS.items():
+        dimensoes = [d for d in dimensoes if d in base.columns]
+        agregacoes = {col: (col, 'sum') for col in MEDIDAS_CUBOS}
+        agregacoes['TICKETS'] = ('_TICKET', 'nunique')
+        cubo = base.groupby(dimensoes, sort=True, dropna=False).agg(**agregacoes).reset_index()
+        if arredondar:
+            cubo[MEDIDAS_CUBOS] = cubo[MEDIDAS_CUBOS].round(2)
+        cubos[nome] = cubo
+    return cubos
+
+def salvar_cubos(cubos):
+    """
+    Grava cada cubo em data/cubos/<nome>.json em formato colunar tipado:
+    {"cubo", "gerado_em", "registros", "periodo": {"inicio", "fim"}, "colunas": [{"nome", "tipo"}],
+     "dados": {coluna: [...]}} - periodo.fim é exclusivo (limite_cubos)
+    """
+    cubos_dir = os.path.join(diretorio_dados(), "cubos")
+    os.makedirs(cubos_dir, exist_ok=True)
+    
+    gerado_em = datetime.now().isoformat(timespec='seconds')
+    for nome, cubo in cubos.items():
+        colunas = []
+        for col in cubo.columns:
+            if col == 'DATA':
+                tipo = 'date'
+            elif col == 'MES':
+                tipo = 'month'
+            elif pd.api.types.is_integer_dtype(cubo[col]):
+                tipo = 'integer'
+            elif pd.api.types.is_numeric_dtype(cubo[col]):
+                tipo = 'number'
+            else:
+                tipo = 'string'
+            colunas.append({'nome': col, 'tipo': tipo})
+        
+        conteudo = {
+            'cubo': nome,
+            'gerado_em': gerado_em,
+            'registros': len(cubo),
+            'periodo': {'inicio': PARTICIONAMENTO['vendas']['inicio'], 'fim': limite_cubos().isoformat()},
+            'colunas': colunas,
+            # NaN não é JSON válido para o JSON.parse do dashboard
+            'dados': {col: cubo[col].astype(object).where(cubo[col].notna(), None).tolist()
+                      for col in cubo.columns},
+        }
+        caminho = os.path.join(cubos_dir, f"{nome}.json")
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(conteudo, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(caminho + '.tmp', caminho)
+        print(f"✓ cubos/{nome}.json: {len(cubo):,} registros")
+
+def tratar_ecommerce(df):
+    """Regras do relatório de e-commerce (sem gravar): datas e uma linha por NF_SAIDA + SERIE_NF + ITEM"""
     # Converter datas
     df = converter_datas(df, ['EMISSAO', 'DATA_SAIDA', 'ENTREGA'])
     
@@ -274,20 +890,21 @@ def processar_ecommerce(df):
         
         # Remover coluna auxiliar
         df.drop(columns=['_CHAVE_DUPLICATA'], inplace=True)
-    
-    salvar_relatorio(df, 'ecommerce', 'Ecommerce')
-    print(f"Tempo: {time.time()-t:.2f}s")
+    return df
 
-def processar_entradas(df_mov, df_produtos, df_cores):
-    """Processa relatório de entradas"""
+def processar_ecommerce(df):
+    """Processa relatório de e-commerce"""
     t = time.time()
-    print("\n[ENTRADAS]")
+    print("\n[E-COMMERCE]")
     
-    if df_mov.empty:
-        print("✗ Sem dados de entradas")
-        return
+    df = tratar_ecommerce(df)
     
-    df_mov.dropna(subset=['PRODUTO'], inplace=True)
+    salvar_relatorio(df, 'ecommerce', 'Ecommerce')
+    print(f"Tempo: {time.time()-t:.2f}s")
+
+def tratar_entradas(df_mov, df_produtos, df_cores):
+    """Regras do relatório de entradas (sem gravar): produtos, cores e ordem das colunas"""
+    df_mov = df_mov.dropna(subset=['PRODUTO'])
     
     # Merge produtos
     cols_prod = ['PRODUTO', 'DESC_PRODUTO', 'GRUPO_PRODUTO', 'SUBGRUPO_PRODUTO', 'LINHA', 'COLECAO']
@@ -303,7 +920,18 @@ def processar_entradas(df_mov, df_produtos, df_cores):
     ordem = ['EMISSAO', 'FILIAL', 'ROMANEIO_PRODUTO', 'PRODUTO', 'DESC_PRODUTO',
              'COR_PRODUTO', 'DESC_COR_PRODUTO', 'QTDE_TOTAL', 'GRUPO_PRODUTO',
              'SUBGRUPO_PRODUTO', 'LINHA', 'COLECAO']
-    df = df[[c for c in ordem if c in df.columns]]
+    return df[[c for c in ordem if c in df.columns]]
+
+def processar_entradas(df_mov, df_produtos, df_cores):
+    """Processa relatório de entradas"""
+    t = time.time()
+    print("\n[ENTRADAS]")
+    
+    if df_mov.empty:
+        print("✗ Sem dados de entradas")
+        return
+    
+    df = tratar_entradas(df_mov, df_produtos, df_cores)
     
     salvar_relatorio(df, 'entradas', 'EntradasEnriquecidas')
     print(f"Tempo: {time.time()-t:.2f}s")
@@ -323,20 +951,22 @@ def copiar_arquivos(relatorios_gerados=None):
         
         # Mapeamento de relatórios para nomes de arquivos
         mapeamento_arquivos = {
-            'produtos': 'produtos_tratados',
-            'estoque': 'estoque_tratados',
-            'vendas': 'vendas_tratadas',
-            'ecommerce': 'ecommerce',
-            'entradas': 'entradas'
+            'produtos': ['produtos_tratados'],
+            'estoque': ['estoque_tratados'],
+            'vendas': ['vendas_itens', 'vendas_tickets'] if NORMALIZACAO['vendas'] else ['vendas_tratadas'],
+            'ecommerce': ['ecommerce'],
+            'entradas': ['entradas']
         }
         
         # Se não especificado, copia todos
         if relatorios_gerados is None:
-            bases = ['produtos_tratados', 'estoque_tratados', 'vendas_tratadas', 'ecommerce', 'entradas']
-        else:
-            bases = [mapeamento_arquivos[r] for r in relatorios_gerados if r in mapeamento_arquivos]
+            relatorios_gerados = list(mapeamento_arquivos)
+        bases = [base for r in relatorios_gerados for base in mapeamento_arquivos.get(r, [])]
         
-        arquivos = [f"{base}.{ext}" for base in bases for ext in ['xlsx', 'csv']]
+        extensoes = ['xlsx', 'csv'] + [f"csv.{ext}" for ext in escrita_csv.compressoes_ativas()]
+        arquivos = [f"{base}.{ext}" for base in bases for ext in extensoes]
+        if 'estoque_tratados' in bases:
+            arquivos += ['estoque_tratados_delta.csv', 'estoque_tratados_delta.json']
         
         arquivos_copiados = 0
         for destino in destinos:
@@ -346,11 +976,261 @@ def copiar_arquivos(relatorios_gerados=None):
                 if os.path.exists(origem):
                     shutil.copy2(origem, os.path.join(destino, arquivo))
                     arquivos_copiados += 1
+            # Partições: só as novas/alteradas desde a última cópia
+            for base in bases:
+                if saida_particionada.habilitado(base):
+                    arquivos_copiados += saida_particionada.sincronizar(base, destino)
         
         print(f"✓ {arquivos_copiados} arquivos copiados")
     except Exception as e:
         print(f"✗ Erro cópia: {e}")
 
+def gerar_particoes(inicio, dias=0, hoje=None):
+    """
+    Intervalos [inicio, fim) mensais (dias=0) ou de N dias desde inicio.
+    A última partição fica aberta (fim=None) para não perder datas futuras.
+    """
+    atual = datetime.strptime(inicio, '%Y-%m-%d').date()
+    hoje = hoje or date.today()
+    particoes = []
+    while True:
+        if dias:
+            proximo = atual + timedelta(days=dias)
+        else:
+            proximo = date(atual.year + (atual.month == 12), atual.month % 12 + 1, 1)
+        if proximo > hoje:
+            particoes.append((atual, None))
+            return particoes
+        particoes.append((atual, proximo))
+        atual = proximo
+
+def query_particao(nome, query, inicio, fim):
+    """Troca o filtro de data original da query pelo intervalo da partição"""
+    config = PARTICIONAMENTO[nome]
+    original = f"{config['coluna']} >= '{config['inicio']}'"
+    if original not in query:
+        raise ValueError(f"Filtro de data '{original}' não encontrado na query {nome}")
+    filtro = f"{config['coluna']} >= '{inicio}'"
+    if fim is not None:
+        filtro += f" AND {config['coluna']} < '{fim}'"
+    return query.replace(original, filtro)
+
+def ler_particao(nome, query, conexoes_thread):
+    """Lê uma partição com a conexão da thread, reconectando e repetindo em caso de falha"""
+    tentativas = PARALELISMO['tentativas']
+    for tentativa in range(1, tentativas + 1):
+        try:
+            if getattr(conexoes_thread, 'conn', None) is None:
+                conexoes_thread.conn = conectar_banco()
+            return cache_consultas.ler_sql(query, conexoes_thread.conn, ttl=CACHE_TTL.get(nome), nome=nome)
+        except (Exception, SystemExit) as e:
+            # conectar_banco encerra com sys.exit; aqui vale tentar de novo
+            print(f"⚠ {nome}: partição falhou (tentativa {tentativa}/{tentativas}): {e}")
+            try:
+                if getattr(conexoes_thread, 'conn', None) is not None:
+                    conexoes_thread.conn.close()
+            except Exception:
+                pass
+            conexoes_thread.conn = None
+            if tentativa == tentativas:
+                raise RuntimeError(f"Falha ao extrair partição de {nome}") from e
+            time.sleep(2 ** tentativa)
+
+def ler_particionado(nome, query, materializar=True):
+    """
+    Extrai a query em partições de data concorrentes e concatena na ordem.
+    Com materializar=False (modo em blocos) as partições ficam só no checkpoint
+    e o retorno é uma função que as devolve uma a uma, na ordem.
+    """
+    materializar = materializar or not checkpoints_extracao.ativo()
+    particoes = gerar_particoes(PARTICIONAMENTO[nome]['inicio'], PARALELISMO['dias_particao'])
+    conexoes_thread = threading.local()
+    conexoes_abertas = []
+    trava = threading.Lock()
+    
+    def tarefa(intervalo):
+        query_intervalo = query_particao(nome, query, *intervalo)
+        df = checkpoints_extracao.com_checkpoint(
+            checkpoints_extracao.chave_peca(nome, query_intervalo),
+            lambda: ler_particao(nome, query_intervalo, conexoes_thread)
+        )
+        conn = getattr(conexoes_thread, 'conn', None)
+        with trava:
+            if conn is not None and conn not in conexoes_abertas:
+                conexoes_abertas.append(conn)
+        return df if materializar else len(df)
+    
+    t = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=PARALELISMO['conexoes'], thread_name_prefix=f'extracao_{nome}') as executor:
+            partes = list(executor.map(tarefa, particoes))
+    finally:
+        for conn in conexoes_abertas:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    print(f"  {nome}: {len(particoes)} partições em {PARALELISMO['conexoes']} conexões ({time.time()-t:.2f}s)")
+    
+    if not materializar:
+        chaves = [checkpoints_extracao.chave_peca(nome, query_particao(nome, query, *intervalo))
+                  for intervalo in particoes]
+        
+        def fonte():
+            for chave in chaves:
+                yield checkpoints_extracao.obter_peca(chave)
+        fonte.registros = sum(partes)
+        return fonte
+    
+    partes = [p for p in partes if len(p) > 0] or partes[:1]
+    return pd.concat(partes, ignore_index=True)
+
+def filtro_preview(nome):
+    """(filtro de data original, filtro só com os últimos dias) de uma query particionável"""
+    config = PARTICIONAMENTO[nome]
+    inicio = max(datetime.strptime(config['inicio'], '%Y-%m-%d').date(),
+                 date.today() - timedelta(days=amostragem.AMOSTRA_CONFIG['dias']))
+    return f"{config['coluna']} >= '{config['inicio']}'", f"{config['coluna']} >= '{inicio}'"
+
+def ler_amostra(nome, query, conn):
+    """Modo preview: tenta as estratégias de amostragem em ordem (TABLESAMPLE não vale para views)"""
+    filtro = filtro_preview(nome) if nome in PARTICIONAMENTO else None
+    opcoes = amostragem.candidatas(query, filtro)
+    erro = None
+    for i, (estrategia, detalhe, sql) in enumerate(opcoes):
+        try:
+            df = cache_consultas.ler_sql(sql, conn, ttl=CACHE_TTL.get(nome), nome=nome)
+        except Exception as e:
+            print(f"⚠ {nome}: amostra '{estrategia}' falhou ({e})")
+            erro = e
+            continue
+        if df.empty and i < len(opcoes) - 1:
+            # Tabela pequena: TABLESAMPLE pode não sortear nenhuma página
+            continue
+        amostragem.registrar(nome, estrategia, detalhe, len(df))
+        return df
+    raise erro
+
+def gravar_snapshot_dimensao(nome, df):
+    try:
+        snapshots_dimensoes.gravar_snapshot(nome, df)
+    except Exception as e:
+        print(f"⚠ Snapshot de {nome} não gravado: {e}")
+
+def ler_query(nome, query, conn):
+    """Lê uma query; dimensões vêm do snapshot local quando estiver válido"""
+    max_idade = snapshots_dimensoes.DIMENSOES.get(nome)
+    if amostragem.AMOSTRA_CONFIG['habilitado'] and max_idade is None:
+        # Dimensões ficam completas para o enriquecimento não perder matches
+        return ler_amostra(nome, query, conn)
+    if nome == 'produtos' and replica_produtos.REPLICA_CONFIG['habilitado']:
+        # Cópia local + linhas com rowversion nova (sem reler a tabela inteira).
+        # A cópia alimenta o snapshot (usado pelo serviço de processamento) na mesma idade máxima
+        try:
+            df = replica_produtos.sincronizar(conn, query)
+        except Exception as e:
+            print(f"⚠ Cópia local de produtos indisponível ({e}); lendo a tabela inteira")
+        else:
+            manifesto = snapshots_dimensoes.ler_manifesto(nome)
+            if (manifesto is None or time.time() - manifesto['criado'] > max_idade
+                    or not snapshots_dimensoes.SNAPSHOT_CONFIG['leitura_habilitada']):
+                gravar_snapshot_dimensao(nome, df)
+            return df
+    if max_idade is not None:
+        df = snapshots_dimensoes.carregar_dimensao(nome, max_idade=max_idade)
+        if df is not None:
+            print(f"  (snapshot) {nome}")
+            return df
+    
+    if nome in PARTICIONAMENTO and (PARALELISMO['conexoes'] > 1 or STREAMING.get(nome)):
+        return ler_particionado(nome, query, materializar=not STREAMING.get(nome))
+    
+    df = checkpoints_extracao.com_checkpoint(
+        checkpoints_extracao.chave_peca(nome, query),
+        lambda: cache_consultas.ler_sql(query, conn, ttl=CACHE_TTL.get(nome), nome=nome)
+    )
+    
+    if max_idade is not None:
+        gravar_snapshot_dimensao(nome, df)
+    return df
+
+def ordem_extracao(relatorios_processar, dependencias, queries_necessarias, queries):
+    """Ordena as queries para que o primeiro relatório tenha seus dados o quanto antes"""
+    ordem = []
+    for relatorio in relatorios_processar:
+        for nome in dependencias.get(relatorio, []) + [relatorio]:
+            if nome in queries_necessarias and nome in queries and nome not in ordem:
+                ordem.append(nome)
+    return ordem
+
+def preflight_memoria(ordem, queries):
+    """
+    Estima o tamanho de cada query e escolhe o modo de execução (governador_memoria).
+    Em caso de erro mantém tudo em memória.
+    """
+    print("\n[PRÉ-VERIFICAÇÃO DE MEMÓRIA]")
+    conn = None
+    try:
+        conn = conectar_banco()
+        estimativas = [governador_memoria.estimar(nome, queries[nome], conn, **ESTIMATIVA_LINHAS.get(nome, {}))
+                       for nome in ordem]
+    except (Exception, SystemExit) as e:
+        print(f"⚠ Pré-verificação falhou ({e}); mantendo execução em memória")
+        return {}
+    finally:
+        if conn:
+            conn.close()
+    
+    # Só vendas tem motor em blocos; o ganho é de uma partição por vez
+    blocos_possiveis = {
+        nome: len(gerar_particoes(PARTICIONAMENTO[nome]['inicio'], PARALELISMO['dias_particao']))
+        for nome in STREAMING if nome in ordem
+    }
+    return governador_memoria.planejar(estimativas, blocos_possiveis)
+
+def extrair_em_segundo_plano(queries, ordem):
+    """
+    Extrai as queries (na ordem dada) em uma thread produtora.
+    Retorna (dfs, prontos, erros, thread): prontos[nome] é um Event sinalizado
+    quando dfs[nome] está disponível; erros recebe a exceção da extração, se houver.
+    """
+    dfs = {}
+    prontos = {nome: threading.Event() for nome in ordem}
+    erros = []
+    
+    def produtor():
+        conn = None
+        t_ext = time.time()
+        try:
+            conn = conectar_banco()
+            for nome in ordem:
+                dfs[nome] = ler_query(nome, queries[nome], conn)
+                registros = dfs[nome].registros if callable(dfs[nome]) else len(dfs[nome])
+                print(f"✓ {nome}: {registros:,}")
+                prontos[nome].set()
+            print(f"Extração: {time.time()-t_ext:.2f}s")
+        except BaseException as e:
+            # Inclui o SystemExit de conectar_banco, que numa thread seria silencioso
+            erros.append(e)
+        finally:
+            if conn:
+                conn.close()
+            for evento in prontos.values():
+                evento.set()
+    
+    thread = threading.Thread(target=produtor, name='extracao', daemon=True)
+    thread.start()
+    return dfs, prontos, erros, thread
+
+def aguardar_dados(nomes, prontos, erros):
+    """Bloqueia até as queries indicadas chegarem; repassa erro da extração"""
+    for nome in nomes:
+        if nome in prontos:
+            prontos[nome].wait()
+        if erros:
+            raise erros[0]
+
 def exibir_menu():
     """Exibe menu de seleção de relatórios e retorna a escolha"""
     print("\n" + "="*60)
@@ -383,17 +1263,70 @@ def exibir_menu():
         print(f"⚠ Opção inválida '{escolha}'. Exportando todos os relatórios.")
         return 'todos'
 
-def main():
-    """Orquestrador principal"""
+def parse_args(argv=None):
+    """Argumentos de linha de comando (os mesmos de: exportador.py relatorios)"""
+    import exportador
+    return exportador.parser_comando('relatorios').parse_args(argv)
+
+def main(args=None):
+    """Orquestrador principal (args: Namespace de exportador.py relatorios)"""
+    args = args or parse_args()
+    cache_consultas.configurar(habilitado=not args.no_cache, atualizar=args.refresh)
+    if args.backend:
+        leitura_colunar.LEITURA_CONFIG['backend'] = args.backend
+    leitura_colunar.LEITURA_CONFIG['conexao_odbc'] = string_conexao()
+    snapshots_dimensoes.SNAPSHOT_CONFIG['leitura_habilitada'] = not (args.no_cache or args.refresh)
+    if args.paralelismo is not None:
+        PARALELISMO['conexoes'] = max(1, args.paralelismo)
+    if args.dias_particao is not None:
+        PARALELISMO['dias_particao'] = max(0, args.dias_particao)
+    STREAMING['vendas'] = args.vendas_em_blocos
+    NORMALIZACAO['vendas'] = args.vendas_normalizado
+    saida_particionada.PARTICIONADA_CONFIG['habilitado'] = args.particionado and not args.preview
+    # Vendas vindas do cache podem ter até CACHE_TTL['vendas']: o último dia fechado é o da consulta
+    idade_vendas = 0 if (args.no_cache or args.refresh) else CACHE_TTL['vendas']
+    CUBOS_CONFIG['ate'] = (datetime.now() - timedelta(seconds=idade_vendas)).date()
+    if args.csv:
+        escrita_csv.ESCRITA_CONFIG['modo'] = args.csv
+    if args.memoria_mb:
+        governador_memoria.MEMORIA_CONFIG['orcamento_bytes'] = args.memoria_mb * 1024 ** 2
+    historico_estoque.HISTORICO_CONFIG['habilitado'] = not args.sem_historico_estoque
+    replica_produtos.REPLICA_CONFIG['habilitado'] = not args.sem_copia_produtos
+    replica_produtos.REPLICA_CONFIG['atualizar'] = args.refresh
+    escrita_csv.ESCRITA_CONFIG['compressao'] = args.compressao
+    if 'zst' in args.compressao and not escrita_csv.ZSTD_DISPONIVEL:
+        print("⚠ Pacote zstandard não instalado; .csv.zst não será gerado")
+    if args.preview:
+        amostragem.configurar(linhas=args.preview_linhas, dias=args.preview_dias)
+        # Amostra pequena: sem partições paralelas nem blocos, e nada de histórico/base local
+        PARALELISMO['conexoes'] = 1
+        for nome in STREAMING:
+            STREAMING[nome] = False
+        historico_estoque.HISTORICO_CONFIG['habilitado'] = False
+        base_vendas_local.BASE_VENDAS_CONFIG['habilitado'] = False
+    
     t_total = time.time()
     print("="*60)
     print("EXPORTADOR DE RELATÓRIOS SCARFME v5.0")
     print("="*60)
+    if args.preview:
+        print(f"⚠ PREVIEW: amostra de até {amostragem.AMOSTRA_CONFIG['linhas']:,} linhas / "
+              f"últimos {amostragem.AMOSTRA_CONFIG['dias']} dias, saída em data/preview (sem cópias)")
+    
+    # Seleção: relatórios passados como argumento, senão menu (ou todos, sem terminal)
+    todos_relatorios = ['produtos', 'estoque', 'vendas', 'ecommerce', 'entradas']
+    if args.relatorios:
+        selecionados = set(todos_relatorios) if 'todos' in args.relatorios else set(args.relatorios)
+    elif sys.stdin.isatty():
+        relatorio_escolhido = exibir_menu()
+        selecionados = set(todos_relatorios) if relatorio_escolhido == 'todos' else {relatorio_escolhido}
+    else:
+        selecionados = set(todos_relatorios)
     
-    # Menu de seleção
-    relatorio_escolhido = exibir_menu()
+    # Ordem fixa (respeita as dependências entre relatórios)
+    relatorios_processar = [r for r in todos_relatorios if r in selecionados]
     
-    if relatorio_escolhido == 'todos':
+    if len(relatorios_processar) == len(todos_relatorios):
         print("\n✓ Exportando TODOS os relatórios")
     else:
         nomes_relatorios = {
@@ -403,7 +1336,7 @@ def main():
             'ecommerce': 'E-commerce',
             'entradas': 'Entradas'
         }
-        print(f"\n✓ Exportando apenas: {nomes_relatorios.get(relatorio_escolhido, relatorio_escolhido)}")
+        print(f"\n✓ Exportando apenas: {', '.join(nomes_relatorios[r] for r in relatorios_processar)}")
     
     # Definir dependências de cada relatório
     dependencias = {
@@ -411,14 +1344,12 @@ def main():
         'estoque': ['produtos', 'produtos_barra'],
         'vendas': ['produtos_barra'],
         'ecommerce': [],
-        'entradas': ['produtos', 'cores']
+        'entradas': ['produtos', 'produtos_barra', 'cores']
     }
     
-    # Determinar quais relatórios processar
-    if relatorio_escolhido == 'todos':
-        relatorios_processar = ['produtos', 'estoque', 'vendas', 'ecommerce', 'entradas']
-    else:
-        relatorios_processar = [relatorio_escolhido]
+    # Vendas normalizadas: linhas sem cabeçalho + query de cabeçalhos por ticket
+    if NORMALIZACAO['vendas']:
+        dependencias['vendas'] = dependencias['vendas'] + ['vendas_tickets']
     
     # Determinar quais queries são necessárias
     queries_necessarias = set()
@@ -427,156 +1358,89 @@ def main():
         if relatorio in dependencias:
             queries_necessarias.update(dependencias[relatorio])
     
-    # Queries otimizadas
-    queries = {
-        'produtos': "SELECT * FROM PRODUTOS",
-        'estoque': "SELECT * FROM ESTOQUE_PRODUTOS",
-        'produtos_barra': "SELECT PRODUTO, COR_PRODUTO, TAMANHO, CODIGO_BARRA FROM PRODUTOS_BARRA",
-        'vendas': """
-            SELECT vp.FILIAL, vp.DATA_VENDA, vp.PRODUTO, vp.DESC_PRODUTO,
-                   vp.COR_PRODUTO, vp.DESC_COR_PRODUTO, vp.TAMANHO, p.GRADE, 
-                   vp.PEDIDO, vp.TICKET, vp.CODIGO_FILIAL, vp.QTDE, vp.QTDE_CANCELADA, 
-                   vp.PRECO_LIQUIDO, vp.DESCONTO_ITEM, vp.DESCONTO_VENDA, 
-                   vp.FATOR_VENDA_LIQ, vp.CUSTO, vp.GRUPO_PRODUTO, 
-                   vp.SUBGRUPO_PRODUTO, vp.LINHA, vp.COLECAO, vp.GRIFFE, 
-                   vp.VENDEDOR, v.VALOR_TIKET, v.DESCONTO, v.VALOR_VENDA_BRUTA, 
-                   v.CODIGO_TAB_PRECO, v.CODIGO_DESCONTO, v.OPERACAO_VENDA, 
-                   v.DATA_HORA_CANCELAMENTO, v.VENDEDOR_APELIDO,
-                   ISNULL(troca_item.QTDE_TROCA, 0) AS QTDE_TROCA_ITEM,
-                   ISNULL(troca_item.VALOR_TROCA, 0) AS VALOR_TROCA_ITEM,
-                   ISNULL(troca_ticket.QTDE_TROCA_TICKET, 0) AS QTDE_TROCA_TICKET,
-                   ISNULL(troca_ticket.VALOR_TROCA_TICKET, 0) AS VALOR_TROCA_TICKET
-    FROM W_CTB_LOJA_VENDA_PEDIDO_PRODUTO vp WITH (NOLOCK)
-    LEFT JOIN W_CTB_LOJA_VENDA_PEDIDO v WITH (NOLOCK)
-        ON v.FILIAL = vp.FILIAL AND v.PEDIDO = vp.PEDIDO AND v.TICKET = vp.TICKET
-    LEFT JOIN PRODUTOS p WITH (NOLOCK) ON p.PRODUTO = vp.PRODUTO
-    LEFT JOIN (
-        SELECT 
-            TICKET,
-            CODIGO_FILIAL,
-            PRODUTO,
-            COR_PRODUTO,
-            TAMANHO,
-            SUM(QTDE) AS QTDE_TROCA,
-            SUM((PRECO_LIQUIDO * QTDE) - ISNULL(DESCONTO_ITEM, 0)) AS VALOR_TROCA
-        FROM LOJA_VENDA_TROCA WITH (NOLOCK)
-        WHERE QTDE_CANCELADA = 0
-        GROUP BY TICKET, CODIGO_FILIAL, PRODUTO, COR_PRODUTO, TAMANHO
-    ) troca_item ON troca_item.TICKET = vp.TICKET 
-        AND troca_item.CODIGO_FILIAL = vp.CODIGO_FILIAL
-        AND troca_item.PRODUTO = vp.PRODUTO
-        AND ISNULL(troca_item.COR_PRODUTO, '') = ISNULL(vp.COR_PRODUTO, '')
-        AND ISNULL(troca_item.TAMANHO, 0) = ISNULL(vp.TAMANHO, 0)
-    LEFT JOIN (
-        SELECT 
-            TICKET,
-            CODIGO_FILIAL,
-            SUM(QTDE) AS QTDE_TROCA_TICKET,
-            SUM((PRECO_LIQUIDO * QTDE) - ISNULL(DESCONTO_ITEM, 0)) AS VALOR_TROCA_TICKET
-        FROM LOJA_VENDA_TROCA WITH (NOLOCK)
-        WHERE QTDE_CANCELADA = 0
-        GROUP BY TICKET, CODIGO_FILIAL
-    ) troca_ticket ON troca_ticket.TICKET = vp.TICKET 
-        AND troca_ticket.CODIGO_FILIAL = vp.CODIGO_FILIAL
-    WHERE vp.DATA_VENDA >= '2024-01-01'
-        """,
-        'ecommerce': """
-            SELECT f.NF_SAIDA, f.SERIE_NF, f.FILIAL, f.NOME_CLIFOR, fp.PRODUTO,
-                   fp.COR_PRODUTO, f.MOEDA, f.CAMBIO_NA_DATA, fp.ITEM, fp.ENTREGA,
-                   fp.PEDIDO_COR, fp.PEDIDO, fp.CAIXA, fp.ROMANEIO, fp.PACKS,
-                   fp.CUSTO_NA_DATA, fp.QTDE, fp.PRECO, fp.MPADRAO_PRECO,
-                   fp.DESCONTO_ITEM, fp.MPADRAO_DESCONTO_ITEM, fp.VALOR,
-                   fp.MPADRAO_VALOR, fp.VALOR_PRODUCAO, fp.MPADRAO_VALOR_PRODUCAO,
-                   fp.DIF_PRODUCAO, fp.MPADRAO_DIF_PRODUCAO, fp.VALOR_LIQUIDO,
-                   fp.MPADRAO_VALOR_LIQUIDO, fp.DIF_PRODUCAO_LIQUIDO,
-        fp.MPADRAO_DIF_PRODUCAO_LIQUIDO,
-        fp.F1, fp.F2, fp.F3, fp.F4, fp.F5, fp.F6, fp.F7, fp.F8, fp.F9, fp.F10,
-        fp.F11, fp.F12, fp.F13, fp.F14, fp.F15, fp.F16, fp.F17, fp.F18, fp.F19, fp.F20,
-        fp.F21, fp.F22, fp.F23, fp.F24, fp.F25, fp.F26, fp.F27, fp.F28, fp.F29, fp.F30,
-        fp.F31, fp.F32, fp.F33, fp.F34, fp.F35, fp.F36, fp.F37, fp.F38, fp.F39, fp.F40,
-        fp.F41, fp.F42, fp.F43, fp.F44, fp.F45, fp.F46, fp.F47, fp.F48,
-                   f.EMISSAO, f.CONDICAO_PGTO, f.NATUREZA_SAIDA, f.GERENTE,
-                   f.REPRESENTANTE, f.DATA_SAIDA, f.TRANSPORTADORA,
-                   f.TRANSP_REDESPACHO, f.EMPRESA, f.TIPO_FATURAMENTO,
-                   p.DESC_PRODUTO, p.COLECAO, p.TABELA_OPERACOES, p.TABELA_MEDIDAS,
-                   p.TIPO_PRODUTO, p.GRUPO_PRODUTO, p.SUBGRUPO_PRODUTO, p.LINHA,
-                   p.GRADE, p.GRIFFE, p.CARTELA, p.REVENDA, p.MODELAGEM, p.FABRICANTE,
-                   p.ESTILISTA, p.MODELISTA, fp.DESC_COLECAO, fl.REGIAO, cv.UF
-    FROM FATURAMENTO f WITH(NOLOCK)
-    JOIN W_FATURAMENTO_PROD_02 fp WITH(NOLOCK) 
-        ON f.FILIAL = fp.FILIAL AND f.NF_SAIDA = fp.NF_SAIDA AND f.SERIE_NF = fp.SERIE_NF
-            LEFT JOIN PRODUTOS p WITH(NOLOCK) ON fp.PRODUTO = p.PRODUTO
-            LEFT JOIN FILIAIS fl WITH(NOLOCK) ON f.FILIAL = fl.FILIAL
-            LEFT JOIN CLIENTES_VAREJO cv WITH(NOLOCK) ON f.NOME_CLIFOR = cv.CLIENTE_VAREJO
-            WHERE f.EMISSAO >= '2024-01-01' AND f.NOTA_CANCELADA = 0
-      AND f.NATUREZA_SAIDA IN ('100.02', '100.022')
-        """,
-        'entradas': """
-            SELECT E.ROMANEIO_PRODUTO, E.EMISSAO, E.FILIAL, P.PRODUTO,
-                   P.COR_PRODUTO, P.QTDE AS QTDE_TOTAL
-            FROM ESTOQUE_PROD_ENT AS E
-            LEFT JOIN ESTOQUE_PROD1_ENT AS P ON E.ROMANEIO_PRODUTO = P.ROMANEIO_PRODUTO
-        """,
-        'cores': "SELECT COR, DESC_COR FROM CORES_BASICAS"
-    }
+    queries = dict(QUERIES, **QUERIES_NORMALIZADAS) if NORMALIZACAO['vendas'] else QUERIES
     
-    conn = None
-    try:
-        conn = conectar_banco()
-        print("\n[EXTRAÇÃO]")
-        t_ext = time.time()
-        
-        # Extrai apenas os dados necessários
-        dfs = {}
-        for nome in queries_necessarias:
-            if nome in queries:
-                dfs[nome] = pd.read_sql(queries[nome], conn)
-                print(f"✓ {nome}: {len(dfs[nome]):,}")
-        
-        print(f"Extração: {time.time()-t_ext:.2f}s")
-
-    finally:
-        if conn:
-            conn.close()
+    # Pipeline: extração em segundo plano, cada relatório é processado assim que
+    # suas queries chegam, e as cópias rodam em paralelo com o próximo relatório
+    ordem = ordem_extracao(relatorios_processar, dependencias, queries_necessarias, queries)
+    
+    # Pré-verificação (--preflight): modo de execução por query conforme o orçamento de memória
+    modos = preflight_memoria(ordem, queries) if args.preflight and not args.preview else {}
+    for nome, modo in modos.items():
+        if modo == 'blocos':
+            STREAMING[nome] = True
+    
+    # Checkpoints (--checkpoint/--resume): peças extraídas ficam em disco até o fim
+    # da execução. O modo em blocos guarda as partições no checkpoint, então também
+    # abre um. Preview não grava nem descarta checkpoints.
+    blocos = any(STREAMING.get(nome) for nome in ordem)
+    if (args.checkpoint or args.resume or blocos) and not args.preview:
+        reaproveitadas = checkpoints_extracao.iniciar_execucao(
+            'relatorios', retomar=args.resume,
+            parametros={'relatorios': sorted(relatorios_processar)}
+        )
+        if args.resume:
+            print(f"✓ Retomando extração: {reaproveitadas} partes já concluídas")
     
-    # Processamento
-    print("\n[PROCESSAMENTO]")
+    print("\n[EXTRAÇÃO + PROCESSAMENTO]")
     t_proc = time.time()
+    dfs, prontos, erros, thread_extracao = extrair_em_segundo_plano(queries, ordem)
     
     # Variáveis para armazenar dados processados que podem ser reutilizados
     df_produtos = None
     
-    # Processar relatórios na ordem correta (respeitando dependências)
-    # Produtos: salvar apenas se estiver na lista de processar
-    if 'produtos' in relatorios_processar:
-        df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=True)
-    elif 'produtos' in queries_necessarias:
-        # Processar em memória sem salvar (é dependência de outro relatório)
-        df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=False)
-    
-    if 'estoque' in relatorios_processar:
-        if df_produtos is None:
-            # Se produtos não foi processado mas é necessário, processar agora (sem salvar)
-            df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=False)
-        processar_estoque(dfs['estoque'], df_produtos, dfs['produtos_barra'])
-    
-    if 'vendas' in relatorios_processar:
-        processar_vendas(dfs['vendas'], dfs['produtos_barra'])
-    
-    if 'ecommerce' in relatorios_processar:
-        processar_ecommerce(dfs['ecommerce'])
-    
-    if 'entradas' in relatorios_processar:
-        if df_produtos is None:
-            # Se produtos não foi processado mas é necessário, processar agora (sem salvar)
-            df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=False)
-        processar_entradas(dfs['entradas'], df_produtos, dfs['cores'])
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='copia') as executor_copia:
+        copias = []
+        for i, relatorio in enumerate(relatorios_processar):
+            aguardar_dados([relatorio] + dependencias.get(relatorio, []), prontos, erros)
+            
+            # Processar relatórios na ordem correta (respeitando dependências)
+            # Produtos: salvar apenas se estiver na lista de processar
+            if relatorio == 'produtos':
+                df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=True)
+            
+            elif relatorio == 'estoque':
+                if df_produtos is None:
+                    # Processar em memória sem salvar (é dependência de outro relatório)
+                    df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=False)
+                processar_estoque(dfs['estoque'], df_produtos, dfs['produtos_barra'])
+            
+            elif relatorio == 'vendas':
+                processar_vendas(dfs['vendas'], dfs['produtos_barra'],
+                                 gerar_cubos=not (args.sem_cubos or args.preview),
+                                 df_tickets=dfs['vendas_tickets'] if NORMALIZACAO['vendas'] else None)
+            
+            elif relatorio == 'ecommerce':
+                processar_ecommerce(dfs['ecommerce'])
+            
+            elif relatorio == 'entradas':
+                if df_produtos is None:
+                    # Processar em memória sem salvar (é dependência de outro relatório)
+                    df_produtos = processar_produtos(dfs['produtos'], dfs['produtos_barra'], salvar=False)
+                processar_entradas(dfs['entradas'], df_produtos, dfs['cores'])
+            
+            # Cópia deste relatório enquanto o próximo é extraído/processado
+            if not args.preview:
+                copias.append(executor_copia.submit(copiar_arquivos, [relatorio]))
+            
+            # Liberar dados brutos que nenhum relatório restante usa
+            restantes = set()
+            for proximo in relatorios_processar[i + 1:]:
+                restantes.add(proximo)
+                restantes.update(dependencias.get(proximo, []))
+            for nome in [n for n in list(dfs) if n not in restantes and prontos[n].is_set()]:
+                del dfs[nome]
+        
+        for copia in copias:
+            copia.result()
     
+    thread_extracao.join()
+    checkpoints_extracao.concluir_execucao()
+    if args.preview:
+        amostragem.gravar_metadados(os.path.join(diretorio_dados(), '_preview.json'))
+        print("✓ Estratégias de amostragem em data/preview/_preview.json")
     print(f"\nProcessamento: {time.time()-t_proc:.2f}s")
     
-    # Cópia
-    copiar_arquivos(relatorios_processar if relatorio_escolhido != 'todos' else None)
-    
     print("\n" + "="*60)
     print(f"CONCLUÍDO! Tempo total: {time.time()-t_total:.2f}s")
     print("="*60)
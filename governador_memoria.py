@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pré-verificação de memória das exportações
+Estima o tamanho de cada query (linhas x largura média) antes de extrair e escolhe
+o modo de execução que cabe no orçamento: memoria ou blocos
+"""
+
+import os
+import sys
+
+try:
+    import psutil
+    PSUTIL_DISPONIVEL = True
+except ImportError:
+    PSUTIL_DISPONIVEL = False
+
+MEMORIA_CONFIG = {
+    'orcamento_bytes': None,     # None = fracao_ram da memória livre
+    'fracao_ram': 0.6,
+    'fator_processamento': 3.0,  # cópias/merges do processamento sobre o DataFrame bruto
+}
+
+def memoria_disponivel():
+    """Memória física disponível em bytes (None se não for possível medir)"""
+    if PSUTIL_DISPONIVEL:
+        return psutil.virtual_memory().available
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+    # Linux: MemAvailable conta o cache de páginas que o kernel pode liberar
+    # (SC_AVPHYS_PAGES é só a memória livre e subestima o que cabe)
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for linha in f:
+                if linha.startswith('MemAvailable:'):
+                    return int(linha.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def orcamento():
+    """Orçamento de memória em bytes (configurado ou fração da memória livre)"""
+    if MEMORIA_CONFIG['orcamento_bytes']:
+        return MEMORIA_CONFIG['orcamento_bytes']
+    livre = memoria_disponivel()
+    return int(livre * MEMORIA_CONFIG['fracao_ram']) if livre else None
+
+def largura_estimada(descricao):
+    """
+    Bytes por linha no DataFrame a partir do cursor.description:
+    numéricos/datas ocupam 8 bytes; texto vira objeto str do Python
+    (ponteiro + ~49 bytes de cabeçalho + metade do tamanho declarado, até 100)
+    """
+    largura = 0
+    for coluna in descricao:
+        tipo, tamanho = coluna[1], coluna[3]
+        if tipo is str:
+            largura += 8 + 49 + min(tamanho or 100, 100) // 2
+        elif tipo in (bytes, bytearray):
+            largura += 8 + 33 + min(tamanho or 16, 100)
+        else:
+            largura += 8
+    return largura
+
+def contar_linhas(conn, contagem=None, tabela=None, query=None):
+    """
+    Número de linhas: estatísticas do servidor para tabelas inteiras
+    (sys.dm_db_partition_stats, sem varrer a tabela), senão COUNT_BIG.
+    """
+    cursor = conn.cursor()
+    try:
+        if tabela:
+            try:
+                cursor.execute(
+                    "SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+                    "WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)", (tabela,))
+                linhas = cursor.fetchone()[0]
+                if linhas is not None:
+                    return int(linhas)
+            except Exception:
+                # Sem permissão VIEW DATABASE STATE: conta direto
+                pass
+            contagem = contagem or f"SELECT COUNT_BIG(*) FROM {tabela} WITH (NOLOCK)"
+        cursor.execute(contagem or f"SELECT COUNT_BIG(*) FROM ({query}) AS q")
+        return int(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+def estimar(nome, query, conn, contagem=None, tabela=None):
+    """Estimativa de uma query: linhas, bytes/linha e bytes do DataFrame bruto"""
+    cursor = conn.cursor()
+    try:
+        # TOP 0: só metadados das colunas, sem trazer linhas
+        cursor.execute(f"SELECT TOP 0 * FROM ({query}) AS q")
+        largura = largura_estimada(cursor.description)
+    finally:
+        cursor.close()
+    linhas = contar_linhas(conn, contagem=contagem, tabela=tabela, query=query)
+    return {'nome': nome, 'linhas': linhas, 'largura': largura, 'bytes': linhas * largura}
+
+def planejar(estimativas, blocos_possiveis=None, limite=None):
+    """
+    Escolhe o modo de cada query para o pico estimado caber no limite:
+    - memoria: como hoje (tudo extraído em paralelo com o processamento);
+    - blocos:  processamento partição a partição (blocos_possiveis: nome -> nº de partições).
+    Não há modo em disco: queries sem motor em blocos ficam em memória mesmo acima
+    do orçamento (com aviso). As maiores são rebaixadas primeiro. Retorna {nome: modo}.
+    """
+    blocos_possiveis = blocos_possiveis or {}
+    fator = MEMORIA_CONFIG['fator_processamento']
+    limite = limite if limite is not None else orcamento()
+    modos = {e['nome']: 'memoria' for e in estimativas}
+    if limite is None:
+        print("⚠ Memória livre desconhecida; mantendo execução em memória")
+        return modos
+
+    def pico():
+        em_memoria = sum(e['bytes'] * fator for e in estimativas if modos[e['nome']] == 'memoria')
+        em_blocos = sum(e['bytes'] * fator / max(blocos_possiveis.get(e['nome'], 1), 1)
+                        for e in estimativas if modos[e['nome']] == 'blocos')
+        return em_memoria + em_blocos
+
+    for estimativa in sorted(estimativas, key=lambda e: -e['bytes']):
+        atual = pico()
+        if atual <= limite:
+            break
+        nome = estimativa['nome']
+        if nome not in blocos_possiveis:
+            continue
+        modos[nome] = 'blocos'
+        if pico() >= atual:
+            modos[nome] = 'memoria'
+
+    mb = 1024 ** 2
+    print(f"Orçamento de memória: {limite / mb:,.0f} MB | pico estimado: {pico() / mb:,.0f} MB")
+    for e in estimativas:
+        print(f"  {e['nome']:<15} {e['linhas']:>12,} linhas x {e['largura']:>4} B "
+              f"= {e['bytes'] / mb:>9,.0f} MB -> {modos[e['nome']]}")
+    if pico() > limite:
+        print("⚠ Nenhum modo faz a estimativa caber no orçamento; a execução pode falhar por falta de memória")
+    return modos
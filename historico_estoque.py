@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshot chaveado do estoque tratado (PRODUTO + COR_PRODUTO + FILIAL)
+A cada execução gera o delta (linhas inseridas/alteradas/removidas) em relação
+ao snapshot anterior e acrescenta ao histórico só as posições que mudaram
+"""
+
+import os
+import json
+import glob
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+HISTORICO_CONFIG = {
+    'habilitado': True,
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'estoque_historico'),
+}
+
+CHAVE_ESTOQUE = ['PRODUTO', 'COR_PRODUTO', 'FILIAL']
+
+# Colunas guardadas no histórico de posições (uma linha por chave só quando mudam)
+COLUNAS_HISTORICO = ['ESTOQUE']
+
+ARQUIVO_ESTADO = 'estado.json'
+
+def _caminho(*partes):
+    return os.path.join(HISTORICO_CONFIG['diretorio'], *partes)
+
+def _gravar(df, caminho_sem_ext):
+    """Parquet se possível, senão pickle; retorna o nome do arquivo gravado"""
+    if PARQUET_DISPONIVEL:
+        try:
+            df.to_parquet(caminho_sem_ext + '.parquet', index=False)
+            return os.path.basename(caminho_sem_ext) + '.parquet'
+        except Exception:
+            pass
+    df.to_pickle(caminho_sem_ext + '.pkl')
+    return os.path.basename(caminho_sem_ext) + '.pkl'
+
+def _ler(caminho):
+    if caminho.endswith('.parquet'):
+        return pd.read_parquet(caminho)
+    return pd.read_pickle(caminho)
+
+def ler_estado():
+    """Estado do último snapshot (None se ainda não houver)"""
+    try:
+        with open(_caminho(ARQUIVO_ESTADO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def hash_linhas(df):
+    """Hash por linha de todas as colunas (detecta qualquer alteração)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def atualizar_historico(df, data_posicao=None):
+    """
+    Compara df (estoque tratado) com o snapshot anterior e grava:
+    - o novo snapshot (chave + HASH_LINHA, usado na próxima comparação)
+    - uma parte nova do histórico com as posições que mudaram (append-only)
+    Retorna (delta, resumo): delta tem OPERACAO I/U/D + colunas do relatório
+    (linhas D só com a chave). Sem snapshot anterior, tudo entra como I.
+    """
+    data_posicao = data_posicao or datetime.now().replace(microsecond=0)
+    versao = data_posicao.strftime('%Y%m%d_%H%M%S')
+    os.makedirs(_caminho('posicoes'), exist_ok=True)
+
+    duplicadas = df.duplicated(subset=CHAVE_ESTOQUE, keep='last')
+    if duplicadas.any():
+        print(f"⚠ Estoque com {int(duplicadas.sum()):,} chaves repetidas; mantida a última ocorrência")
+        df = df[~duplicadas]
+
+    atual = df[CHAVE_ESTOQUE].copy()
+    atual['HASH_LINHA'] = hash_linhas(df)
+    colunas_historico = [c for c in COLUNAS_HISTORICO if c in df.columns]
+    for col in colunas_historico:
+        atual[col] = df[col].to_numpy()
+
+    estado = ler_estado()
+    anterior = None
+    if estado is not None:
+        try:
+            anterior = _ler(_caminho(estado['arquivo']))
+        except (OSError, ValueError):
+            print("⚠ Snapshot anterior do estoque ilegível; gerando delta completo")
+    if anterior is None:
+        anterior = atual.iloc[:0]
+    elif estado.get('colunas') != list(df.columns):
+        print("⚠ Colunas do estoque mudaram desde o último snapshot; todas as linhas entram no delta")
+        anterior = anterior.assign(HASH_LINHA=0)
+
+    comparacao = atual.merge(anterior, on=CHAVE_ESTOQUE, how='outer',
+                             suffixes=('', '_ANTERIOR'), indicator=True)
+    novas = comparacao['_merge'] == 'left_only'
+    removidas = comparacao['_merge'] == 'right_only'
+    alteradas = (comparacao['_merge'] == 'both') & (comparacao['HASH_LINHA'] != comparacao['HASH_LINHA_ANTERIOR'])
+
+    # Delta com as colunas completas do relatório para I/U e só a chave para D
+    mudou = comparacao.loc[novas | alteradas, CHAVE_ESTOQUE].assign(
+        OPERACAO=np.where(novas[novas | alteradas], 'I', 'U'))
+    delta = mudou.merge(df, on=CHAVE_ESTOQUE, how='left')
+    removido = comparacao.loc[removidas, CHAVE_ESTOQUE].assign(OPERACAO='D')
+    delta = pd.concat([delta, removido], ignore_index=True)
+    delta = delta[['OPERACAO'] + [c for c in delta.columns if c != 'OPERACAO']]
+
+    # Histórico: só posições que mudaram (removida = posição vazia)
+    if colunas_historico:
+        posicao_mudou = novas | removidas
+        for col in colunas_historico:
+            antes, depois = comparacao[f'{col}_ANTERIOR'], comparacao[col]
+            posicao_mudou |= (antes != depois) & ~(antes.isna() & depois.isna())
+        posicoes = comparacao.loc[posicao_mudou, CHAVE_ESTOQUE + colunas_historico].copy()
+        posicoes.insert(0, 'DATA_POSICAO', pd.Timestamp(data_posicao))
+        if not posicoes.empty:
+            _gravar(posicoes.reset_index(drop=True), _caminho('posicoes', f'posicoes_{versao}'))
+    else:
+        posicoes = []
+
+    arquivo = _gravar(atual, _caminho(f'snapshot_{versao}'))
+    novo_estado = {
+        'versao': versao,
+        'versao_anterior': estado['versao'] if estado else None,
+        'arquivo': arquivo,
+        'registros': len(atual),
+        'colunas': list(df.columns),
+    }
+    tmp = _caminho(ARQUIVO_ESTADO + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(novo_estado, f, indent=1)
+    os.replace(tmp, _caminho(ARQUIVO_ESTADO))
+    if estado and estado['arquivo'] != arquivo:
+        try:
+            os.remove(_caminho(estado['arquivo']))
+        except OSError:
+            pass
+
+    resumo = {
+        'versao': versao,
+        'versao_anterior': novo_estado['versao_anterior'],
+        'inseridas': int(novas.sum()),
+        'alteradas': int(alteradas.sum()),
+        'removidas': int(removidas.sum()),
+        'posicoes_historico': len(posicoes),
+    }
+    return delta, resumo
+
+def ler_historico(produto=None, cor=None, filial=None):
+    """Histórico de posições (DATA_POSICAO + chave + COLUNAS_HISTORICO), opcionalmente filtrado"""
+    partes = sorted(glob.glob(_caminho('posicoes', 'posicoes_*')))
+    if not partes:
+        return pd.DataFrame(columns=['DATA_POSICAO'] + CHAVE_ESTOQUE + COLUNAS_HISTORICO)
+    historico = pd.concat([_ler(p) for p in partes], ignore_index=True)
+    for col, valor in zip(CHAVE_ESTOQUE, [produto, cor, filial]):
+        if valor is not None:
+            historico = historico[historico[col] == valor]
+    return historico.sort_values(['DATA_POSICAO'] + CHAVE_ESTOQUE, kind='stable').reset_index(drop=True)
+
+def posicao_em(data, **filtros):
+    """Posição de estoque em uma data: último registro de cada chave até a data (removidas ficam de fora)"""
+    historico = ler_historico(**filtros)
+    historico = historico[historico['DATA_POSICAO'] <= pd.Timestamp(data)]
+    posicao = historico.drop_duplicates(subset=CHAVE_ESTOQUE, keep='last')
+    return posicao.dropna(subset=[c for c in COLUNAS_HISTORICO if c in posicao.columns], how='all').reset_index(drop=True)
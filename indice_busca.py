@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice local de busca por n-gramas para clientes e vendedores
+Construído a partir da saída de fetch_clientes (exportar_clientes.py)
+"""
+
+import os
+import re
+import pickle
+import unicodedata
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+TAMANHO_NGRAMA = 3
+VERSAO_INDICE = 1
+
+# Campos indexados: (coluna de fetch_clientes, apenas dígitos?)
+CAMPOS_INDICE = [
+    ('nomeCliente', False),
+    ('cpf', True),
+    ('telefone', True),
+    ('email', False),
+    ('vendedor', False),
+]
+
+SEPARADOR_CAMPOS = '\x1f'
+
+def caminho_indice_padrao() -> str:
+    """Caminho padrão do índice (pasta data ao lado do script)"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, 'data', 'indice_busca_clientes.pkl')
+
+def normalizar_texto(texto) -> str:
+    """Remove acentos, converte para minúsculas e colapsa espaços"""
+    if texto is None:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+def normalizar_digitos(texto) -> str:
+    """Mantém apenas dígitos (CPF, telefone)"""
+    if texto is None:
+        return ''
+    return re.sub(r'\D', '', str(texto))
+
+def gerar_ngramas(texto: str, n: int = TAMANHO_NGRAMA) -> set:
+    """Gera o conjunto de n-gramas de um texto já normalizado"""
+    if len(texto) < n:
+        return {texto} if texto else set()
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+def _texto_documento(registro: Dict[str, Any]) -> str:
+    """Concatena os campos normalizados de um cliente em um único texto pesquisável"""
+    partes = []
+    for campo, apenas_digitos in CAMPOS_INDICE:
+        valor = registro.get(campo)
+        partes.append(normalizar_digitos(valor) if apenas_digitos else normalizar_texto(valor))
+    return SEPARADOR_CAMPOS.join(partes)
+
+def construir_indice(
+    clientes_df,
+    periodo: Optional[tuple] = None,
+    escopo: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Constrói o índice a partir do DataFrame retornado por fetch_clientes.
+    Cada cliente (nomeCliente) vira um documento com nome, CPF, telefone,
+    e-mail e vendedor; periodo=(inicio, fim) e escopo (company/filial)
+    registram a cobertura do índice.
+    """
+    colunas = [c for c, _ in CAMPOS_INDICE] + ['filial']
+    colunas = [c for c in colunas if c in clientes_df.columns]
+    registros = (
+        clientes_df[colunas]
+        .drop_duplicates(subset=['nomeCliente'], keep='last')
+        .to_dict('records')
+    )
+
+    textos = []
+    postings: Dict[str, array] = {}
+    for doc_id, registro in enumerate(registros):
+        texto = _texto_documento(registro)
+        textos.append(texto)
+        for ngrama in gerar_ngramas(texto):
+            lista = postings.get(ngrama)
+            if lista is None:
+                lista = postings[ngrama] = array('I')
+            lista.append(doc_id)
+
+    return {
+        'versao': VERSAO_INDICE,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'periodo': periodo,
+        'escopo': escopo or {},
+        'docs': registros,
+        'textos': textos,
+        'postings': postings,
+    }
+
+def salvar_indice(indice: Dict[str, Any], caminho: Optional[str] = None) -> str:
+    """Persiste o índice em disco"""
+    caminho = caminho or caminho_indice_padrao()
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = caminho + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(indice, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, caminho)
+    return caminho
+
+def carregar_indice(caminho: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Carrega o índice do disco (None se não existir ou for de outra versão)"""
+    caminho = caminho or caminho_indice_padrao()
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'rb') as f:
+        indice = pickle.load(f)
+    if indice.get('versao') != VERSAO_INDICE:
+        return None
+    return indice
+
+def indice_cobre(indice: Dict[str, Any], start_date, end_date, company=None, filial=None) -> bool:
+    """Verifica se período e filtros pedidos estão contidos no que foi usado para construir o índice"""
+    periodo = indice.get('periodo')
+    if not periodo:
+        return False
+    inicio, fim = periodo
+    if not (inicio <= start_date and end_date <= fim):
+        return False
+    escopo = indice.get('escopo', {})
+    if escopo.get('company') and escopo['company'] != company:
+        return False
+    if escopo.get('filial') and escopo['filial'] != filial:
+        return False
+    return True
+
+def _termos_busca(termo: str) -> List[str]:
+    """Versões normalizadas do termo (texto e, se houver, apenas dígitos)"""
+    termos = [normalizar_texto(termo)]
+    digitos = normalizar_digitos(termo)
+    if len(digitos) >= 2 and digitos != termos[0]:
+        termos.append(digitos)
+    return [t for t in termos if t]
+
+def _candidatos_exatos(indice: Dict[str, Any], termo: str) -> set:
+    """Interseção das listas de n-gramas do termo, começando pela mais rara"""
+    ngramas = gerar_ngramas(termo)
+    if len(termo) < TAMANHO_NGRAMA:
+        # Termo curto: varre os textos diretamente
+        return {i for i, texto in enumerate(indice['textos']) if termo in texto}
+
+    postings = indice['postings']
+    listas = sorted((postings.get(g, ()) for g in ngramas), key=len)
+    if not listas or not listas[0]:
+        return set()
+    candidatos = set(listas[0])
+    for lista in listas[1:]:
+        candidatos.intersection_update(lista)
+        if not candidatos:
+            break
+    return candidatos
+
+def buscar(
+    indice: Dict[str, Any],
+    termo: str,
+    fuzzy: bool = False,
+    limiar: float = 0.5,
+    limite: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Busca clientes cujo nome, CPF, telefone, e-mail ou vendedor contenham o termo
+    (sem diferenciar acentos/maiúsculas). Com fuzzy=True, aceita também documentos
+    que compartilhem ao menos `limiar` dos n-gramas do termo, ordenados por score.
+    """
+    textos = indice['textos']
+    encontrados: Dict[int, float] = {}
+
+    for t in _termos_busca(termo):
+        # Substring exata (verificada sobre os candidatos do índice)
+        for doc_id in _candidatos_exatos(indice, t):
+            if t in textos[doc_id]:
+                encontrados[doc_id] = 1.0
+
+        if fuzzy and len(t) >= TAMANHO_NGRAMA:
+            ngramas = gerar_ngramas(t)
+            contagem = Counter()
+            for g in ngramas:
+                contagem.update(indice['postings'].get(g, ()))
+            minimo = limiar * len(ngramas)
+            for doc_id, hits in contagem.items():
+                if hits >= minimo and doc_id not in encontrados:
+                    encontrados[doc_id] = hits / len(ngramas)
+
+    ordenados = sorted(encontrados.items(), key=lambda x: (-x[1], x[0]))
+    if limite:
+        ordenados = ordenados[:limite]
+    return [dict(indice['docs'][doc_id], score=score) for doc_id, score in ordenados]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backends de leitura de consultas SQL para DataFrame
+- pandas:  pd.read_sql (caminho original, linha a linha + inferência de tipos)
+- colunar: fetchmany em lotes grandes direto para buffers tipados por coluna
+           (Arrow se disponível, senão NumPy) usando os tipos declarados no cursor
+- arrow:   driver ODBC com saída Arrow nativa (pacote arrow-odbc): os lotes chegam
+           como RecordBatch, sem objetos Python por valor (opcional: --backend arrow)
+"""
+
+import time
+import decimal
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    ARROW_DISPONIVEL = True
+except ImportError:
+    ARROW_DISPONIVEL = False
+
+try:
+    from arrow_odbc import read_arrow_batches_from_odbc
+    ARROW_ODBC_DISPONIVEL = True
+except ImportError:
+    ARROW_ODBC_DISPONIVEL = False
+
+LEITURA_CONFIG = {
+    'backend': 'colunar',
+    'tamanho_lote': 50000,
+    'conexao_odbc': None,  # string de conexão do backend arrow (definida pelos scripts)
+}
+
+def ler_sql_pandas(query, conn, params=None):
+    """Caminho original: pd.read_sql"""
+    return pd.read_sql(query, conn, params=params)
+
+def _tipo_arrow(tipo_python):
+    """Tipo Arrow para o type_code do cursor (classe Python no pyodbc)"""
+    if tipo_python is bool:
+        return pa.bool_()
+    if tipo_python is int:
+        return pa.int64()
+    if tipo_python in (float, decimal.Decimal):
+        # Mesma conversão do pd.read_sql (coerce_float=True)
+        return pa.float64()
+    if tipo_python is dt.datetime:
+        return pa.timestamp('us')
+    if tipo_python is dt.date:
+        return pa.date32()
+    if tipo_python in (bytes, bytearray):
+        return pa.binary()
+    if tipo_python is str:
+        return pa.string()
+    return None  # deixa o Arrow inferir
+
+def _objetos(valores):
+    """Array object 1-D (np.array desceria em valores sequência, como bytearray)"""
+    array = np.empty(len(valores), dtype=object)
+    array[:] = valores
+    return array
+
+def _coluna_numpy(valores, tipo_python):
+    """Converte a lista de valores de uma coluna para um array NumPy tipado"""
+    if tipo_python is int:
+        try:
+            return np.array(valores, dtype=np.int64)
+        except (TypeError, ValueError):
+            return np.array(valores, dtype=np.float64)  # None -> NaN
+    if tipo_python in (float, decimal.Decimal):
+        return np.array(valores, dtype=np.float64)
+    if tipo_python is dt.datetime:
+        return np.array(valores, dtype='datetime64[us]')
+    return _objetos(valores)
+
+def _lote_arrow(valores, tipo_python, tipo):
+    """Array Arrow de uma coluna do lote"""
+    if tipo_python is decimal.Decimal:
+        # float() por valor, como o pd.read_sql: a importação de Decimal pelo Arrow
+        # (inferindo ou com decimal128) chega a ser dezenas de vezes mais lenta
+        valores = [None if v is None else float(v) for v in valores]
+    return pa.array(valores, type=tipo)
+
+def ler_sql_colunar(query, conn, params=None, tamanho_lote=None):
+    """
+    Executa a query e monta o DataFrame coluna a coluna a partir de lotes
+    de fetchmany, sem criar um DataFrame por linha nem inferir tipos.
+    """
+    tamanho_lote = tamanho_lote or LEITURA_CONFIG['tamanho_lote']
+    cursor = conn.cursor()
+    try:
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        descricao = cursor.description
+        nomes = [d[0] for d in descricao]
+        tipos = [d[1] for d in descricao]
+        tipos_arrow = [_tipo_arrow(t) if ARROW_DISPONIVEL else None for t in tipos]
+        # arrow: chunks Arrow tipados | numpy: arrays tipados | objeto: valores como vieram
+        modos = ['arrow' if t is not None else 'numpy' for t in tipos_arrow]
+
+        lotes = [[] for _ in nomes]
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            for i in range(len(nomes)):
+                # Transposição por coluna: com linhas do pyodbc é mais rápida que zip(*linhas)
+                # ou uma matriz object do NumPy (o driver Arrow evita essa etapa)
+                valores = [linha[i] for linha in linhas]
+                if modos[i] == 'arrow':
+                    try:
+                        lotes[i].append(_lote_arrow(valores, tipos[i], tipos_arrow[i]))
+                        continue
+                    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                        # Valor fora do tipo declarado: a coluna segue como objeto
+                        # (os lotes já lidos são convertidos; a query não é executada de novo)
+                        lotes[i] = [_objetos(lote.to_pylist()) for lote in lotes[i]]
+                        modos[i] = 'objeto'
+                if modos[i] == 'numpy':
+                    lotes[i].append(_coluna_numpy(valores, tipos[i]))
+                else:
+                    lotes[i].append(_objetos(valores))
+            del linhas
+    finally:
+        cursor.close()
+
+    dados = {}
+    for i, nome in enumerate(nomes):
+        if modos[i] == 'arrow':
+            coluna = pa.chunked_array(lotes[i], type=tipos_arrow[i])
+            dados[nome] = coluna.to_pandas(date_as_object=True, coerce_temporal_nanoseconds=True)
+        elif lotes[i]:
+            dados[nome] = np.concatenate(lotes[i])
+        else:
+            dados[nome] = _coluna_numpy([], tipos[i])
+    return pd.DataFrame(dados, columns=nomes)
+
+def _coluna_pandas(coluna):
+    """Coluna Arrow do driver -> Series com os mesmos tipos do backend colunar"""
+    tipo = coluna.type
+    if pa.types.is_decimal(tipo) or pa.types.is_floating(tipo):
+        coluna = coluna.cast(pa.float64())
+    elif pa.types.is_integer(tipo):
+        coluna = coluna.cast(pa.int64())
+    elif pa.types.is_timestamp(tipo):
+        coluna = coluna.cast(pa.timestamp('us'))
+    return coluna.to_pandas(date_as_object=True, coerce_temporal_nanoseconds=True)
+
+def ler_sql_arrow(query, conn, params=None, tamanho_lote=None):
+    """
+    Lê com o driver Arrow nativo (arrow-odbc), que abre a própria conexão com
+    LEITURA_CONFIG['conexao_odbc']. Se o driver não estiver disponível ou não
+    conseguir executar a query, usa o backend colunar (nada foi lido ainda).
+    """
+    tamanho_lote = tamanho_lote or LEITURA_CONFIG['tamanho_lote']
+    if not ARROW_ODBC_DISPONIVEL or not LEITURA_CONFIG['conexao_odbc']:
+        return ler_sql_colunar(query, conn, params, tamanho_lote)
+    try:
+        leitor = read_arrow_batches_from_odbc(
+            query=query,
+            connection_string=LEITURA_CONFIG['conexao_odbc'],
+            batch_size=tamanho_lote,
+            parameters=None if params is None else [None if p is None else str(p) for p in params],
+        )
+    except Exception as e:
+        print(f"⚠ Driver Arrow falhou ao executar a query ({e}); usando o backend colunar")
+        return ler_sql_colunar(query, conn, params, tamanho_lote)
+
+    # A partir daqui a query já está sendo lida: erros são repassados
+    tabela = pa.Table.from_batches(list(leitor), schema=leitor.schema)
+    nomes = tabela.column_names
+    return pd.DataFrame({nome: _coluna_pandas(tabela.column(i)) for i, nome in enumerate(nomes)}, columns=nomes)
+
+BACKENDS = {
+    'pandas': ler_sql_pandas,
+    'colunar': ler_sql_colunar,
+    'arrow': ler_sql_arrow,
+}
+
+def ler_sql(query, conn, params=None, backend=None):
+    """
+    Lê a query com o backend configurado (LEITURA_CONFIG['backend']).
+    Valores que não cabem no tipo declarado viram coluna objeto no próprio
+    backend colunar; erros durante a leitura são repassados, sem executar
+    a query de novo com pd.read_sql.
+    """
+    backend = backend or LEITURA_CONFIG['backend']
+    return BACKENDS[backend](query, conn, params)
+
+def benchmark(query, conectar, backends=None, repeticoes=1):
+    """
+    Mede linhas/s de cada backend para a query (uma conexão nova por execução).
+    conectar: função sem argumentos que retorna uma conexão DB-API.
+    """
+    resultados = {}
+    for backend in backends or list(BACKENDS):
+        if backend == 'arrow' and not (ARROW_ODBC_DISPONIVEL and LEITURA_CONFIG['conexao_odbc']):
+            print(f"  {backend:<8} ⚠ arrow-odbc não instalado ou sem string de conexão (não medido)")
+            continue
+        melhor = None
+        linhas = 0
+        for _ in range(repeticoes):
+            conn = conectar()
+            try:
+                t = time.time()
+                df = BACKENDS[backend](query, conn, None)
+                decorrido = time.time() - t
+            finally:
+                conn.close()
+            linhas = len(df)
+            melhor = decorrido if melhor is None else min(melhor, decorrido)
+        resultados[backend] = {
+            'linhas': linhas,
+            'segundos': melhor,
+            'linhas_por_s': linhas / melhor if melhor else float('inf'),
+        }
+        print(f"  {backend:<8} {linhas:>12,} linhas  {melhor:8.2f}s  {resultados[backend]['linhas_por_s']:>12,.0f} linhas/s")
+    return resultados
+
+if __name__ == '__main__':
+    import argparse
+    import exportar_todos_relatorios3 as relatorios
+
+    parser = argparse.ArgumentParser(description='Benchmark dos backends de leitura (linhas/s)')
+    parser.add_argument('queries', nargs='*', default=['produtos_barra'],
+                        help=f"Queries de exportar_todos_relatorios3: {', '.join(relatorios.QUERIES)}")
+    parser.add_argument('--repeticoes', type=int, default=1)
+    args = parser.parse_args()
+
+    # Sem a string de conexão o backend arrow cairia no colunar e mediria o colunar
+    LEITURA_CONFIG['conexao_odbc'] = relatorios.string_conexao()
+    for nome in args.queries:
+        print(f"\n[{nome}]")
+        benchmark(relatorios.QUERIES[nome], relatorios.conectar_banco, repeticoes=args.repeticoes)
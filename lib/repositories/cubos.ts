@@ -0,0 +1,235 @@
+/**
+ * Leitura dos cubos pré-agregados de vendas (data/cubos/*.json), gerados por
+ * processar_vendas em exportar_todos_relatorios3.py a partir das vendas já
+ * líquidas de trocas. Cada função devolve null quando o cubo não existe, está
+ * velho (CUBOS_MAX_IDADE_HORAS) ou não cobre o período pedido: nesse caso a
+ * consulta continua sendo feita direto no SQL Server.
+ */
+
+import { promises as fs } from 'fs';
+import path from 'path';
+
+import type { CategoryRevenue, ProductRevenue } from '@/types/dashboard';
+import type { NormalizedRange } from '@/lib/utils/date';
+
+const CUBOS_DIR = path.join(process.cwd(), 'data', 'cubos');
+const MAX_IDADE_MS = Number(process.env.CUBOS_MAX_IDADE_HORAS || 24) * 60 * 60 * 1000;
+
+type ValorCubo = string | number | null;
+
+interface CuboArquivo {
+  cubo: string;
+  gerado_em: string;
+  registros: number;
+  // fim exclusivo: os cubos só têm dias fechados
+  periodo?: { inicio: string; fim: string };
+  dados: Record<string, ValorCubo[]>;
+}
+
+// Cubos já lidos, invalidados pela data de modificação do arquivo
+const cubosCarregados = new Map<string, { mtimeMs: number; cubo: CuboArquivo }>();
+
+async function carregarCubo(nome: string): Promise<CuboArquivo | null> {
+  const arquivo = path.join(CUBOS_DIR, `${nome}.json`);
+  try {
+    const { mtimeMs } = await fs.stat(arquivo);
+    const carregado = cubosCarregados.get(nome);
+    if (carregado && carregado.mtimeMs === mtimeMs) {
+      return carregado.cubo;
+    }
+    const cubo = JSON.parse(await fs.readFile(arquivo, 'utf-8')) as CuboArquivo;
+    cubosCarregados.set(nome, { mtimeMs, cubo });
+    return cubo;
+  } catch {
+    return null;
+  }
+}
+
+function dia(data: Date): string {
+  return data.toISOString().split('T')[0];
+}
+
+/**
+ * Cubo utilizável para todos os intervalos (fim exclusivo, como em
+ * normalizeRangeForQuery), ou null.
+ */
+async function cuboPara(nome: string, intervalos: NormalizedRange[]): Promise<CuboArquivo | null> {
+  const cubo = await carregarCubo(nome);
+  if (!cubo?.periodo) {
+    return null;
+  }
+  const geradoEm = new Date(cubo.gerado_em).getTime();
+  if (!Number.isFinite(geradoEm) || Date.now() - geradoEm > MAX_IDADE_MS) {
+    return null;
+  }
+  const { inicio, fim } = cubo.periodo;
+  const cobre = intervalos.every(({ start, end }) => dia(start) >= inicio && dia(end) <= fim);
+  return cobre ? cubo : null;
+}
+
+/** Índices das linhas do cubo nas filiais (null = todas) */
+function linhasFiliais(cubo: CuboArquivo, filiais: string[] | null): number[] {
+  const coluna = cubo.dados.FILIAL ?? [];
+  const permitidas = filiais ? new Set(filiais.map((filial) => filial.trim())) : null;
+  const linhas: number[] = [];
+  coluna.forEach((filial, i) => {
+    if (!permitidas || permitidas.has(String(filial ?? ''))) {
+      linhas.push(i);
+    }
+  });
+  return linhas;
+}
+
+function numero(valor: ValorCubo | undefined): number {
+  return Number(valor ?? 0);
+}
+
+export async function fetchDailyRevenueFromCubes(
+  range: NormalizedRange,
+  filiais: string[] | null
+): Promise<{ date: string; revenue: number }[] | null> {
+  const cubo = await cuboPara('vendas_dia_filial', [range]);
+  if (!cubo) {
+    return null;
+  }
+
+  const inicio = dia(range.start);
+  const fim = dia(range.end);
+  const { DATA, VALOR_LIQUIDO } = cubo.dados;
+  const porDia = new Map<string, number>();
+  linhasFiliais(cubo, filiais).forEach((i) => {
+    const data = String(DATA[i]);
+    if (data >= inicio && data < fim) {
+      porDia.set(data, (porDia.get(data) ?? 0) + numero(VALOR_LIQUIDO[i]));
+    }
+  });
+
+  return Array.from(porDia.entries())
+    .sort(([a], [b]) => a.localeCompare(b))
+    .map(([date, revenue]) => ({ date, revenue }));
+}
+
+export async function fetchTopCategoriesFromCubes(
+  range: NormalizedRange,
+  filiais: string[] | null,
+  limit: number
+): Promise<CategoryRevenue[] | null> {
+  const cubo = await cuboPara('vendas_dia_filial_grupo', [range]);
+  if (!cubo) {
+    return null;
+  }
+
+  const inicio = dia(range.start);
+  const fim = dia(range.end);
+  const { DATA, GRUPO_PRODUTO, VALOR_LIQUIDO, QTDE } = cubo.dados;
+  const porGrupo = new Map<string, CategoryRevenue>();
+  linhasFiliais(cubo, filiais).forEach((i) => {
+    const data = String(DATA[i]);
+    if (data < inicio || data >= fim) {
+      return;
+    }
+    const grupo = String(GRUPO_PRODUTO?.[i] ?? '') || 'SEM GRUPO';
+    const atual = porGrupo.get(grupo) ?? {
+      categoryId: grupo,
+      categoryName: grupo,
+      totalRevenue: 0,
+      totalQuantity: 0,
+    };
+    atual.totalRevenue += numero(VALOR_LIQUIDO[i]);
+    atual.totalQuantity += numero(QTDE[i]);
+    porGrupo.set(grupo, atual);
+  });
+
+  return Array.from(porGrupo.values())
+    .sort((a, b) => b.totalRevenue - a.totalRevenue)
+    .slice(0, limit);
+}
+
+/**
+ * Top produtos pelo cubo mensal: só vale para períodos que começam no dia 1
+ * e terminam no fim de um mês ou no último dia fechado do cubo.
+ */
+export async function fetchTopProductsFromCubes(
+  range: NormalizedRange,
+  filiais: string[] | null,
+  limit: number
+): Promise<Omit<ProductRevenue, 'stock'>[] | null> {
+  const cubo = await cuboPara('vendas_produto_filial_mes', [range]);
+  if (!cubo?.periodo) {
+    return null;
+  }
+
+  const fim = dia(range.end);
+  const alinhado =
+    range.start.getUTCDate() === 1 && (range.end.getUTCDate() === 1 || fim === cubo.periodo.fim);
+  if (!alinhado) {
+    return null;
+  }
+
+  const mesInicio = dia(range.start).slice(0, 7);
+  // Fim no dia 1: o mês do fim fica de fora; fim no último dia do cubo: o mês (parcial) entra
+  const dentro = (mes: string) =>
+    mes >= mesInicio && (range.end.getUTCDate() === 1 ? mes < fim.slice(0, 7) : mes <= fim.slice(0, 7));
+
+  const { MES, PRODUTO, DESC_PRODUTO, VALOR_LIQUIDO, QTDE } = cubo.dados;
+  const porProduto = new Map<string, Omit<ProductRevenue, 'stock'>>();
+  linhasFiliais(cubo, filiais).forEach((i) => {
+    if (!dentro(String(MES[i]))) {
+      return;
+    }
+    const produto = String(PRODUTO[i] ?? '');
+    const descricao = String(DESC_PRODUTO?.[i] ?? '');
+    const atual = porProduto.get(produto) ?? {
+      productId: produto,
+      productName: descricao,
+      totalRevenue: 0,
+      totalQuantity: 0,
+    };
+    // MAX(DESC_PRODUTO), como na consulta direta
+    if (descricao > atual.productName) {
+      atual.productName = descricao;
+    }
+    atual.totalRevenue += numero(VALOR_LIQUIDO[i]);
+    atual.totalQuantity += numero(QTDE[i]);
+    porProduto.set(produto, atual);
+  });
+
+  return Array.from(porProduto.values())
+    .sort((a, b) => b.totalRevenue - a.totalRevenue)
+    .slice(0, limit);
+}
+
+export async function fetchFilialRevenueFromCubes(
+  current: NormalizedRange,
+  previous: NormalizedRange,
+  filiais: string[]
+): Promise<{ FILIAL: string; currentRevenue: number; previousRevenue: number }[] | null> {
+  const cubo = await cuboPara('vendas_dia_filial', [current, previous]);
+  if (!cubo) {
+    return null;
+  }
+
+  const atual = { inicio: dia(current.start), fim: dia(current.end) };
+  const anterior = { inicio: dia(previous.start), fim: dia(previous.end) };
+  const { DATA, FILIAL, VALOR_LIQUIDO } = cubo.dados;
+  const porFilial = new Map<string, { FILIAL: string; currentRevenue: number; previousRevenue: number }>();
+  linhasFiliais(cubo, filiais).forEach((i) => {
+    const data = String(DATA[i]);
+    const noAtual = data >= atual.inicio && data < atual.fim;
+    const noAnterior = data >= anterior.inicio && data < anterior.fim;
+    if (!noAtual && !noAnterior) {
+      return;
+    }
+    const filial = String(FILIAL[i]);
+    const linha = porFilial.get(filial) ?? { FILIAL: filial, currentRevenue: 0, previousRevenue: 0 };
+    if (noAtual) {
+      linha.currentRevenue += numero(VALOR_LIQUIDO[i]);
+    }
+    if (noAnterior) {
+      linha.previousRevenue += numero(VALOR_LIQUIDO[i]);
+    }
+    porFilial.set(filial, linha);
+  });
+
+  return Array.from(porFilial.values()).sort((a, b) => b.currentRevenue - a.currentRevenue);
+}
@@ -11,6 +11,12 @@ import {
 import { withRequest } from '@/lib/db/connection';
 import { RequestLike } from '@/lib/db/proxy';
 import { fetchMultipleProductsStock, fetchStockSummary } from '@/lib/repositories/inventory';
+import {
+  fetchDailyRevenueFromCubes,
+  fetchFilialRevenueFromCubes,
+  fetchTopCategoriesFromCubes,
+  fetchTopProductsFromCubes,
+} from '@/lib/repositories/cubos';
 import type {
   CategoryRevenue,
   ProductRevenue,
@@ -48,21 +54,23 @@ function shouldAggregateEcommerce(
   return isScarfme && hasEcommerce;
 }
 
-function buildFilialFilter(
-  request: sql.Request | RequestLike,
+/**
+ * Filiais filtradas para a empresa/filial selecionada (null = sem filtro).
+ * Mesma regra da consulta direta (buildFilialFilter) e dos cubos.
+ */
+function resolveFilialList(
   companySlug: string | undefined,
   module: CompanyModule,
-  specificFilial?: string | null,
-  tableAlias: string = 'vp'
-): string {
+  specificFilial?: string | null
+): string[] | null {
   if (!companySlug) {
-    return '';
+    return null;
   }
 
   const company = resolveCompany(companySlug);
 
   if (!company) {
-    return '';
+    return null;
   }
 
   const isScarfme = companySlug === 'scarfme';
@@ -71,68 +79,73 @@ function buildFilialFilter(
 
   // Se uma filial específica foi selecionada, usar apenas ela
   if (specificFilial && specificFilial !== VAREJO_VALUE) {
-    request.input('filial', sql.VarChar, specificFilial);
-    return `AND ${tableAlias}.FILIAL = @filial`;
-  }
-
-  // Para scarfme: se for "VAREJO", mostrar apenas filiais normais (sem ecommerce)
-  if (isScarfme && specificFilial === VAREJO_VALUE) {
-    const normalFiliais = filiais.filter(f => !ecommerceFilials.includes(f));
-    
-    if (normalFiliais.length === 0) {
-      return '';
-    }
-
-    normalFiliais.forEach((filial, index) => {
-      request.input(`filial${index}`, sql.VarChar, filial);
-    });
-
-    const placeholders = normalFiliais
-      .map((_, index) => `@filial${index}`)
-      .join(', ');
-
-    return `AND ${tableAlias}.FILIAL IN (${placeholders})`;
+    return [specificFilial];
   }
 
   // Para scarfme: se for "Todas as filiais" (null), incluir também ecommerce
-  // Para outras empresas: usar apenas filiais normais (sem ecommerce)
   if (isScarfme && specificFilial === null) {
-    // Incluir todas as filiais (normais + ecommerce)
-    const allFiliais = filiais; // Já inclui todas as filiais da lista
-    
-    if (allFiliais.length === 0) {
-      return '';
-    }
-
-    allFiliais.forEach((filial, index) => {
-      request.input(`filial${index}`, sql.VarChar, filial);
-    });
-
-    const placeholders = allFiliais
-      .map((_, index) => `@filial${index}`)
-      .join(', ');
-
-    return `AND ${tableAlias}.FILIAL IN (${placeholders})`;
+    return filiais.length > 0 ? filiais : null;
   }
 
-  // Para outras empresas (ou comportamento padrão): usar apenas filiais normais (sem ecommerce)
+  // "VAREJO" da scarfme e demais empresas: apenas filiais normais (sem ecommerce)
   const normalFiliais = filiais.filter(f => !ecommerceFilials.includes(f));
 
-  if (normalFiliais.length === 0) {
+  return normalFiliais.length > 0 ? normalFiliais : null;
+}
+
+function buildFilialFilter(
+  request: sql.Request | RequestLike,
+  companySlug: string | undefined,
+  module: CompanyModule,
+  specificFilial?: string | null,
+  tableAlias: string = 'vp'
+): string {
+  const filiais = resolveFilialList(companySlug, module, specificFilial);
+
+  if (!filiais) {
     return '';
   }
 
-  normalFiliais.forEach((filial, index) => {
+  if (specificFilial && specificFilial !== VAREJO_VALUE) {
+    request.input('filial', sql.VarChar, specificFilial);
+    return `AND ${tableAlias}.FILIAL = @filial`;
+  }
+
+  filiais.forEach((filial, index) => {
     request.input(`filial${index}`, sql.VarChar, filial);
   });
 
-  const placeholders = normalFiliais
+  const placeholders = filiais
     .map((_, index) => `@filial${index}`)
     .join(', ');
 
   return `AND ${tableAlias}.FILIAL IN (${placeholders})`;
 }
 
+/**
+ * Preenche o estoque dos produtos (uma consulta para todos)
+ */
+async function attachStock(
+  products: ProductRevenue[],
+  company: string | undefined,
+  filial: string | null | undefined
+): Promise<ProductRevenue[]> {
+  if (products.length > 0) {
+    const productIds = products.map((p) => p.productId);
+    const stockMap = await fetchMultipleProductsStock(productIds, {
+      company,
+      filial,
+    });
+
+    // Adicionar estoque a cada produto
+    products.forEach((product) => {
+      product.stock = stockMap.get(product.productId) ?? 0;
+    });
+  }
+
+  return products;
+}
+
 export interface TopQueryParams {
   limit?: number;
   company?: string;
@@ -216,7 +229,20 @@ export async function fetchTopProducts({
     return aggregated;
   }
 
-  // Função normal para vendas de loja
+  // Função normal para vendas de loja (cubo pré-agregado quando cobre o período)
+  const fromCubes = await fetchTopProductsFromCubes(
+    resolveRange(range),
+    resolveFilialList(company, 'sales', filial),
+    limit
+  );
+  if (fromCubes) {
+    return attachStock(
+      fromCubes.map((product) => ({ ...product, stock: 0 })),
+      company,
+      filial
+    );
+  }
+
   return withRequest(async (request) => {
     request.input('limit', sql.Int, limit);
     const { start, end } = resolveRange(range);
@@ -325,20 +351,7 @@ export async function fetchTopProducts({
     }));
 
     // Buscar estoque para todos os produtos de uma vez
-    if (products.length > 0) {
-      const productIds = products.map((p) => p.productId);
-      const stockMap = await fetchMultipleProductsStock(productIds, {
-        company,
-        filial,
-      });
-
-      // Adicionar estoque a cada produto
-      products.forEach((product) => {
-        product.stock = stockMap.get(product.productId) ?? 0;
-      });
-    }
-
-    return products;
+    return attachStock(products, company, filial);
   });
 }
 
@@ -1048,7 +1061,16 @@ export async function fetchTopCategories({
     return aggregated;
   }
 
-  // Função normal para vendas de loja
+  // Função normal para vendas de loja (cubo pré-agregado quando cobre o período)
+  const fromCubes = await fetchTopCategoriesFromCubes(
+    resolveRange(range),
+    resolveFilialList(company, 'sales', filial),
+    limit
+  );
+  if (fromCubes) {
+    return fromCubes;
+  }
+
   return withRequest(async (request) => {
     request.input('limit', sql.Int, limit);
     const { start, end } = resolveRange(range);
@@ -1204,7 +1226,15 @@ export async function fetchDailyRevenue({
     );
   }
 
-  // Função normal para vendas de loja
+  // Função normal para vendas de loja (cubo pré-agregado quando cobre o período)
+  const fromCubes = await fetchDailyRevenueFromCubes(
+    resolveRange(range),
+    resolveFilialList(company, 'sales', filial)
+  );
+  if (fromCubes) {
+    return fromCubes;
+  }
+
   return withRequest(async (request) => {
     const { start, end } = resolveRange(range);
     request.input('startDate', sql.DateTime, start);
@@ -1325,25 +1355,26 @@ export async function fetchFilialPerformance({
     return [];
   }
 
-  // Buscar performance de filiais normais
-  const normalFiliais = withRequest(async (request) => {
-    const currentRange = resolveRange(range);
+  const currentRange = resolveRange(range);
+  const previousRange = shiftRangeByMonths(currentRange, -1);
+
+  // Ajustar o fim do período anterior para 1 dia antes do fim do período atual
+  const adjustedPreviousEnd = new Date(previousRange.end);
+  adjustedPreviousEnd.setTime(adjustedPreviousEnd.getTime() - 24 * 60 * 60 * 1000); // Subtrair 1 dia
+
+  const filiais = companyConfig.filialFilters['sales'] ?? [];
+  const ecommerceFilials = companyConfig.ecommerceFilials ?? [];
+  const normalFiliaisList = filiais.filter(f => !ecommerceFilials.includes(f));
+
+  // Buscar performance de filiais normais (cubo pré-agregado quando cobre os dois períodos)
+  const fetchNormalFiliaisLive = () => withRequest(async (request) => {
     const { start, end } = currentRange;
-    const previousRange = shiftRangeByMonths(currentRange, -1);
-    
-    // Ajustar o fim do período anterior para 1 dia antes do fim do período atual
-    const adjustedPreviousEnd = new Date(previousRange.end);
-    adjustedPreviousEnd.setTime(adjustedPreviousEnd.getTime() - 24 * 60 * 60 * 1000); // Subtrair 1 dia
 
     request.input('startDate', sql.DateTime, start);
     request.input('endDate', sql.DateTime, end);
     request.input('prevStartDate', sql.DateTime, previousRange.start);
     request.input('prevEndDate', sql.DateTime, adjustedPreviousEnd);
 
-    const filiais = companyConfig.filialFilters['sales'] ?? [];
-    const ecommerceFilials = companyConfig.ecommerceFilials ?? [];
-    const normalFiliaisList = filiais.filter(f => !ecommerceFilials.includes(f));
-    
     if (normalFiliaisList.length === 0) {
       return [];
     }
@@ -1473,6 +1504,12 @@ export async function fetchFilialPerformance({
     return result.recordset;
   });
 
+  const normalFiliais = fetchFilialRevenueFromCubes(
+    currentRange,
+    { start: previousRange.start, end: adjustedPreviousEnd },
+    normalFiliaisList
+  ).then((fromCubes) => fromCubes ?? fetchNormalFiliaisLive());
+
   // Buscar performance de filiais de e-commerce
   const ecommerceFiliais = fetchEcommerceFilialPerformance({ company, range });
 
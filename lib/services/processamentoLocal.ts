@@ -0,0 +1,56 @@
+/**
+ * Cliente do serviço Python de processamento (servico_processamento.py)
+ * Quando PROCESSAMENTO_URL está configurada, /api/relatorios/processar repassa
+ * a requisição para o serviço, que mantém produtos/códigos de barra/cores em
+ * memória e devolve o resultado em JSON, Arrow ou CSV (em blocos).
+ */
+
+const PROCESSAMENTO_URL = process.env.PROCESSAMENTO_URL || '';
+
+export type FormatoProcessamento = 'json' | 'arrow' | 'csv';
+
+/**
+ * Repassa o corpo (JSON da rota) ao serviço e devolve a resposta sem
+ * reserializar: o corpo é transmitido em blocos para o cliente.
+ * Retorna null se o serviço não responder ou responder com erro (a rota usa o
+ * processamento em TypeScript).
+ */
+export async function processarViaServico(
+  corpo: string,
+  formato: FormatoProcessamento = 'json'
+): Promise<Response | null> {
+  if (!PROCESSAMENTO_URL) {
+    return null;
+  }
+
+  try {
+    const response = await fetch(`${PROCESSAMENTO_URL}/processar?formato=${formato}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: corpo,
+    });
+
+    if (!response.ok) {
+      console.warn(
+        `Serviço de processamento respondeu ${response.status}, usando processamento local`
+      );
+      await response.body?.cancel();
+      return null;
+    }
+
+    const headers = new Headers();
+    ['Content-Type', 'X-Registros', 'X-Tempo-Processamento'].forEach((nome) => {
+      const valor = response.headers.get(nome);
+      if (valor) {
+        headers.set(nome, valor);
+      }
+    });
+
+    return new Response(response.body, { status: response.status, headers });
+  } catch (error) {
+    console.warn('Serviço de processamento indisponível, usando processamento local:', error);
+    return null;
+  }
+}
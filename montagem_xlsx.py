@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Junta planilhas XLSX de uma aba cada (geradas em paralelo pelo openpyxl) em um só arquivo
+As partes da aba (XML da planilha e tabelas) são copiadas; estilos e strings
+compartilhadas são unificados e os índices s="..." / <v> das células remapeados.
+"""
+
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+ET.register_namespace('', NS)
+ET.register_namespace('r', NS_REL)
+
+TIPOS = {
+    'planilha': 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml',
+    'tabela': 'application/vnd.openxmlformats-officedocument.spreadsheetml.table+xml',
+    'estilos': 'application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml',
+    'strings': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml',
+    'tema': 'application/vnd.openxmlformats-officedocument.theme+xml',
+    'pasta': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml',
+    'core': 'application/vnd.openxmlformats-package.core-properties+xml',
+    'app': 'application/vnd.openxmlformats-officedocument.extended-properties+xml',
+}
+REL_TIPO = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+_ESTILO = re.compile(rb'(<(?:c|row)\b[^>]*?\bs=")(\d+)(")')
+_ESTILO_COLUNA = re.compile(rb'(<col\b[^>]*?\bstyle=")(\d+)(")')
+_RELACAO = '<Relationship Id="{}" Type="{}" Target="{}"/>'
+_STRING = re.compile(rb'(<c\b[^>]*?\bt="s"[^>]*><v>)(\d+)(</v>)')
+
+def _q(tag):
+    return f'{{{NS}}}{tag}'
+
+def _rels(zf, caminho):
+    """Relacionamentos de uma parte: {Id: alvo absoluto no pacote}"""
+    pasta, nome = posixpath.split(caminho)
+    arquivo = posixpath.join(pasta, '_rels', nome + '.rels')
+    if arquivo not in zf.namelist():
+        return {}
+    alvos = {}
+    for rel in ET.fromstring(zf.read(arquivo)):
+        alvo = rel.get('Target')
+        alvo = alvo.lstrip('/') if alvo.startswith('/') else posixpath.normpath(posixpath.join(pasta, alvo))
+        alvos[rel.get('Id')] = alvo
+    return alvos
+
+def _abas(zf):
+    """[(nome da aba, caminho da planilha)] na ordem do workbook.xml"""
+    alvos = _rels(zf, 'xl/workbook.xml')
+    livro = ET.fromstring(zf.read('xl/workbook.xml'))
+    return [(aba.get('name'), alvos[aba.get(f'{{{NS_REL}}}id')])
+            for aba in livro.find(_q('sheets'))]
+
+class _Estilos:
+    """Tabela de estilos unificada (numFmts, fonts, fills, borders e cellXfs)"""
+
+    def __init__(self, base):
+        self.raiz = base
+        self.listas = {}
+        self.indices = {}
+        for tag in ['fonts', 'fills', 'borders', 'cellXfs']:
+            elementos = list(base.find(_q(tag)) if base.find(_q(tag)) is not None else [])
+            self.listas[tag] = elementos
+            self.indices[tag] = {}
+            for i, elemento in enumerate(elementos):
+                self.indices[tag].setdefault(ET.tostring(elemento), i)
+        self.formatos = {}
+        numfmts = base.find(_q('numFmts'))
+        for fmt in (numfmts if numfmts is not None else []):
+            self.formatos[fmt.get('formatCode')] = int(fmt.get('numFmtId'))
+
+    def _adicionar(self, tag, elemento):
+        chave = ET.tostring(elemento)
+        if chave not in self.indices[tag]:
+            self.indices[tag][chave] = len(self.listas[tag])
+            self.listas[tag].append(elemento)
+        return self.indices[tag][chave]
+
+    def incorporar(self, estilos):
+        """Acrescenta os estilos de outra planilha; retorna o mapa índice antigo -> novo de cellXfs"""
+        mapas = {}
+        for tag in ['fonts', 'fills', 'borders']:
+            grupo = estilos.find(_q(tag))
+            mapas[tag] = [self._adicionar(tag, e) for e in (grupo if grupo is not None else [])]
+        formatos = {}
+        numfmts = estilos.find(_q('numFmts'))
+        for fmt in (numfmts if numfmts is not None else []):
+            codigo = fmt.get('formatCode')
+            if codigo not in self.formatos:
+                self.formatos[codigo] = max([163] + list(self.formatos.values())) + 1
+            formatos[fmt.get('numFmtId')] = str(self.formatos[codigo])
+        mapa_xf = []
+        for xf in estilos.find(_q('cellXfs')):
+            xf = ET.fromstring(ET.tostring(xf))
+            for atributo, tag in [('fontId', 'fonts'), ('fillId', 'fills'), ('borderId', 'borders')]:
+                if xf.get(atributo) is not None:
+                    xf.set(atributo, str(mapas[tag][int(xf.get(atributo))]))
+            if xf.get('numFmtId') in formatos:
+                xf.set('numFmtId', formatos[xf.get('numFmtId')])
+            mapa_xf.append(self._adicionar('cellXfs', xf))
+        return mapa_xf
+
+    def xml(self):
+        filhos = list(self.raiz)
+        posicao = {e.tag: i for i, e in enumerate(filhos)}
+        for tag in ['fonts', 'fills', 'borders', 'cellXfs']:
+            grupo = ET.Element(_q(tag), count=str(len(self.listas[tag])))
+            grupo.extend(self.listas[tag])
+            filhos[posicao[_q(tag)]] = grupo
+        numfmts = ET.Element(_q('numFmts'), count=str(len(self.formatos)))
+        for codigo, id_formato in sorted(self.formatos.items(), key=lambda x: x[1]):
+            ET.SubElement(numfmts, _q('numFmt'), numFmtId=str(id_formato), formatCode=codigo)
+        if _q('numFmts') in posicao:
+            filhos[posicao[_q('numFmts')]] = numfmts
+        elif self.formatos:
+            filhos.insert(0, numfmts)
+        raiz = ET.Element(self.raiz.tag, self.raiz.attrib)
+        raiz.extend(filhos)
+        return ET.tostring(raiz, xml_declaration=True, encoding='UTF-8')
+
+def _remapear(xml, padrao, mapa):
+    return padrao.sub(lambda m: m.group(1) + str(mapa[int(m.group(2))]).encode() + m.group(3), xml)
+
+def _relacionamentos(relacoes):
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            f'<Relationships xmlns="{NS_PKG_REL}">' + ''.join(relacoes) + '</Relationships>').encode('utf-8')
+
+def juntar(arquivos, destino):
+    """
+    Grava em destino um XLSX com as abas de cada arquivo, na ordem da lista.
+    Propriedades (docProps), tema e workbook.xml vêm do primeiro arquivo.
+    """
+    entradas = [zipfile.ZipFile(caminho) for caminho in arquivos]
+    try:
+        primeiro = entradas[0]
+        estilos = _Estilos(ET.fromstring(primeiro.read('xl/styles.xml')))
+        strings = []
+        partes = {}
+        abas = []
+        tipos = {}
+        n_tabela = 0
+        for zf in entradas:
+            mapa_xf = estilos.incorporar(ET.fromstring(zf.read('xl/styles.xml')))
+            deslocamento = len(strings)
+            if 'xl/sharedStrings.xml' in zf.namelist():
+                strings.extend(ET.fromstring(zf.read('xl/sharedStrings.xml')).findall(_q('si')))
+            for nome, caminho in _abas(zf):
+                n_aba = len(abas) + 1
+                xml = zf.read(caminho)
+                xml = _remapear(xml, _ESTILO, mapa_xf)
+                xml = _remapear(xml, _ESTILO_COLUNA, mapa_xf)
+                if deslocamento:
+                    xml = _STRING.sub(lambda m: m.group(1) + str(int(m.group(2)) + deslocamento).encode() + m.group(3), xml)
+                parte = f'xl/worksheets/sheet{n_aba}.xml'
+                partes[parte] = xml
+                tipos[parte] = TIPOS['planilha']
+
+                # Tabelas da aba: renumeradas (id e nome do arquivo únicos no pacote)
+                relacoes = []
+                for id_rel, alvo in _rels(zf, caminho).items():
+                    if not alvo.startswith('xl/tables/'):
+                        continue
+                    n_tabela += 1
+                    tabela = ET.fromstring(zf.read(alvo))
+                    tabela.set('id', str(n_tabela))
+                    novo = f'xl/tables/table{n_tabela}.xml'
+                    partes[novo] = ET.tostring(tabela, xml_declaration=True, encoding='UTF-8')
+                    tipos[novo] = TIPOS['tabela']
+                    relacoes.append(_RELACAO.format(id_rel, REL_TIPO + 'table', '/' + novo))
+                if relacoes:
+                    partes[f'xl/worksheets/_rels/sheet{n_aba}.xml.rels'] = _relacionamentos(relacoes)
+                abas.append(nome)
+
+        partes['xl/styles.xml'] = estilos.xml()
+        if strings:
+            sst = ET.Element(_q('sst'), count=str(len(strings)), uniqueCount=str(len(strings)))
+            sst.extend(strings)
+            partes['xl/sharedStrings.xml'] = ET.tostring(sst, xml_declaration=True, encoding='UTF-8')
+
+        # workbook.xml do primeiro arquivo com a lista completa de abas
+        livro = ET.fromstring(primeiro.read('xl/workbook.xml'))
+        lista = livro.find(_q('sheets'))
+        for aba in list(lista):
+            lista.remove(aba)
+        for i, nome in enumerate(abas, 1):
+            ET.SubElement(lista, _q('sheet'), {'name': nome, 'sheetId': str(i), 'state': 'visible',
+                                               f'{{{NS_REL}}}id': f'rId{i}'})
+        partes['xl/workbook.xml'] = ET.tostring(livro, xml_declaration=True, encoding='UTF-8')
+
+        alvos = [(f'/xl/worksheets/sheet{i}.xml', 'worksheet') for i in range(1, len(abas) + 1)]
+        alvos += [('styles.xml', 'styles'), ('theme/theme1.xml', 'theme')]
+        if strings:
+            alvos.append(('sharedStrings.xml', 'sharedStrings'))
+        partes['xl/_rels/workbook.xml.rels'] = _relacionamentos(
+            [_RELACAO.format(f'rId{i}', REL_TIPO + tipo, alvo) for i, (alvo, tipo) in enumerate(alvos, 1)])
+
+        for parte in ['_rels/.rels', 'docProps/core.xml', 'docProps/app.xml', 'xl/theme/theme1.xml']:
+            partes[parte] = primeiro.read(parte)
+        tipos['xl/workbook.xml'] = TIPOS['pasta']
+        tipos['xl/styles.xml'] = TIPOS['estilos']
+        tipos['xl/theme/theme1.xml'] = TIPOS['tema']
+        tipos['docProps/core.xml'] = TIPOS['core']
+        tipos['docProps/app.xml'] = TIPOS['app']
+        if strings:
+            tipos['xl/sharedStrings.xml'] = TIPOS['strings']
+
+        conteudo = ['<?xml version="1.0" encoding="UTF-8"?>'
+                    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                    '<Default Extension="xml" ContentType="application/xml"/>']
+        conteudo += [f'<Override PartName="/{parte}" ContentType="{tipo}"/>' for parte, tipo in tipos.items()]
+        conteudo.append('</Types>')
+
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as saida:
+            saida.writestr('[Content_Types].xml', ''.join(conteudo))
+            for parte, dados in partes.items():
+                saida.writestr(parte, dados)
+    finally:
+        for zf in entradas:
+            zf.close()
+    return abas
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cópia local chaveada da dimensão PRODUTOS (chave PRODUTO)
+A cada execução busca só as linhas com rowversion (coluna TIMESTAMP) a partir
+da marca guardada e faz upsert na cópia. Remoções são detectadas pela contagem
+de linhas e, periodicamente, pela comparação com o conjunto de chaves do servidor.
+"""
+
+import os
+import json
+import time
+import pandas as pd
+
+import leitura_colunar
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+REPLICA_CONFIG = {
+    'habilitado': True,
+    'atualizar': False,                # True (--refresh): recarrega a tabela inteira
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'produtos_local'),
+    'verificacao_chaves': 24 * 3600,   # intervalo (s) da conferência completa de chaves
+}
+
+TABELA = 'PRODUTOS'
+CHAVE = 'PRODUTO'
+COLUNA_VERSAO = 'TIMESTAMP'
+
+ARQUIVO_ESTADO = 'estado.json'
+
+def _caminho(*partes):
+    return os.path.join(REPLICA_CONFIG['diretorio'], *partes)
+
+def _gravar(df, caminho_sem_ext):
+    """Parquet se possível, senão pickle; retorna o nome do arquivo gravado"""
+    if PARQUET_DISPONIVEL:
+        try:
+            df.to_parquet(caminho_sem_ext + '.parquet', index=False)
+            return os.path.basename(caminho_sem_ext) + '.parquet'
+        except Exception:
+            pass
+    df.to_pickle(caminho_sem_ext + '.pkl')
+    return os.path.basename(caminho_sem_ext) + '.pkl'
+
+def _ler(caminho):
+    if caminho.endswith('.parquet'):
+        return pd.read_parquet(caminho)
+    return pd.read_pickle(caminho)
+
+def ler_estado():
+    """Estado da cópia local (None se ainda não houver)"""
+    try:
+        with open(_caminho(ARQUIVO_ESTADO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _consultar_valor(conn, sql):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+def contar_servidor(conn):
+    """
+    Linhas de PRODUTOS pelas estatísticas do servidor (sys.dm_db_partition_stats,
+    sem varrer a tabela); sem permissão VIEW DATABASE STATE, COUNT_BIG.
+    """
+    try:
+        linhas = _consultar_valor(
+            conn, "SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+                  f"WHERE object_id = OBJECT_ID('{TABELA}') AND index_id IN (0, 1)")
+        if linhas is not None:
+            return int(linhas)
+    except Exception:
+        pass
+    return int(_consultar_valor(conn, f"SELECT COUNT_BIG(*) FROM {TABELA} WITH (NOLOCK)"))
+
+def marca_atual(conn):
+    """
+    MIN_ACTIVE_ROWVERSION: toda linha alterada depois desta leitura (ou por
+    transação ainda aberta) terá rowversion >= ao valor, então é a marca segura.
+    """
+    return int(_consultar_valor(conn, "SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT)"))
+
+def _query_delta(query, marca):
+    return f"SELECT * FROM ({query}) AS q WHERE q.[{COLUNA_VERSAO}] >= 0x{marca:016X}"
+
+def _gravar_copia(df, marca, verificado_em, colunas):
+    os.makedirs(REPLICA_CONFIG['diretorio'], exist_ok=True)
+    estado = ler_estado()
+    versao = str(int(time.time() * 1000))
+    arquivo = _gravar(df, _caminho(f'produtos_{versao}'))
+    novo_estado = {
+        'arquivo': arquivo,
+        'marca': f"0x{marca:016X}",
+        'registros': len(df),
+        'colunas': colunas,
+        'atualizado_em': time.time(),
+        'chaves_verificadas_em': verificado_em,
+    }
+    tmp = _caminho(ARQUIVO_ESTADO + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(novo_estado, f, indent=1)
+    os.replace(tmp, _caminho(ARQUIVO_ESTADO))
+    if estado and estado['arquivo'] != arquivo:
+        try:
+            os.remove(_caminho(estado['arquivo']))
+        except OSError:
+            pass
+
+def carga_completa(conn, query):
+    """Lê a tabela inteira e recomeça a cópia local"""
+    marca = marca_atual(conn)
+    df = leitura_colunar.ler_sql(query, conn)
+    _gravar_copia(df, marca, time.time(), list(df.columns))
+    print(f"✓ produtos (cópia local): carga completa, {len(df):,} registros")
+    return df
+
+def sincronizar(conn, query):
+    """
+    DataFrame completo de PRODUTOS a partir da cópia local + linhas alteradas
+    desde a última execução. Sem cópia válida (ou com atualizar), faz a carga completa.
+    """
+    estado = ler_estado()
+    local = None
+    if estado is not None and not REPLICA_CONFIG['atualizar']:
+        try:
+            local = _ler(_caminho(estado['arquivo']))
+        except (OSError, ValueError):
+            print("⚠ Cópia local de produtos ilegível; refazendo a carga completa")
+    if local is None:
+        return carga_completa(conn, query)
+
+    marca = marca_atual(conn)
+    alteradas = leitura_colunar.ler_sql(_query_delta(query, int(estado['marca'], 16)), conn)
+    if list(alteradas.columns) != estado['colunas']:
+        print("⚠ Colunas de PRODUTOS mudaram desde a cópia local; refazendo a carga completa")
+        return carga_completa(conn, query)
+
+    # Upsert pela chave: a versão alterada substitui a local
+    df = local[~local[CHAVE].isin(alteradas[CHAVE])]
+    df = pd.concat([df, alteradas], ignore_index=True) if len(alteradas) else df.reset_index(drop=True)
+
+    # Remoções: contagem diferente ou conferência periódica -> compara as chaves
+    verificado_em = estado.get('chaves_verificadas_em') or 0
+    removidas = 0
+    total_servidor = contar_servidor(conn)
+    if total_servidor != len(df) or time.time() - verificado_em > REPLICA_CONFIG['verificacao_chaves']:
+        chaves = leitura_colunar.ler_sql(f"SELECT {CHAVE} FROM {TABELA} WITH (NOLOCK)", conn)[CHAVE]
+        manter = df[CHAVE].isin(chaves)
+        removidas = int((~manter).sum())
+        df = df[manter].reset_index(drop=True)
+        verificado_em = time.time()
+
+    _gravar_copia(df, marca, verificado_em, estado['colunas'])
+    print(f"✓ produtos (cópia local): {len(alteradas):,} alteradas/novas, {removidas:,} removidas, "
+          f"{len(df):,} registros")
+    return df
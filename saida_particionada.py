@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saída particionada dos relatórios grandes (vendas, e-commerce, entradas)
+Além do arquivo único, grava um CSV por empresa/filial/mês em
+data/particionado/<relatorio>/EMPRESA=.../FILIAL=.../MES=AAAA-MM/parte.csv
+com um manifesto de registros e intervalos de valores por partição.
+Partições com o mesmo conteúdo da execução anterior não são regravadas.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+import escrita_csv
+from empresas import COMPANIES
+
+PARTICIONADA_CONFIG = {
+    'habilitado': False,
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'particionado'),
+}
+
+# Relatório -> coluna de data do mês e medidas com intervalo no manifesto
+RELATORIOS_PARTICIONADOS = {
+    'vendas_tratadas': {'data': 'DATA_VENDA', 'medidas': ['VALOR_LIQUIDO', 'QTDE']},
+    'vendas_itens': {'data': 'DATA_VENDA', 'medidas': ['VALOR_LIQUIDO', 'QTDE']},
+    'vendas_tickets': {'data': 'DATA_VENDA', 'medidas': ['VALOR_VENDA_BRUTA']},
+    'ecommerce': {'data': 'EMISSAO', 'medidas': ['VALOR_LIQUIDO', 'QTDE']},
+    'entradas': {'data': 'EMISSAO', 'medidas': ['QTDE_TOTAL']},
+}
+
+ARQUIVO_MANIFESTO = '_manifesto.json'
+ARQUIVO_PARTE = 'parte.csv'
+
+# Filial -> empresa (mesmas listas do exportador de clientes)
+EMPRESA_DA_FILIAL = {filial: empresa for empresa, config in COMPANIES.items() for filial in config['filiais']}
+
+def empresa_da_filial(filial):
+    return EMPRESA_DA_FILIAL.get(filial, 'outras')
+
+def habilitado(relatorio):
+    return PARTICIONADA_CONFIG['habilitado'] and relatorio in RELATORIOS_PARTICIONADOS
+
+def _nome_dir(valor):
+    """Valor -> nome de diretório seguro (o valor original fica no manifesto)"""
+    return re.sub(r'[^\w\- .]', '_', str(valor)).strip() or '_'
+
+def _assinatura(df):
+    """Hash do conteúdo da partição (colunas + valores, sem índice)"""
+    h = hashlib.sha1('|'.join(map(str, df.columns)).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _intervalo(serie):
+    valores = serie.dropna()
+    if valores.empty:
+        return None
+    if pd.api.types.is_datetime64_any_dtype(valores):
+        return [str(valores.min()), str(valores.max())]
+    return [float(valores.min()), float(valores.max())]
+
+def ler_manifesto(relatorio, diretorio=None):
+    diretorio = diretorio or PARTICIONADA_CONFIG['diretorio']
+    try:
+        with open(os.path.join(diretorio, relatorio, ARQUIVO_MANIFESTO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _remover_parte(base, arquivo):
+    caminho = os.path.join(base, *arquivo.split('/'))
+    for extra in [''] + [f".{ext}" for ext in escrita_csv.COMPRESSOES]:
+        try:
+            os.remove(caminho + extra)
+        except OSError:
+            pass
+    # Remove diretórios que ficaram vazios (MES=, FILIAL=, EMPRESA=)
+    pasta = os.path.dirname(caminho)
+    while os.path.abspath(pasta) != os.path.abspath(base):
+        try:
+            os.rmdir(pasta)
+        except OSError:
+            break
+        pasta = os.path.dirname(pasta)
+
+def gravar(df, relatorio):
+    """
+    Grava as partições de um relatório e o manifesto. Só partições novas ou
+    com conteúdo diferente são regravadas; as que sumiram são removidas.
+    Retorna o manifesto.
+    """
+    config = RELATORIOS_PARTICIONADOS[relatorio]
+    base = os.path.join(PARTICIONADA_CONFIG['diretorio'], relatorio)
+    anterior = {p['arquivo']: p for p in (ler_manifesto(relatorio) or {}).get('particoes', [])}
+
+    filiais = df['FILIAL'] if 'FILIAL' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    datas = pd.to_datetime(df[config['data']], errors='coerce') if config['data'] in df.columns \
+        else pd.Series(pd.NaT, index=df.index)
+    chaves = pd.DataFrame({
+        'EMPRESA': filiais.map(empresa_da_filial).to_numpy(),
+        'FILIAL': filiais.fillna('sem_filial').astype(str).to_numpy(),
+        'MES': datas.dt.strftime('%Y-%m').fillna('sem_data').to_numpy(),
+    })
+
+    particoes = []
+    regravadas = 0
+    for (empresa, filial, mes), posicoes in sorted(chaves.groupby(['EMPRESA', 'FILIAL', 'MES']).indices.items()):
+        parte = df.iloc[posicoes]
+        arquivo = '/'.join([f"EMPRESA={_nome_dir(empresa)}", f"FILIAL={_nome_dir(filial)}",
+                            f"MES={mes}", ARQUIVO_PARTE])
+        caminho = os.path.join(base, *arquivo.split('/'))
+        assinatura = _assinatura(parte)
+        if anterior.get(arquivo, {}).get('hash') != assinatura or not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            escrita_csv.salvar_csv(parte, caminho)
+            regravadas += 1
+        intervalos = {col: _intervalo(parte[col]) for col in [config['data']] + config['medidas'] if col in parte.columns}
+        particoes.append({
+            'arquivo': arquivo,
+            'empresa': empresa,
+            'filial': filial,
+            'mes': mes,
+            'registros': len(parte),
+            'hash': assinatura,
+            'intervalos': intervalos,
+        })
+
+    atuais = {p['arquivo'] for p in particoes}
+    removidas = [arquivo for arquivo in anterior if arquivo not in atuais]
+    for arquivo in removidas:
+        _remover_parte(base, arquivo)
+
+    manifesto = {
+        'relatorio': relatorio,
+        'gerado': datetime.now().isoformat(timespec='seconds'),
+        'coluna_data': config['data'],
+        'colunas': list(df.columns),
+        'registros': len(df),
+        'particoes': particoes,
+    }
+    os.makedirs(base, exist_ok=True)
+    tmp = os.path.join(base, ARQUIVO_MANIFESTO + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=1, ensure_ascii=False)
+    os.replace(tmp, os.path.join(base, ARQUIVO_MANIFESTO))
+    print(f"✓ {relatorio} particionado: {len(particoes):,} partições "
+          f"({regravadas:,} regravadas, {len(removidas):,} removidas)")
+    return manifesto
+
+def selecionar(manifesto, empresa=None, filiais=None, inicio=None, fim=None):
+    """Partições do manifesto que podem ter linhas no filtro (empresa, filiais, meses de inicio a fim)"""
+    mes_inicio = pd.Timestamp(inicio).strftime('%Y-%m') if inicio else None
+    mes_fim = pd.Timestamp(fim).strftime('%Y-%m') if fim else None
+    selecionadas = []
+    for p in manifesto['particoes']:
+        if empresa and p['empresa'] != empresa:
+            continue
+        if filiais is not None and p['filial'] not in filiais:
+            continue
+        if (mes_inicio or mes_fim) and p['mes'] == 'sem_data':
+            continue
+        if mes_inicio and p['mes'] < mes_inicio:
+            continue
+        if mes_fim and p['mes'] > mes_fim:
+            continue
+        selecionadas.append(p)
+    return selecionadas
+
+def ler(relatorio, empresa=None, filiais=None, inicio=None, fim=None, diretorio=None):
+    """Lê só as partições do filtro (datas da coluna do relatório em [inicio, fim])"""
+    diretorio = diretorio or PARTICIONADA_CONFIG['diretorio']
+    manifesto = ler_manifesto(relatorio, diretorio)
+    if manifesto is None:
+        return None
+    partes = [pd.read_csv(os.path.join(diretorio, relatorio, *p['arquivo'].split('/')),
+                          sep=';', decimal=',', encoding='utf-8-sig')
+              for p in selecionar(manifesto, empresa, filiais, inicio, fim)]
+    if not partes:
+        return pd.DataFrame(columns=manifesto['colunas'])
+    df = pd.concat(partes, ignore_index=True)
+    coluna = manifesto['coluna_data']
+    if (inicio or fim) and coluna in df.columns:
+        datas = pd.to_datetime(df[coluna], errors='coerce')
+        manter = pd.Series(True, index=df.index)
+        if inicio:
+            manter &= datas >= pd.Timestamp(inicio)
+        if fim:
+            manter &= datas < pd.Timestamp(fim) + pd.Timedelta(days=1)
+        df = df[manter]
+    return df.reset_index(drop=True)
+
+def sincronizar(relatorio, destino):
+    """
+    Copia as partições de um relatório para destino/particionado/<relatorio>,
+    só os arquivos novos ou alterados, e remove as partições que sumiram.
+    Retorna o número de arquivos copiados.
+    """
+    origem = os.path.join(PARTICIONADA_CONFIG['diretorio'], relatorio)
+    if not os.path.isdir(origem):
+        return 0
+    alvo = os.path.join(destino, 'particionado', relatorio)
+    copiados = 0
+    existentes = set()
+    for pasta, _, arquivos in os.walk(origem):
+        for nome in arquivos:
+            if nome.endswith('.tmp'):
+                continue
+            relativo = os.path.relpath(os.path.join(pasta, nome), origem)
+            existentes.add(relativo)
+            de, para = os.path.join(origem, relativo), os.path.join(alvo, relativo)
+            try:
+                estado = os.stat(para)
+                fonte = os.stat(de)
+                if estado.st_size == fonte.st_size and int(estado.st_mtime) == int(fonte.st_mtime):
+                    continue
+            except OSError:
+                pass
+            os.makedirs(os.path.dirname(para), exist_ok=True)
+            shutil.copy2(de, para)
+            copiados += 1
+    for pasta, _, arquivos in os.walk(alvo, topdown=False):
+        for nome in arquivos:
+            relativo = os.path.relpath(os.path.join(pasta, nome), alvo)
+            if relativo not in existentes:
+                os.remove(os.path.join(pasta, nome))
+        if pasta != alvo and not os.listdir(pasta):
+            os.rmdir(pasta)
+    return copiados
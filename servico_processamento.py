@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço local de processamento dos relatórios (HTTP em localhost)
+Expõe as regras de exportar_todos_relatorios3 para o dashboard
+(/api/relatorios/processar) mantendo PRODUTOS, PRODUTOS_BARRA e CORES_BASICAS
+em memória; o resultado volta em Arrow IPC ou CSV, gravado em blocos (chunked).
+  POST /processar?tipo=vendas&formato=arrow   corpo: JSON {tipo, dados}, Arrow IPC ou CSV
+                                              (sem corpo: o serviço extrai a query)
+  POST /recarregar                            relê as dimensões
+  GET  /health                                dimensões carregadas
+"""
+
+import io
+import json
+import time
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+
+import exportar_todos_relatorios3 as relatorios
+import cache_consultas
+import leitura_colunar
+import snapshots_dimensoes
+import escrita_csv
+
+try:
+    import pyarrow as pa
+    ARROW_DISPONIVEL = True
+except ImportError:
+    ARROW_DISPONIVEL = False
+
+SERVICO_CONFIG = {
+    'host': '127.0.0.1',
+    'porta': 8765,
+    'idade_maxima': 12 * 3600,  # segundos até recarregar as dimensões
+    'linhas_lote': 50000,       # linhas por record batch do Arrow
+}
+
+# Dimensões mantidas em memória (produtos já tratado, como o dashboard envia)
+DIMENSOES_QUENTES = ['produtos_barra', 'cores', 'produtos']
+
+# Chaves de dadosAuxiliares do corpo JSON (mesmas da rota do dashboard)
+AUXILIARES_JSON = {'codigosBarra': 'produtos_barra', 'produtos': 'produtos', 'cores': 'cores'}
+
+TIPOS_CONTEUDO = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+
+_DIMENSOES = {'dados': {}, 'carregado_em': None}
+_TRAVA_DIMENSOES = threading.Lock()
+
+def carregar_dimensoes(forcar=False):
+    """
+    Carrega (ou recarrega, se passou da idade máxima) as dimensões quentes.
+    Usa ler_query do exportador, que aproveita snapshots e cache locais.
+    """
+    with _TRAVA_DIMENSOES:
+        carregado_em = _DIMENSOES['carregado_em']
+        if not forcar and carregado_em and time.time() - carregado_em < SERVICO_CONFIG['idade_maxima']:
+            return _DIMENSOES['dados']
+        t = time.time()
+        conn = relatorios.conectar_banco()
+        try:
+            brutos = {nome: relatorios.ler_query(nome, relatorios.QUERIES[nome], conn)
+                      for nome in DIMENSOES_QUENTES}
+        finally:
+            conn.close()
+        dados = {
+            'produtos_barra': brutos['produtos_barra'],
+            'cores': brutos['cores'],
+            'produtos': relatorios.processar_produtos(brutos['produtos'], brutos['produtos_barra'], salvar=False),
+        }
+        # Troca o dicionário inteiro: requisições em andamento seguem com a versão anterior
+        _DIMENSOES['dados'] = dados
+        _DIMENSOES['carregado_em'] = time.time()
+        print(f"✓ Dimensões carregadas ({time.time()-t:.2f}s): "
+              + ', '.join(f"{nome} {len(df):,}" for nome, df in dados.items()))
+        return dados
+
+def _vendas(df, dim):
+    df = relatorios.calcular_vendas(df, dim['produtos_barra'])
+    return df.drop(columns=relatorios.COLS_BASE_LOCAL['vendas'], errors='ignore')
+
+# tipo -> (função(df, dimensões), dimensões necessárias)
+PROCESSADORES = {
+    'produtos': (lambda df, dim: relatorios.processar_produtos(df, dim['produtos_barra'], salvar=False),
+                 ['produtos_barra']),
+    'estoque': (lambda df, dim: relatorios.tratar_estoque(df, dim['produtos'], dim['produtos_barra']),
+                ['produtos', 'produtos_barra']),
+    'vendas': (_vendas, ['produtos_barra']),
+    'ecommerce': (lambda df, dim: relatorios.tratar_ecommerce(df), []),
+    'entradas': (lambda df, dim: relatorios.tratar_entradas(df, dim['produtos'], dim['cores']),
+                 ['produtos', 'cores']),
+    'produtos_barra': (lambda df, dim: df, []),
+    'cores': (lambda df, dim: df, []),
+}
+
+def ler_entrada(tipo_conteudo, corpo):
+    """Corpo da requisição -> (tipo do relatório ou None, DataFrame ou None, auxiliares {nome: DataFrame})"""
+    if not corpo:
+        return None, None, {}
+    if tipo_conteudo.startswith(TIPOS_CONTEUDO['arrow'].split(';')[0]):
+        if not ARROW_DISPONIVEL:
+            raise ValueError('pyarrow não instalado; envie JSON ou CSV')
+        return None, pa.ipc.open_stream(corpo).read_pandas(), {}
+    if tipo_conteudo.startswith('text/csv'):
+        return None, pd.read_csv(io.BytesIO(corpo), sep=';', decimal=',', encoding='utf-8-sig'), {}
+
+    # JSON no formato da rota do dashboard: {tipo, dados, dadosAuxiliares}
+    payload = json.loads(corpo)
+    dados = payload.get('dados')
+    auxiliares = {AUXILIARES_JSON[chave]: pd.DataFrame(valor)
+                  for chave, valor in (payload.get('dadosAuxiliares') or {}).items()
+                  if chave in AUXILIARES_JSON and valor}
+    return payload.get('tipo'), (pd.DataFrame(dados) if dados is not None else None), auxiliares
+
+def extrair(tipo):
+    """Sem dados no corpo: extrai a query do relatório (cache/snapshot valem normalmente)"""
+    conn = relatorios.conectar_banco()
+    try:
+        return relatorios.ler_query(tipo, relatorios.QUERIES[tipo], conn)
+    finally:
+        conn.close()
+
+def processar(tipo, df, auxiliares=None):
+    """
+    Aplica as regras do relatório. As dimensões enviadas na requisição
+    (dadosAuxiliares) têm prioridade, como na rota em TypeScript; só as que
+    faltarem vêm da memória do serviço.
+    """
+    funcao, necessarias = PROCESSADORES[tipo]
+    dimensoes = dict(auxiliares or {})
+    faltantes = [nome for nome in necessarias if nome not in dimensoes]
+    if faltantes:
+        try:
+            carregadas = carregar_dimensoes()
+        except (Exception, SystemExit) as e:
+            # conectar_banco encerra com sys.exit
+            raise RuntimeError(f"Dimensões indisponíveis ({e}) e não enviadas na requisição: "
+                               f"{', '.join(faltantes)}")
+        dimensoes.update({nome: carregadas[nome] for nome in faltantes})
+    if df is None:
+        df = extrair(tipo)
+    return funcao(df, dimensoes)
+
+def _tabela_arrow(df):
+    """DataFrame -> Table; colunas object com tipos mistos viram texto"""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mistas = {c: df[c].where(df[c].isna(), df[c].astype(str)) for c in df.columns if df[c].dtype == object}
+        return pa.Table.from_pandas(df.assign(**mistas), preserve_index=False)
+
+class SaidaChunked:
+    """Arquivo de escrita que envia cada write como um chunk HTTP/1.1"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def write(self, dados):
+        dados = bytes(dados)
+        if dados:
+            self.wfile.write(f"{len(dados):X}\r\n".encode('ascii') + dados + b"\r\n")
+        return len(dados)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        if not self.closed:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+            self.closed = True
+
+class ManipuladorProcessamento(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ScarfmeProcessamento/1.0'
+
+    def log_message(self, formato, *args):
+        print(f"  {self.address_string()} {formato % args}")
+
+    def _responder_json(self, status, conteudo):
+        dados = json.dumps(conteudo, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', TIPOS_CONTEUDO['json'])
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _formato(self, parametros):
+        formato = parametros.get('formato', [None])[0]
+        if formato is None:
+            aceita = self.headers.get('Accept', '')
+            formato = next((f for f, tipo in TIPOS_CONTEUDO.items() if tipo.split(';')[0] in aceita), 'json')
+        if formato == 'arrow' and not ARROW_DISPONIVEL:
+            formato = 'csv'
+        return formato
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._responder_json(404, {'error': 'Rota não encontrada'})
+            return
+        carregado_em = _DIMENSOES['carregado_em']
+        self._responder_json(200, {
+            'success': True,
+            'carregado_em': datetime.fromtimestamp(carregado_em).isoformat(timespec='seconds') if carregado_em else None,
+            'dimensoes': {nome: len(df) for nome, df in _DIMENSOES['dados'].items()},
+            'arrow': ARROW_DISPONIVEL,
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parametros = parse_qs(url.query)
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b''
+
+        if url.path == '/recarregar':
+            try:
+                dados = carregar_dimensoes(forcar=True)
+            except (Exception, SystemExit) as e:
+                self._responder_json(500, {'error': 'Erro ao carregar dimensões', 'details': str(e)})
+                return
+            self._responder_json(200, {'success': True, 'dimensoes': {n: len(df) for n, df in dados.items()}})
+            return
+        if url.path not in ('/processar', '/api/relatorios/processar'):
+            self._responder_json(404, {'error': 'Rota não encontrada'})
+            return
+
+        t = time.time()
+        try:
+            tipo_corpo, df, auxiliares = ler_entrada(self.headers.get('Content-Type', ''), corpo)
+            tipo = parametros.get('tipo', [tipo_corpo])[0]
+            if tipo not in PROCESSADORES:
+                self._responder_json(400, {'error': f'Tipo de relatório inválido: {tipo}'})
+                return
+            resultado = processar(tipo, df, auxiliares)
+        except (ValueError, KeyError) as e:
+            self._responder_json(400, {'error': 'Requisição inválida', 'details': str(e)})
+            return
+        except (Exception, SystemExit) as e:
+            self._responder_json(500, {'error': 'Erro ao processar relatório', 'details': str(e)})
+            return
+
+        formato = self._formato(parametros)
+        if formato == 'json':
+            # Mesmo formato de resposta da rota TypeScript
+            dados = resultado.to_json(orient='records', date_format='iso', force_ascii=False)
+            self._responder_json_bruto(tipo, len(resultado), dados, time.time() - t)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', TIPOS_CONTEUDO[formato])
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Registros', str(len(resultado)))
+        self.send_header('X-Tempo-Processamento', f"{time.time() - t:.3f}")
+        self.end_headers()
+        saida = SaidaChunked(self.wfile)
+        if formato == 'arrow':
+            tabela = _tabela_arrow(resultado)
+            with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+                for lote in tabela.to_batches(max_chunksize=SERVICO_CONFIG['linhas_lote']):
+                    escritor.write_batch(lote)
+        else:
+            for dados, _ in escrita_csv.codificar_blocos(resultado):
+                saida.write(dados)
+        saida.close()
+
+    def _responder_json_bruto(self, tipo, registros, dados_json, segundos):
+        dados = (f'{{"success":true,"tipo":{json.dumps(tipo)},"registros":{registros},"data":'
+                 .encode('utf-8') + dados_json.encode('utf-8') + b'}')
+        self.send_response(200)
+        self.send_header('Content-Type', TIPOS_CONTEUDO['json'])
+        self.send_header('Content-Length', str(len(dados)))
+        self.send_header('X-Tempo-Processamento', f"{segundos:.3f}")
+        self.end_headers()
+        self.wfile.write(dados)
+
+def parse_args(argv=None):
+    """Argumentos de linha de comando (os mesmos de: exportador.py servico)"""
+    import exportador
+    return exportador.parser_comando('servico').parse_args(argv)
+
+def main(args=None):
+    """Sobe o serviço (args: Namespace de exportador.py servico)"""
+    args = args or parse_args()
+    cache_consultas.configurar(habilitado=not args.no_cache, atualizar=args.refresh)
+    if args.backend:
+        leitura_colunar.LEITURA_CONFIG['backend'] = args.backend
+    leitura_colunar.LEITURA_CONFIG['conexao_odbc'] = relatorios.string_conexao()
+    snapshots_dimensoes.SNAPSHOT_CONFIG['leitura_habilitada'] = not (args.no_cache or args.refresh)
+    SERVICO_CONFIG['host'] = args.host
+    SERVICO_CONFIG['porta'] = args.porta
+
+    print("="*60)
+    print("SERVIÇO DE PROCESSAMENTO SCARFME")
+    print("="*60)
+    if not args.sem_aquecer:
+        try:
+            carregar_dimensoes()
+        except (Exception, SystemExit) as e:
+            print(f"⚠ Dimensões não carregadas ({e}); nova tentativa na primeira requisição")
+    if not ARROW_DISPONIVEL:
+        print("⚠ pyarrow não instalado; formato arrow responde em CSV")
+
+    servidor = ThreadingHTTPServer((SERVICO_CONFIG['host'], SERVICO_CONFIG['porta']), ManipuladorProcessamento)
+    print(f"✓ Ouvindo em http://{SERVICO_CONFIG['host']}:{SERVICO_CONFIG['porta']} (Ctrl+C para sair)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+    finally:
+        servidor.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshots versionados das dimensões (PRODUTOS, PRODUTOS_BARRA, CORES_BASICAS)
+Gravados em Arrow IPC sem compressão para abertura via memory-map (zero-copy)
+"""
+
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    ARROW_DISPONIVEL = True
+except ImportError:
+    ARROW_DISPONIVEL = False
+
+SNAPSHOT_CONFIG = {
+    'diretorio': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshots'),
+    'versoes_mantidas': 3,
+    'leitura_habilitada': True,  # False com --no-cache/--refresh (só regrava)
+}
+
+# Idade máxima (segundos) antes de buscar a dimensão de novo no servidor
+DIMENSOES = {
+    'produtos': 12 * 3600,
+    'produtos_barra': 12 * 3600,
+    'cores': 24 * 3600,
+}
+
+ARQUIVO_ATUAL = 'atual.json'
+
+def _dir_dimensao(nome):
+    return os.path.join(SNAPSHOT_CONFIG['diretorio'], nome)
+
+def ler_manifesto(nome):
+    """Manifesto da versão atual da dimensão (None se não houver snapshot)"""
+    try:
+        with open(os.path.join(_dir_dimensao(nome), ARQUIVO_ATUAL), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def gravar_snapshot(nome, df):
+    """
+    Grava uma nova versão da dimensão e aponta atual.json para ela.
+    Leitores que já abriram a versão anterior continuam válidos
+    (os arquivos antigos só são apagados além de versoes_mantidas).
+    """
+    if not ARROW_DISPONIVEL:
+        return None
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    diretorio = _dir_dimensao(nome)
+    os.makedirs(diretorio, exist_ok=True)
+
+    # Nanossegundos no nome: duas gravações no mesmo segundo não se sobrescrevem
+    agora_ns = time.time_ns()
+    versao = datetime.fromtimestamp(agora_ns // 10**9).strftime('%Y%m%d_%H%M%S') + f"_{agora_ns % 10**9:09d}"
+    arquivo = f"{nome}_{versao}.arrow"
+    caminho = os.path.join(diretorio, arquivo)
+    with pa.OSFile(caminho + '.tmp', 'wb') as sink:
+        with ipc.new_file(sink, tabela.schema) as writer:
+            writer.write_table(tabela)
+    os.replace(caminho + '.tmp', caminho)
+
+    manifesto = {
+        'dimensao': nome,
+        'versao': versao,
+        'arquivo': arquivo,
+        'registros': tabela.num_rows,
+        'colunas': tabela.schema.names,
+        'schema_hash': hashlib.sha1(str(tabela.schema).encode('utf-8')).hexdigest()[:12],
+        'criado': time.time(),
+    }
+    tmp = os.path.join(diretorio, ARQUIVO_ATUAL + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=1)
+    os.replace(tmp, os.path.join(diretorio, ARQUIVO_ATUAL))
+
+    _limpar_versoes_antigas(nome)
+    return manifesto
+
+def _limpar_versoes_antigas(nome):
+    diretorio = _dir_dimensao(nome)
+    versoes = sorted(f for f in os.listdir(diretorio) if f.endswith('.arrow'))
+    for arquivo in versoes[:-SNAPSHOT_CONFIG['versoes_mantidas']]:
+        try:
+            os.remove(os.path.join(diretorio, arquivo))
+        except OSError:
+            # Em uso por outro processo (Windows); fica para a próxima
+            pass
+
+def abrir_snapshot(nome, max_idade=None):
+    """
+    Abre a versão atual via memory-map e retorna a pyarrow.Table (zero-copy),
+    ou None se não existir, estiver mais velha que max_idade ou pyarrow faltar.
+    """
+    if not ARROW_DISPONIVEL or not SNAPSHOT_CONFIG['leitura_habilitada']:
+        return None
+    manifesto = ler_manifesto(nome)
+    if manifesto is None:
+        return None
+    if max_idade is not None and time.time() - manifesto['criado'] > max_idade:
+        return None
+    caminho = os.path.join(_dir_dimensao(nome), manifesto['arquivo'])
+    try:
+        fonte = pa.memory_map(caminho, 'r')
+        return ipc.open_file(fonte).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+def carregar_dimensao(nome, max_idade=None):
+    """DataFrame da dimensão a partir do snapshot (None se indisponível)"""
+    tabela = abrir_snapshot(nome, max_idade=max_idade)
+    if tabela is None:
+        return None
+    # split_blocks evita consolidar colunas numéricas (mantém os buffers do mmap)
+    return tabela.to_pandas(split_blocks=True)
@@ -0,0 +1,15 @@
+@echo off
+echo ============================================
+echo    Iniciando Servico de Processamento Local
+echo ============================================
+echo.
+
+start "Servico Processamento" cmd /k "python exportador.py servico"
+
+echo Servico em http://127.0.0.1:8765
+echo.
+echo Para o dashboard usar o servico, adicione ao .env.local:
+echo.
+echo    PROCESSAMENTO_URL=http://127.0.0.1:8765
+echo.
+pause